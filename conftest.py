@@ -11,7 +11,7 @@ from flask import redirect
 from dateutil.tz import tzlocal
 from StringIO import StringIO
 from pytz import timezone as tz
-from openprocurement.auction.worker.auction import Auction, SCHEDULER
+from openprocurement.auction.worker.auction import Auction
 from openprocurement.auction.worker.mixins import LOGGER
 from openprocurement.auction.worker.tests.data.data import (
     tender_data, lot_tender_data, features_tender_data, test_auction_document
@@ -19,6 +19,7 @@ from openprocurement.auction.worker.tests.data.data import (
 from openprocurement.auction.worker.server import (
     app as worker_app, BidsForm
 )
+from openprocurement.auction.worker.utils import prepare_stage_snapshot
 # from openprocurement.auction.tests.utils import update_auctionPeriod
 
 
@@ -116,11 +117,6 @@ def logger():
     return LogInterceptor(LOGGER)
 
 
-@pytest.fixture(scope='function')
-def scheduler():
-    return SCHEDULER
-
-
 @pytest.fixture(scope='function')
 def app():
     update_auctionPeriod(tender_data)
@@ -132,9 +128,12 @@ def app():
         auction_data=tender_data,
         lot_id=False
     )
+    for bid in tender_data['data']['bids']:
+        app_auction.bidders_registry.add(bid)
     app_auction.bidders_data = tender_data['data']['bids']
     app_auction.db = MagicMock()
     app_auction.db.get.return_value = test_auction_document
+    app_auction.stage_snapshot = prepare_stage_snapshot(test_auction_document)
     worker_app.config.update(app_auction.worker_defaults)
     worker_app.logger_name = logger.name
     worker_app._logger = logger
@@ -157,6 +156,7 @@ def app():
     }]
     worker_app.remote_oauth.authorize.return_value = \
         redirect('https://my.test.url')
+    worker_app.identity_cache.clear()
     worker_app.logins_cache[(u'aMALGpjnB1iyBwXJM6betfgT4usHqw', '')] = {
         u'bidder_id': u'f7c8cd1d56624477af8dc3aa9c4b3ea3',
         u'expires':
@@ -1,19 +1,18 @@
 import logging
 
+from collections import deque
 from copy import deepcopy
+from datetime import timedelta
 from urlparse import urljoin
-from datetime import datetime
 from couchdb import Database, Session
 
-from gevent import sleep
 from gevent.event import Event
 from gevent.lock import BoundedSemaphore
+from gevent.queue import Queue
 
 from yaml import safe_dump as yaml_dump
 from requests import Session as RequestsSession
-from dateutil.tz import tzlocal
 from barbecue import cooking
-from apscheduler.schedulers.gevent import GeventScheduler
 
 from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_SERVICE_AUCTION_RESCHEDULE,
@@ -22,29 +21,30 @@ from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_SERVICE_AUCTION_CANCELED,
     AUCTION_WORKER_SERVICE_END_AUCTION,
     AUCTION_WORKER_SERVICE_START_AUCTION,
+    AUCTION_WORKER_SERVICE_WARM_UP,
     AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER,
     AUCTION_WORKER_SERVICE_PREPARE_SERVER,
     AUCTION_WORKER_SERVICE_END_FIRST_PAUSE
 )
 from openprocurement.auction.worker.server import run_server
-from openprocurement.auction.executor import AuctionsExecutor
+from openprocurement.auction.worker.design import sync_design
+from openprocurement.auction.worker.timeline import Timeline
+from openprocurement.auction.worker.tender_cache import TenderDataCache
 from openprocurement.auction.worker.mixins import\
     DBServiceMixin, RequestIDServiceMixin, AuditServiceMixin,\
     DateTimeServiceMixin, BiddersServiceMixin, PostAuctionServiceMixin,\
-    StagesServiceMixin, ROUNDS, TIMEZONE
+    StagesServiceMixin, WALServiceMixin
+from openprocurement.auction.worker.constants import BIDS_QUEUE_SIZE,\
+    WARM_UP_SECONDS
 from openprocurement.auction.worker.utils import \
-    prepare_initial_bid_stage, prepare_results_stage
+    prepare_initial_bid_stage, prepare_results_stage, prepare_stage_snapshot,\
+    get_stage_layout, BiddersRegistry
 
 from openprocurement.auction.utils import\
-    get_latest_bid_for_bidder, sorting_by_amount,\
     sorting_start_bids_by_amount, delete_mapping
 
 
 LOGGER = logging.getLogger('Auction Worker')
-SCHEDULER = GeventScheduler(job_defaults={"misfire_grace_time": 100},
-                            executors={'default': AuctionsExecutor()},
-                            logger=LOGGER)
-SCHEDULER.timezone = TIMEZONE
 
 
 class Auction(DBServiceMixin,
@@ -53,13 +53,16 @@ class Auction(DBServiceMixin,
               BiddersServiceMixin,
               DateTimeServiceMixin,
               StagesServiceMixin,
-              PostAuctionServiceMixin):
+              PostAuctionServiceMixin,
+              WALServiceMixin):
     """Auction Worker Class"""
 
     def __init__(self, tender_id,
                  worker_defaults,
                  auction_data={},
-                 lot_id=None):
+                 lot_id=None,
+                 clock=None,
+                 host=None):
         super(Auction, self).__init__()
         self.generate_request_id()
         self.tender_id = tender_id
@@ -84,22 +87,53 @@ class Auction(DBServiceMixin,
             self.debug = False
         self._end_auction_event = Event()
         self.bids_actions = BoundedSemaphore()
+        self.bids_queue = Queue(worker_defaults.get('bids_queue_size', BIDS_QUEUE_SIZE))
+        self._bids_consumer = None
         self.session = RequestsSession()
+        self.tender_data_memo = None
+        self.coordinator = None
+        self.tender_cache = TenderDataCache(worker_defaults.get('tender_cache_dir'))
+        self._public_sections = {}
+        self._public_base = None
+        self.delta_saves = worker_defaults.get('delta_saves', False)
+        self.save_stats = {'saves': 0, 'conflicts': 0, 'merged': 0, 'failed': 0}
         self.worker_defaults = worker_defaults
         if self.worker_defaults.get('with_document_service', False):
             self.session_ds = RequestsSession()
         self._bids_data = {}
+        if worker_defaults.get('bids_history_size'):
+            self.bids_history = deque(maxlen=worker_defaults['bids_history_size'])
+        else:
+            self.bids_history = None
         self.db = Database(str(self.worker_defaults["COUCH_DATABASE"]),
                            session=Session(retry_delays=range(10)))
         self.audit = {}
         self.retries = 10
         self.bidders_count = 0
+        self.bidders_registry = BiddersRegistry()
         self.bidders_data = []
         self.bidders_features = {}
         self.bidders_coeficient = {}
         self.features = None
         self.mapping = {}
         self.rounds_stages = []
+        self.stage_layout = get_stage_layout(self.bidders_count)
+        self.timeline = Timeline(
+            clock,
+            drift_compensation=worker_defaults.get('drift_compensation', True),
+            on_run=self.record_stage_switch
+        )
+        self.host = host
+        self.server = None
+        self.bids_ceilings = {}
+        self.leaderboard = None
+        self.warm_start = None
+        self.stage_snapshot = prepare_stage_snapshot({})
+        self.wal = None
+        self._persister = None
+        self._persist_pending = Event()
+        self._persisted = Event()
+        self._persisted.set()
 
     def schedule_auction(self):
         self.generate_request_id()
@@ -110,76 +144,75 @@ class Auction(DBServiceMixin,
         self.get_auction_info()
         self.prepare_audit()
         self.prepare_auction_stages()
+        recovered = self.recover_from_wal()
+        self.refresh_stage_snapshot()
+        if self.delta_saves:
+            sync_design(self.db)
         self.save_auction_document()
-        round_number = 0
-        SCHEDULER.add_job(
-            self.start_auction, 'date',
-            kwargs={"switch_to_round": round_number},
-            run_date=self.convert_datetime(
-                self.auction_document['stages'][0]['start']
-            ),
-            name="Start of Auction",
-            id="Start of Auction"
-        )
-        round_number += 1
-
-        SCHEDULER.add_job(
-            self.end_first_pause, 'date', kwargs={"switch_to_round": round_number},
-            run_date=self.convert_datetime(
-                self.auction_document['stages'][1]['start']
-            ),
-            name="End of Pause Stage: [0 -> 1]",
-            id="End of Pause Stage: [0 -> 1]"
-        )
-        round_number += 1
-        for index in xrange(2, len(self.auction_document['stages'])):
-            if self.auction_document['stages'][index - 1]['type'] == 'bids':
-                SCHEDULER.add_job(
-                    self.end_bids_stage, 'date',
-                    kwargs={"switch_to_round": round_number},
-                    run_date=self.convert_datetime(
-                        self.auction_document['stages'][index]['start']
-                    ),
-                    name="End of Bids Stage: [{} -> {}]".format(index - 1, index),
-                    id="End of Bids Stage: [{} -> {}]".format(index - 1, index)
-                )
-            elif self.auction_document['stages'][index - 1]['type'] == 'pause':
-                SCHEDULER.add_job(
-                    self.next_stage, 'date',
-                    kwargs={"switch_to_round": round_number},
-                    run_date=self.convert_datetime(
-                        self.auction_document['stages'][index]['start']
-                    ),
-                    name="End of Pause Stage: [{} -> {}]".format(index - 1, index),
-                    id="End of Pause Stage: [{} -> {}]".format(index - 1, index)
-                )
-            round_number += 1
+        self.open_wal()
+        if recovered:
+            self.plan_timeline(self.auction_document['current_stage'] + 1)
+        else:
+            self.plan_timeline()
+        self.timeline.start()
         LOGGER.info(
             "Prepare server ...",
             extra={"JOURNAL_REQUEST_ID": self.request_id,
                    "MESSAGE_ID": AUCTION_WORKER_SERVICE_PREPARE_SERVER}
         )
-        self.server = run_server(self, self.convert_datetime(self.auction_document['stages'][-2]['start']), LOGGER)
+        mapping_expire_time = self.convert_datetime(self.auction_document['stages'][-2]['start'])
+        if self.host:
+            self.server = self.host.add_auction(self, mapping_expire_time, LOGGER)
+        else:
+            self.server = run_server(self, mapping_expire_time, LOGGER)
+
+    def plan_timeline(self, from_stage=0):
+        """Plan switches to stages starting from from_stage"""
+        stages = self.auction_document['stages']
+        entries = []
+        warm_up_seconds = self.worker_defaults.get('warm_up_seconds', WARM_UP_SECONDS)
+        if from_stage <= 0 and warm_up_seconds:
+            entries.append((self.convert_datetime(stages[0]['start']) -
+                            timedelta(seconds=warm_up_seconds),
+                            self.warm_up, "Warm up", {}))
+        if from_stage <= 0:
+            entries.append((self.convert_datetime(stages[0]['start']),
+                            self.start_auction, "Start of Auction",
+                            {"switch_to_round": 0}))
+        if from_stage <= 1:
+            entries.append((self.convert_datetime(stages[1]['start']),
+                            self.end_first_pause, "End of Pause Stage: [0 -> 1]",
+                            {"switch_to_round": 1}))
+        for index in xrange(max(2, from_stage), len(stages)):
+            if stages[index - 1]['type'] == 'bids':
+                action, name = self.end_bids_stage, "End of Bids Stage"
+            elif stages[index - 1]['type'] == 'pause':
+                action, name = self.next_stage, "End of Pause Stage"
+            else:
+                continue
+            entries.append((self.convert_datetime(stages[index]['start']), action,
+                            "{}: [{} -> {}]".format(name, index - 1, index),
+                            {"switch_to_round": index}))
+        self.timeline.plan(entries)
 
     def wait_to_end(self):
         self._end_auction_event.wait()
+        self.timeline.shutdown()
+        self.stop_bids_consumer()
+        self.flush_auction_document()
+        self.close_wal(remove=True)
+        LOGGER.info("Auction document saves: {saves}, conflicts: {conflicts}, "
+                    "merged: {merged}, failed: {failed}".format(**self.save_stats),
+                    extra={"JOURNAL_REQUEST_ID": self.request_id})
         LOGGER.info("Stop auction worker",
                     extra={"JOURNAL_REQUEST_ID": self.request_id,
                            "MESSAGE_ID": AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER})
 
-    def start_auction(self, switch_to_round=None):
-        self.generate_request_id()
-        self.audit['timeline']['auction_start']['time'] = datetime.now(tzlocal()).isoformat()
-        LOGGER.info(
-            '---------------- Start auction ----------------',
-            extra={"JOURNAL_REQUEST_ID": self.request_id,
-                   "MESSAGE_ID": AUCTION_WORKER_SERVICE_START_AUCTION}
-        )
-        self.get_auction_info()
-        self.get_auction_document()
-        # Initital Bids
+    def prepare_initial_bids(self):
+        """Initial bids stages and their audit info from bidders_data"""
         bids = deepcopy(self.bidders_data)
-        self.auction_document["initial_bids"] = []
+        initial_bids = []
+        audit_bids = []
         bids_info = sorting_start_bids_by_amount(bids, features=self.features)
         for index, bid in enumerate(bids_info):
             amount = bid["value"]["amount"]
@@ -200,10 +233,8 @@ class Auction(DBServiceMixin,
                 coeficient = None
                 amount_features = None
 
-            self.audit['timeline']['auction_start']['initial_bids'].append(
-                audit_info
-            )
-            self.auction_document["initial_bids"].append(
+            audit_bids.append(audit_info)
+            initial_bids.append(
                 prepare_initial_bid_stage(
                     time=bid["date"] if "date" in bid else self.startDate,
                     bidder_id=bid["id"],
@@ -213,21 +244,88 @@ class Auction(DBServiceMixin,
                     amount_features=amount_features
                 )
             )
+        return initial_bids, audit_bids
+
+    def warm_up(self):
+        """
+        Fetch tender data and prepare initial bids before start of auction
+        and write pending changes of auction document, so start_auction only
+        switches stage. If auction was rescheduled in tender, timeline is
+        planned again instead.
+        """
+        self.generate_request_id()
+        LOGGER.info(
+            '---------------- Warm up ----------------',
+            extra={"JOURNAL_REQUEST_ID": self.request_id,
+                   "MESSAGE_ID": AUCTION_WORKER_SERVICE_WARM_UP}
+        )
+        self.get_auction_info()
+        if self.replan_if_rescheduled():
+            return
+        self.warm_start = self.prepare_initial_bids()
+        self.flush_auction_document()
+
+    def replan_if_rescheduled(self):
+        """
+        Prepare stages and plan timeline again if start of auction in tender
+        was moved since auction was scheduled. Returns True if so.
+        """
+        if self.convert_datetime(self.auction_document['stages'][0]['start']) == self.startDate:
+            return False
+        LOGGER.info("Auction {} rescheduled to {}".format(self.auction_doc_id,
+                                                          self.startDate.isoformat()),
+                    extra={"JOURNAL_REQUEST_ID": self.request_id,
+                           "MESSAGE_ID": AUCTION_WORKER_SERVICE_AUCTION_RESCHEDULE})
+        self.auction_document['initial_bids'] = []
+        self.prepare_auction_stages()
+        self.refresh_stage_snapshot()
+        self.close_wal(remove=True)
+        self.open_wal()
+        self.flush_auction_document()
+        self.save_auction_document()
+        self.plan_timeline()
+        return True
+
+    def take_warm_start(self):
+        """
+        Initial bids prepared by warm_up if they are for the same bidders
+        as in auction document, None otherwise.
+        """
+        warm_start, self.warm_start = self.warm_start, None
+        if warm_start is None:
+            return None
+        bidders = set(stage['bidder_id'] for stage in self.auction_document['initial_bids'])
+        if bidders != set(stage['bidder_id'] for stage in warm_start[0]):
+            LOGGER.warning("Bidders changed after warm up, prepare initial bids again",
+                           extra={"JOURNAL_REQUEST_ID": self.request_id})
+            return None
+        return warm_start
+
+    def start_auction(self, switch_to_round=None):
+        self.generate_request_id()
+        self.flush_auction_document()
+        self.audit['timeline']['auction_start']['time'] = self.now().isoformat()
+        LOGGER.info(
+            '---------------- Start auction ----------------',
+            extra={"JOURNAL_REQUEST_ID": self.request_id,
+                   "MESSAGE_ID": AUCTION_WORKER_SERVICE_START_AUCTION}
+        )
+        warm_start = self.take_warm_start()
+        if warm_start is None:
+            self.get_auction_info()
+            warm_start = self.prepare_initial_bids()
+        initial_bids, audit_bids = warm_start
+        self.auction_document["initial_bids"] = initial_bids
+        self.audit['timeline']['auction_start']['initial_bids'].extend(audit_bids)
         if isinstance(switch_to_round, int):
             self.auction_document["current_stage"] = switch_to_round
         else:
             self.auction_document["current_stage"] = 0
 
-        all_bids = deepcopy(self.auction_document["initial_bids"])
-        minimal_bids = []
-        for bid_info in self.bidders_data:
-            minimal_bids.append(get_latest_bid_for_bidder(
-                all_bids, str(bid_info['id'])
-            ))
-
-        minimal_bids = self.filter_bids_keys(sorting_by_amount(minimal_bids))
-        self.update_future_bidding_orders(minimal_bids)
-        self.save_auction_document()
+        self.leaderboard = self.build_leaderboard(self.auction_document["initial_bids"])
+        self.update_future_bidding_orders(self.leaderboard.ordered())
+        self.refresh_stage_snapshot()
+        self.persist_auction_document()
 
     def end_first_pause(self, switch_to_round=None):
         self.generate_request_id()
@@ -236,16 +334,18 @@ class Auction(DBServiceMixin,
             extra={"JOURNAL_REQUEST_ID": self.request_id,
                    "MESSAGE_ID": AUCTION_WORKER_SERVICE_END_FIRST_PAUSE}
         )
+        self.flush_auction_document()
         self.bids_actions.acquire()
-        self.get_auction_document()
+        self.drain_bids_queue()
 
         if isinstance(switch_to_round, int):
             self.auction_document["current_stage"] = switch_to_round
         else:
             self.auction_document["current_stage"] += 1
 
-        self.save_auction_document()
+        self.refresh_stage_snapshot()
         self.bids_actions.release()
+        self.persist_auction_document()
 
     def end_auction(self):
         LOGGER.info(
@@ -253,24 +353,22 @@ class Auction(DBServiceMixin,
             extra={"JOURNAL_REQUEST_ID": self.request_id,
                    "MESSAGE_ID": AUCTION_WORKER_SERVICE_END_AUCTION}
         )
-        LOGGER.debug("Stop server", extra={"JOURNAL_REQUEST_ID": self.request_id})
         if self.server:
+            LOGGER.debug("Stop server", extra={"JOURNAL_REQUEST_ID": self.request_id})
             self.server.stop()
-        LOGGER.debug(
-            "Clear mapping", extra={"JOURNAL_REQUEST_ID": self.request_id}
-        )
-        delete_mapping(self.worker_defaults,
-                       self.auction_doc_id)
+            LOGGER.debug(
+                "Clear mapping", extra={"JOURNAL_REQUEST_ID": self.request_id}
+            )
+            delete_mapping(self.worker_defaults,
+                           self.auction_doc_id)
+        self.flush_auction_document()
 
-        start_stage, end_stage = self.get_round_stages(ROUNDS)
-        minimal_bids = deepcopy(
-            self.auction_document["stages"][start_stage:end_stage]
-        )
-        minimal_bids = self.filter_bids_keys(sorting_by_amount(minimal_bids))
+        minimal_bids = self.get_leaderboard().ordered()
         self.auction_document["results"] = []
         for item in minimal_bids:
             self.auction_document["results"].append(prepare_results_stage(**item))
         self.auction_document["current_stage"] = (len(self.auction_document["stages"]) - 1)
+        self.refresh_stage_snapshot()
         LOGGER.debug(' '.join((
             'Document in end_stage: \n', yaml_dump(dict(self.auction_document))
         )), extra={"JOURNAL_REQUEST_ID": self.request_id})
@@ -281,11 +379,12 @@ class Auction(DBServiceMixin,
                 'Debug: put_auction_data disabled !!!',
                 extra={"JOURNAL_REQUEST_ID": self.request_id}
             )
-            sleep(10)
+            self.timeline.clock.sleep(10)
             self.save_auction_document()
         else:
             if self.put_auction_data():
                 self.save_auction_document()
+        self.forget_tender_data()
         LOGGER.debug(
             "Fire 'stop auction worker' event",
             extra={"JOURNAL_REQUEST_ID": self.request_id}
@@ -297,7 +396,7 @@ class Auction(DBServiceMixin,
             LOGGER.info("Auction {} canceled".format(self.auction_doc_id),
                         extra={'MESSAGE_ID': AUCTION_WORKER_SERVICE_AUCTION_CANCELED})
             self.auction_document["current_stage"] = -100
-            self.auction_document["endDate"] = datetime.now(tzlocal()).isoformat()
+            self.auction_document["endDate"] = self.now().isoformat()
             LOGGER.info("Change auction {} status to 'canceled'".format(self.auction_doc_id),
                         extra={'MESSAGE_ID': AUCTION_WORKER_SERVICE_AUCTION_STATUS_CANCELED})
             self.save_auction_document()
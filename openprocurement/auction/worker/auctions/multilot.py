@@ -6,7 +6,8 @@ from openprocurement.auction.utils import (
     calculate_hash,
     make_request
 )
-from openprocurement.auction.worker.utils import prepare_service_stage
+from openprocurement.auction.worker.utils import prepare_service_stage,\
+    get_stage_layout, BiddersRegistry
 from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_API_AUCTION_CANCEL,
     AUCTION_WORKER_API_AUCTION_NOT_EXIST,
@@ -14,7 +15,6 @@ from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_API_APPROVED_DATA,
     AUCTION_WORKER_SET_AUCTION_URLS
 )
-from barbecue import calculate_coeficient
 
 MULTILINGUAL_FIELDS = ['title', 'description']
 ADDITIONAL_LANGUAGES = ['ru', 'en']
@@ -24,23 +24,9 @@ logger = logging.getLogger('Auction Worker')
 
 def get_auction_info(self, prepare=False):
     if not self.debug:
-        if prepare:
-            self._auction_data = get_tender_data(
-                self.tender_url,
-                request_id=self.request_id,
-                session=self.session
-            )
-        else:
-            self._auction_data = {'data': {}}
-        auction_data = get_tender_data(
-            self.tender_url + '/auction',
-            user=self.worker_defaults['resource_api_token'],
-            request_id=self.request_id,
-            session=self.session
-        )
+        auction_data = self.fetch_auction_data(prepare)
         if auction_data:
-            self._auction_data['data'].update(auction_data['data'])
-            del auction_data
+            self._auction_data = auction_data
         else:
             self.get_auction_document()
             if self.auction_document:
@@ -72,11 +58,13 @@ def get_auction_info(self, prepare=False):
     self.bidders_features = None
     self.features = self._lot_data.get('features', None)
     if not prepare:
-        codes = [i['code'] for i in self._lot_data['features']]
-        self.bidders_data = []
-        for bid_index, bid in enumerate(self._auction_data['data']['bids']):
+        codes = set(i['code'] for i in self._lot_data['features'])
+        if not self.features:
+            self.features = None
+        registry = BiddersRegistry(self.features)
+        for bid in self._auction_data['data']['bids']:
             if bid.get('status', 'active') == 'active':
-                for lot_index, lot_bid in enumerate(bid['lotValues']):
+                for lot_bid in bid['lotValues']:
                     if lot_bid['relatedLot'] == self.lot_id and lot_bid.get('status', 'active') == 'active':
                         bid_data = {
                             'id': bid['id'],
@@ -86,29 +74,19 @@ def get_auction_info(self, prepare=False):
                         if 'parameters' in bid:
                             bid_data['parameters'] = [i for i in bid['parameters']
                                                       if i['code'] in codes]
-                        self.bidders_data.append(bid_data)
-        self.bidders_count = len(self.bidders_data)
+                        registry.add(bid_data, bid_data.get('parameters'))
+                        break
+        self.bidders_registry = registry
+        self.bidders_data = registry.bidders_data
+        self.bidders_count = len(registry)
         logger.info('Bidders count: {}'.format(self.bidders_count),
                     extra={'JOURNAL_REQUEST_ID': self.request_id,
                            'MESSAGE_ID': AUCTION_WORKER_SERVICE_NUMBER_OF_BIDS})
-        self.rounds_stages = []
-        for stage in range((self.bidders_count + 1) * ROUNDS + 1):
-            if (stage + self.bidders_count) % (self.bidders_count + 1) == 0:
-                self.rounds_stages.append(stage)
-        self.mapping = {}
-        if self._lot_data.get('features', None):
-            self.bidders_features = {}
-            self.bidders_coeficient = {}
-            self.features = self._lot_data['features']
-            for bid in self.bidders_data:
-                self.bidders_features[bid['id']] = bid['parameters']
-                self.bidders_coeficient[bid['id']] = calculate_coeficient(self.features, bid['parameters'])
-        else:
-            self.bidders_features = None
-            self.features = None
-
-        for index, uid in enumerate(self.bidders_data):
-            self.mapping[self.bidders_data[index]['id']] = str(index + 1)
+        self.stage_layout = get_stage_layout(self.bidders_count)
+        self.rounds_stages = list(self.stage_layout.rounds_stages)
+        self.mapping = registry.mapping()
+        self.bidders_features = registry.bidders_features()
+        self.bidders_coeficient = registry.bidders_coeficient()
 
 
 def prepare_auction_document(self):
@@ -148,34 +126,60 @@ def prepare_auction_document(self):
     return self.auction_document
 
 
+def prepare_lot_patch_data(self, lot_value_data, lot_data=None):
+    """
+    PATCH/POST data with lot values of lot auction only. API matches bids,
+    lots and lot values by position, so others are kept as placeholders:
+    bids with id only, lot values of active bids with relatedLot only, and
+    lots with id only. Returns patch data and number of lot values in it.
+    """
+    lot_values_count = 0
+    bids = []
+    for bid in self._auction_data['data']['bids']:
+        bid_patch = {'id': bid['id']}
+        if 'lotValues' in bid:
+            if bid.get('status', 'active') == 'active':
+                bid_patch['lotValues'] = [{'relatedLot': lot_bid['relatedLot']}
+                                          for lot_bid in bid['lotValues']]
+                for lot_index, lot_bid in enumerate(bid['lotValues']):
+                    if lot_bid['relatedLot'] == self.lot_id and lot_bid.get('status', 'active') == 'active':
+                        bid_patch['lotValues'][lot_index] = dict(
+                            lot_value_data(bid, lot_bid), relatedLot=self.lot_id
+                        )
+                        lot_values_count += 1
+                        break
+            else:
+                bid_patch['lotValues'] = [{} for _ in bid['lotValues']]
+        bids.append(bid_patch)
+    patch_data = {'data': {'bids': bids}}
+    if lot_data is not None:
+        patch_data['data']['lots'] = [
+            dict(lot_data, id=lot['id']) if lot['id'] == self.lot_id else {'id': lot['id']}
+            for lot in self._auction_data['data']['lots']
+        ]
+    return patch_data, lot_values_count
+
+
 def prepare_auction_and_participation_urls(self):
     auction_url = self.worker_defaults['AUCTIONS_URL'].format(
         auction_id=self.auction_doc_id
     )
-    patch_data = {'data': {'lots': list(self._auction_data['data']['lots']),
-                           'bids': list(self._auction_data['data']['bids'])}}
-    for index, lot in enumerate(self._auction_data['data']['lots']):
-        if lot['id'] == self.lot_id:
-            patch_data['data']['lots'][index]['auctionUrl'] = auction_url
-            break
-
-    for bid_index, bid in enumerate(self._auction_data['data']['bids']):
-        if bid.get('status', 'active') == 'active':
-            for lot_index, lot_bid in enumerate(bid['lotValues']):
-                if lot_bid['relatedLot'] == self.lot_id and lot_bid.get('status', 'active') == 'active':
-                    participation_url = self.worker_defaults['AUCTIONS_URL'].format(
-                        auction_id=self.auction_doc_id
-                    )
-                    participation_url += '/login?bidder_id={}&hash={}'.format(
-                        bid['id'],
-                        calculate_hash(bid['id'], self.worker_defaults['HASH_SECRET'])
-                    )
-                    patch_data['data']['bids'][bid_index]['lotValues'][lot_index]['participationUrl'] = participation_url
-                    break
+
+    def participation_url(bid, lot_bid):
+        return {'participationUrl': auction_url + '/login?bidder_id={}&hash={}'.format(
+            bid['id'],
+            calculate_hash(bid['id'], self.worker_defaults['HASH_SECRET'])
+        )}
+
+    patch_data, count = prepare_lot_patch_data(
+        self, participation_url, {'auctionUrl': auction_url}
+    )
     logger.info("Set auction and participation urls for tender {}".format(self.tender_id),
                 extra={"JOURNAL_REQUEST_ID": self.request_id,
                        "MESSAGE_ID": AUCTION_WORKER_SET_AUCTION_URLS})
-    logger.info(repr(patch_data))
+    logger.info("Lot {}: auctionUrl {}, participationUrl for {} of {} bids".format(
+        self.lot_id, auction_url, count, len(patch_data['data']['bids'])
+    ))
     make_request(self.tender_url + '/auction/{}'.format(self.lot_id), patch_data,
                  user=self.worker_defaults["resource_api_token"],
                  request_id=self.request_id, session=self.session)
@@ -183,25 +187,22 @@ def prepare_auction_and_participation_urls(self):
 
 
 def post_results_data(self, with_auctions_results=True):
-    patch_data = {'data': {'bids': list(self._auction_data['data']['bids'])}}
+    all_bids = self.auction_document["results"]
+
+    def auction_result(bid, lot_bid):
+        auction_bid_info = get_latest_bid_for_bidder(all_bids, bid["id"])
+        return {'value': {'amount': auction_bid_info["amount"]},
+                'date': auction_bid_info["time"]}
+
     if with_auctions_results:
-        all_bids = self.auction_document["results"]
-        for bid_index, bid in enumerate(self._auction_data['data']['bids']):
-            if bid.get('status', 'active') == 'active':
-                for lot_index, lot_bid in enumerate(bid['lotValues']):
-                    if lot_bid['relatedLot'] == self.lot_id and \
-                            lot_bid.get('status', 'active') == 'active':
-                        auction_bid_info = \
-                            get_latest_bid_for_bidder(all_bids, bid["id"])
-                        patch_data['data']['bids'][bid_index]['lotValues'][
-                            lot_index]["value"]["amount"] = \
-                            auction_bid_info["amount"]
-                        patch_data['data']['bids'][bid_index]['lotValues'][
-                            lot_index]["date"] = auction_bid_info["time"]
-                        break
+        patch_data, count = prepare_lot_patch_data(self, auction_result)
+    else:
+        patch_data, count = prepare_lot_patch_data(self, lambda bid, lot_bid: {})
 
     logger.info(
-        "Approved data: {}".format(patch_data),
+        "Approved data: {} lot values of lot {} in {} bids".format(
+            count, self.lot_id, len(patch_data['data']['bids'])
+        ),
         extra={"JOURNAL_REQUEST_ID": self.request_id,
                "MESSAGE_ID": AUCTION_WORKER_API_APPROVED_DATA}
     )
@@ -7,7 +7,8 @@ from openprocurement.auction.utils import (
     calculate_hash,
     make_request
 )
-from openprocurement.auction.worker.utils import prepare_service_stage
+from openprocurement.auction.worker.utils import prepare_service_stage,\
+    get_stage_layout, BiddersRegistry
 from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_API_AUCTION_CANCEL,
     AUCTION_WORKER_API_AUCTION_NOT_EXIST,
@@ -15,7 +16,6 @@ from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_API_APPROVED_DATA,
     AUCTION_WORKER_SET_AUCTION_URLS
 )
-from barbecue import calculate_coeficient
 
 MULTILINGUAL_FIELDS = ["title", "description"]
 ADDITIONAL_LANGUAGES = ["ru", "en"]
@@ -25,24 +25,10 @@ LOGGER = logging.getLogger('Auction Worker')
 
 def get_auction_info(self, prepare=False):
     if not self.debug:
-        if prepare:
-            self._auction_data = get_tender_data(
-                self.tender_url,
-                request_id=self.request_id,
-                session=self.session
-            )
-        else:
-            self._auction_data = {'data': {}}
-        auction_data = get_tender_data(
-            self.tender_url + '/auction',
-            user=self.worker_defaults["resource_api_token"],
-            request_id=self.request_id,
-            session=self.session
-        )
+        auction_data = self.fetch_auction_data(prepare)
         if auction_data:
-            self._auction_data['data'].update(auction_data['data'])
+            self._auction_data = auction_data
             self.startDate = self.convert_datetime(self._auction_data['data']['auctionPeriod']['startDate'])
-            del auction_data
         else:
             self.get_auction_document()
             if self.auction_document:
@@ -66,10 +52,8 @@ def get_auction_info(self, prepare=False):
     LOGGER.info("Bidders count: {}".format(self.bidders_count),
                 extra={"JOURNAL_REQUEST_ID": self.request_id,
                        "MESSAGE_ID": AUCTION_WORKER_SERVICE_NUMBER_OF_BIDS})
-    self.rounds_stages = []
-    for stage in range((self.bidders_count + 1) * ROUNDS + 1):
-        if (stage + self.bidders_count) % (self.bidders_count + 1) == 0:
-            self.rounds_stages.append(stage)
+    self.stage_layout = get_stage_layout(self.bidders_count)
+    self.rounds_stages = list(self.stage_layout.rounds_stages)
     self.mapping = {}
     self.startDate = self.convert_datetime(
         self._auction_data['data']['auctionPeriod']['startDate']
@@ -78,33 +62,22 @@ def get_auction_info(self, prepare=False):
         self.features = self._auction_data["data"]["features"]
 
     if not prepare:
-        self.bidders_data = []
-        if self.features:
-            self.bidders_features = {}
-            self.bidders_coeficient = {}
-            self.features = self._auction_data["data"]["features"]
-            for bid in self._auction_data["data"]["bids"]:
-                if bid.get('status', 'active') == 'active':
-                    self.bidders_features[bid["id"]] = bid["parameters"]
-                    self.bidders_coeficient[bid["id"]] = calculate_coeficient(self.features, bid["parameters"])
-        else:
-            self.bidders_features = None
+        if not self.features:
             self.features = None
-
+        registry = BiddersRegistry(self.features)
         for bid in self._auction_data['data']['bids']:
             if bid.get('status', 'active') == 'active':
-                self.bidders_data.append({
+                registry.add({
                     'id': bid['id'],
                     'date': bid['date'],
                     'value': bid['value']
-                })
-                if self.features:
-                    self.bidders_features[bid["id"]] = bid["parameters"]
-                    self.bidders_coeficient[bid["id"]] = calculate_coeficient(self.features, bid["parameters"])
-        self.bidders_count = len(self.bidders_data)
-
-        for index, uid in enumerate(self.bidders_data):
-            self.mapping[self.bidders_data[index]['id']] = str(index + 1)
+                }, bid.get("parameters"))
+        self.bidders_registry = registry
+        self.bidders_data = registry.bidders_data
+        self.bidders_count = len(registry)
+        self.mapping = registry.mapping()
+        self.bidders_features = registry.bidders_features()
+        self.bidders_coeficient = registry.bidders_coeficient()
 
 
 def prepare_auction_document(self):
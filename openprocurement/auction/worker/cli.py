@@ -9,14 +9,18 @@ import yaml
 import sys
 import os
 
-from openprocurement.auction.worker.auction import Auction, SCHEDULER
+from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.host import AuctionsHost, parse_auctions_list
+from openprocurement.auction.worker.planning import plan_auctions
 from openprocurement.auction.worker import constants as C
 
 
-def main():
+def get_parser():
     parser = argparse.ArgumentParser(description='---- Auction ----')
     parser.add_argument('cmd', type=str, help='')
-    parser.add_argument('auction_doc_id', type=str, help='auction_doc_id')
+    parser.add_argument('auction_doc_id', type=str,
+                        help='auction_doc_id; for host and planning-batch commands comma separated '
+                             'list of tender_id or tender_id:lot_id')
     parser.add_argument('auction_worker_config', type=str,
                         help='Auction Worker Configuration File')
     parser.add_argument('--auction_info', type=str, help='Auction File')
@@ -25,14 +29,17 @@ def main():
     parser.add_argument('--lot', type=str, help='Specify lot in tender', default=None)
     parser.add_argument('--planning_procerude', type=str, help='Override planning procerude',
                         default=None, choices=[None, C.PLANNING_FULL, C.PLANNING_PARTIAL_DB, C.PLANNING_PARTIAL_CRON])
+    return parser
 
-    args = parser.parse_args()
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
 
     if os.path.isfile(args.auction_worker_config):
         worker_defaults = yaml.load(open(args.auction_worker_config))
         if args.with_api_version:
             worker_defaults['resource_api_version'] = args.with_api_version
-        if args.cmd != 'cleanup':
+        if args.cmd not in ('cleanup', 'host', 'planning-batch'):
             worker_defaults['handlers']['journal']['TENDER_ID'] = args.auction_doc_id
             if args.lot:
                 worker_defaults['handlers']['journal']['TENDER_LOT_ID'] = args.lot
@@ -45,6 +52,13 @@ def main():
         print "Auction worker defaults config not exists!!!"
         sys.exit(1)
 
+    if args.cmd == 'host':
+        AuctionsHost(worker_defaults).run(parse_auctions_list(args.auction_doc_id))
+        return
+    elif args.cmd == 'planning-batch':
+        plan_auctions(parse_auctions_list(args.auction_doc_id), worker_defaults)
+        return
+
     if args.auction_info_from_db:
         auction_data = {'mode': 'test'}
     elif args.auction_info:
@@ -57,10 +71,8 @@ def main():
                       auction_data=auction_data,
                       lot_id=args.lot)
     if args.cmd == 'run':
-        SCHEDULER.start()
         auction.schedule_auction()
         auction.wait_to_end()
-        SCHEDULER.shutdown()
     elif args.cmd == 'planning':
         auction.prepare_auction_document()
     elif args.cmd == 'announce':
@@ -7,6 +7,13 @@ BIDS_SECONDS = 120
 FIRST_PAUSE_SECONDS = 300
 PAUSE_SECONDS = 120
 BIDS_KEYS_FOR_COPY = ("bidder_id", "amount", "time")
+WORKER_OWNED_FIELDS = ("stages", "current_stage")
+SAVE_RETRIES = 10
+SAVE_CONFLICT_BACKOFF = 0.1
+SAVE_CONFLICT_BACKOFF_MAX = 5
+BIDS_QUEUE_SIZE = 1000
+WARM_UP_SECONDS = 30
+TENDER_DATA_MAX_AGE = 10
 PLANNING_FULL = "full"
 PLANNING_PARTIAL_DB = "partial_db"
 PLANNING_PARTIAL_CRON = "partial_cron"
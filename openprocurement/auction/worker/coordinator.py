@@ -0,0 +1,105 @@
+"""
+Coordinator of lot auctions of one multilot tender run in one process.
+
+Tender resources are downloaded once for all lot auctions: concurrent
+requests of the same resource wait for the one in flight and downloaded
+data is shared for max_age seconds, after which it is revalidated through
+tender cache. Positions of lot values of every lot in bids are indexed in
+one pass over bids, and every lot auction gets its own view of tender in
+which only its lot and its lot values are copied, the rest is shared.
+"""
+import logging
+from copy import deepcopy
+
+from gevent.event import AsyncResult
+
+from openprocurement.auction.worker.constants import TENDER_DATA_MAX_AGE
+from openprocurement.auction.worker.timeline import Clock
+
+
+LOGGER = logging.getLogger('Auction Worker')
+
+
+def index_lots_values(bids):
+    """Positions (bid_index, lot_value_index) of active lot values by lot id"""
+    positions = {}
+    for bid_index, bid in enumerate(bids):
+        if bid.get('status', 'active') != 'active':
+            continue
+        for lot_index, lot_bid in enumerate(bid.get('lotValues', [])):
+            if lot_bid.get('status', 'active') == 'active':
+                positions.setdefault(lot_bid['relatedLot'], []).append((bid_index, lot_index))
+    return positions
+
+
+class TenderCoordinator(object):
+
+    def __init__(self, tender_id, max_age=TENDER_DATA_MAX_AGE, clock=None):
+        self.tender_id = tender_id
+        self.max_age = max_age
+        self.clock = clock or Clock()
+        self.auctions = []
+        self.resources = {}
+        self.pending = {}
+        self.stats = {'downloaded': 0, 'shared': 0}
+
+    def add_auction(self, auction):
+        auction.coordinator = self
+        if self.auctions:
+            auction.session = self.auctions[0].session
+            auction.tender_cache = self.auctions[0].tender_cache
+        self.auctions.append(auction)
+
+    def get_resource(self, auction, url, **kwargs):
+        """Resource of tender as lot view for lot auction"""
+        resource = self.resources.get(url)
+        if resource is not None and self.clock.monotonic() - resource[0] < self.max_age:
+            self.stats['shared'] += 1
+            return self.lot_view(resource, auction.lot_id)
+        pending = self.pending.get(url)
+        if pending is not None:
+            resource = pending.get()
+            self.stats['shared'] += 1
+            return self.lot_view(resource, auction.lot_id) if resource else None
+
+        pending = self.pending[url] = AsyncResult()
+        try:
+            data = auction.tender_cache.get(url, auction.session,
+                                            request_id=auction.request_id, **kwargs)
+        except Exception, e:
+            del self.pending[url]
+            pending.set_exception(e)
+            raise
+        del self.pending[url]
+        resource = None
+        if data:
+            self.stats['downloaded'] += 1
+            positions = index_lots_values(data.get('data', {}).get('bids', []))
+            resource = self.resources[url] = (self.clock.monotonic(), data, positions)
+        pending.set(resource)
+        return self.lot_view(resource, auction.lot_id) if resource else None
+
+    def lot_view(self, resource, lot_id):
+        """
+        Tender data in which lot and lot values of lot_id are copies and
+        everything else is shared between lot auctions. Positions of bids
+        and lot values are the same as in tender.
+        """
+        _, data, positions = resource
+        if not lot_id:
+            return deepcopy(data)
+        view = dict(data)
+        view['data'] = tender = dict(data['data'])
+        if 'lots' in tender:
+            tender['lots'] = [deepcopy(lot) if lot['id'] == lot_id else lot
+                              for lot in tender['lots']]
+        if 'bids' in tender:
+            tender['bids'] = bids = list(tender['bids'])
+            for bid_index, lot_index in positions.get(lot_id, []):
+                bid = bids[bid_index] = dict(bids[bid_index])
+                bid['lotValues'] = list(bid['lotValues'])
+                bid['lotValues'][lot_index] = deepcopy(bid['lotValues'][lot_index])
+        return view
+
+    def clear(self):
+        self.resources.clear()
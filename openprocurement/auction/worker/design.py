@@ -0,0 +1,41 @@
+from couchdb.http import ResourceConflict
+
+DESIGN_DOC_ID = '_design/auction_worker'
+DELTA_UPDATE_HANDLER = 'auction_worker/delta'
+
+# Request body: {"_rev": ..., "set": [[path, value], ...], "unset": [key, ...]}
+# where path is list of keys and list indexes from document root.
+DELTA_UPDATE_FUNCTION = """function(doc, req) {
+    if (!doc) {
+        return [null, {code: 404, json: {error: 'not_found', reason: 'missing'}}];
+    }
+    var delta = JSON.parse(req.body);
+    if (delta._rev !== doc._rev) {
+        return [null, {code: 409, json: {error: 'conflict', reason: 'Document update conflict.'}}];
+    }
+    (delta.set || []).forEach(function(change) {
+        var path = change[0], target = doc;
+        for (var i = 0; i < path.length - 1; i++) {
+            target = target[path[i]];
+        }
+        target[path[path.length - 1]] = change[1];
+    });
+    (delta.unset || []).forEach(function(key) {
+        delete doc[key];
+    });
+    return [doc, {json: {ok: true, id: doc._id}}];
+}"""
+
+
+def sync_design(db):
+    """Create or update design document with delta update handler"""
+    design = db.get(DESIGN_DOC_ID) or {'_id': DESIGN_DOC_ID}
+    if design.get('updates', {}).get('delta') == DELTA_UPDATE_FUNCTION:
+        return False
+    design.setdefault('updates', {})['delta'] = DELTA_UPDATE_FUNCTION
+    try:
+        db.save(design)
+    except ResourceConflict:
+        # Design document is updated by another worker
+        return False
+    return True
@@ -1,14 +1,15 @@
 # from da
-from flask import request, session, current_app as app
+from flask import request, session, jsonify, abort, current_app as app
+from gevent.queue import Full
 
 from wtforms import Form, FloatField, StringField
 from wtforms.validators import InputRequired, ValidationError, StopValidation
-from fractions import Fraction
 from datetime import datetime
 from pytz import timezone
 import wtforms_json
 
 from openprocurement.auction.utils import prepare_extra_journal_fields
+from openprocurement.auction.worker.utils import calculate_bid_ceiling
 
 wtforms_json.init()
 
@@ -25,22 +26,20 @@ def validate_bid_change_on_bidding(form, field):
     """
     Bid must be lower then previous bidder bid amount minus minimalStep amount
     """
-    stage_id = form.document['current_stage']
-    if form.auction.features:
-        minimal_bid = form.document['stages'][stage_id]['amount_features']
-        minimal = Fraction(minimal_bid) * form.auction.bidders_coeficient[form.data['bidder_id']]
-        minimal -= Fraction(form.document['minimalStep']['amount'])
-        if field.data > minimal:
-            raise ValidationError(u'Too high value')
-    else:
-        minimal_bid = form.document['stages'][stage_id]['amount']
-        if field.data > (minimal_bid - form.document['minimalStep']['amount']):
-            raise ValidationError(u'Too high value')
+    maximal = form.snapshot.get('max_bid')
+    if maximal is None:
+        coeficient = None
+        if form.auction.features:
+            coeficient = form.auction.bidders_coeficient[form.data['bidder_id']]
+        maximal = calculate_bid_ceiling(form.snapshot['stage'],
+                                        form.snapshot['minimalStep']['amount'],
+                                        coeficient)
+    if field.data > maximal:
+        raise ValidationError(u'Too high value')
 
 
 def validate_bidder_id_on_bidding(form, field):
-    stage_id = form.document['current_stage']
-    if field.data != form.document['stages'][stage_id]['bidder_id']:
+    if field.data != form.snapshot['stage']['bidder_id']:
         raise StopValidation(u'Not valid bidder')
 
 
@@ -52,46 +51,63 @@ class BidsForm(Form):
                              validate_bid_value])
 
     def validate_bid(self, field):
-        stage_id = self.document['current_stage']
-        if self.document['stages'][stage_id]['type'] == 'bids':
+        if self.snapshot['stage'].get('type') == 'bids':
             validate_bid_change_on_bidding(self, field)
         else:
             raise ValidationError(u'Stage not for bidding')
 
     def validate_bidder_id(self, field):
-        stage_id = self.document['current_stage']
-        if self.document['stages'][stage_id]['type'] == 'bids':
+        if self.snapshot['stage'].get('type') == 'bids':
             validate_bidder_id_on_bidding(self, field)
 
 
+def reject_bid(status, message):
+    response = jsonify({'status': 'failed', 'errors': {'bid': [message]}})
+    response.status_code = status
+    response.headers['Retry-After'] = '1'
+    abort(response)
+
+
 def form_handler():
+    """
+    Validate bid against current stage snapshot and queue it for bids
+    consumer. Validation and queueing don't switch greenlets, so bid is
+    queued for the stage it was validated against; stage switches add all
+    queued bids before ending the stage.
+    """
     auction = app.config['auction']
-    with auction.bids_actions:
-        form = app.bids_form.from_json(request.json)
-        form.auction = auction
-        form.document = auction.db.get(auction.auction_doc_id)
-        current_time = datetime.now(timezone('Europe/Kiev'))
-        if form.validate():
-            # write data
-            auction.add_bid(form.document['current_stage'],
-                            {'amount': form.data['bid'],
-                             'bidder_id': form.data['bidder_id'],
-                             'time': current_time.isoformat()})
-            if form.data['bid'] == -1.0:
-                app.logger.info("Bidder {} with client_id {} canceled bids in stage {} in {}".format(
-                    form.data['bidder_id'], session['client_id'],
-                    form.document['current_stage'], current_time.isoformat()
-                ), extra=prepare_extra_journal_fields(request.headers))
-            else:
-                app.logger.info("Bidder {} with client_id {} placed bid {} in {}".format(
-                    form.data['bidder_id'], session['client_id'],
-                    form.data['bid'], current_time.isoformat()
-                ), extra=prepare_extra_journal_fields(request.headers))
-            return {'status': 'ok', 'data': form.data}
+    form = app.bids_form.from_json(request.json)
+    form.auction = auction
+    form.snapshot = auction.stage_snapshot
+    current_time = datetime.now(timezone('Europe/Kiev'))
+    if form.validate():
+        try:
+            auction.enqueue_bid(form.snapshot['current_stage'],
+                                {'amount': form.data['bid'],
+                                 'bidder_id': form.data['bidder_id'],
+                                 'time': current_time.isoformat()})
+        except Full:
+            app.logger.warning("Bids queue is full, bid of bidder {} with client_id {} rejected".format(
+                form.data['bidder_id'], session['client_id']
+            ), extra=prepare_extra_journal_fields(request.headers))
+            if auction.bids_actions.locked():
+                reject_bid(503, u'Stage is switching, try again')
+            reject_bid(429, u'Too many bids, try again')
+        if form.data['bid'] == -1.0:
+            app.logger.info("Bidder {} with client_id {} canceled bids in stage {} in {}".format(
+                form.data['bidder_id'], session['client_id'],
+                form.snapshot['current_stage'], current_time.isoformat()
+            ), extra=prepare_extra_journal_fields(request.headers))
         else:
-            app.logger.info("Bidder {} with client_id {} wants place bid {} in {} with errors {}".format(
-                request.json.get('bidder_id', 'None'), session['client_id'],
-                request.json.get('bid', 'None'), current_time.isoformat(),
-                repr(form.errors)
+            app.logger.info("Bidder {} with client_id {} placed bid {} in {}".format(
+                form.data['bidder_id'], session['client_id'],
+                form.data['bid'], current_time.isoformat()
             ), extra=prepare_extra_journal_fields(request.headers))
-            return {'status': 'failed', 'errors': form.errors}
+        return {'status': 'ok', 'data': form.data}
+    else:
+        app.logger.info("Bidder {} with client_id {} wants place bid {} in {} with errors {}".format(
+            request.json.get('bidder_id', 'None'), session['client_id'],
+            request.json.get('bid', 'None'), current_time.isoformat(),
+            repr(form.errors)
+        ), extra=prepare_extra_journal_fields(request.headers))
+        return {'status': 'failed', 'errors': form.errors}
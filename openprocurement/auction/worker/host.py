@@ -0,0 +1,159 @@
+import logging
+
+from gevent import spawn, joinall
+
+from gevent.pywsgi import WSGIServer
+
+from openprocurement.auction.helpers.system import get_lisener
+from openprocurement.auction.utils import create_mapping
+from openprocurement.auction.event_source import (
+    push_timestamps_events, check_clients
+)
+from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.coordinator import TenderCoordinator
+from openprocurement.auction.worker.server import (
+    create_app, setup_app, _LoggerStream, AuctionsWSGIHandler
+)
+from openprocurement.auction.worker.constants import TENDER_DATA_MAX_AGE
+from openprocurement.auction.worker.journal import (
+    AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER
+)
+
+
+LOGGER = logging.getLogger('Auction Worker')
+
+
+def parse_auctions_list(value):
+    """
+    Parse comma separated list of auctions: tender_id or tender_id:lot_id
+
+    >>> parse_auctions_list('aaa,bbb:ccc')
+    [('aaa', None), ('bbb', 'ccc')]
+    """
+    auctions = []
+    for item in value.split(','):
+        item = item.strip()
+        if item:
+            tender_id, _, lot_id = item.partition(':')
+            auctions.append((tender_id, lot_id or None))
+    return auctions
+
+
+class HostedAuctionServer(object):
+    """Stands for WSGIServer of one auction hosted by AuctionsHost"""
+
+    def __init__(self, host, auction_doc_id, greenlets):
+        self.host = host
+        self.auction_doc_id = auction_doc_id
+        self.greenlets = greenlets
+
+    def stop(self):
+        self.host.apps.pop(self.auction_doc_id, None)
+        for greenlet in self.greenlets:
+            greenlet.kill(block=False)
+
+
+class AuctionsHost(object):
+    """
+    Run many auctions in one process.
+
+    All auctions share one listener; requests are routed by first path
+    segment, which is auction_doc_id. Every auction gets its own Flask
+    application and timeline of stages.
+    """
+
+    def __init__(self, worker_defaults, logger=LOGGER):
+        self.worker_defaults = worker_defaults
+        self.logger = logger
+        self.apps = {}
+        self.lisener = get_lisener(
+            worker_defaults.get("HOST_PORT", worker_defaults["STARTS_PORT"]),
+            host=worker_defaults.get("WORKER_BIND_IP", "")
+        )
+        self.server = WSGIServer(self.lisener, self,
+                                 log=_LoggerStream(logger),
+                                 handler_class=AuctionsWSGIHandler)
+
+    def __call__(self, environ, start_response):
+        auction_doc_id, _, path = environ.get('PATH_INFO', '').lstrip('/').partition('/')
+        auction_app = self.apps.get(auction_doc_id)
+        if auction_app is None:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return ['Auction not found']
+        environ['SCRIPT_NAME'] = '{}/{}'.format(environ.get('SCRIPT_NAME', ''),
+                                               auction_doc_id)
+        environ['PATH_INFO'] = '/' + path
+        return auction_app(environ, start_response)
+
+    def start(self):
+        self.server.start()
+        self.logger.info("Start auctions host on {0}:{1}".format(
+            *self.lisener.getsockname()
+        ))
+
+    def stop(self):
+        self.server.stop()
+
+    def add_auction(self, auction, mapping_expire_time, logger, **kwargs):
+        auction_app = setup_app(create_app(), auction, logger, **kwargs)
+        self.apps[auction.auction_doc_id] = auction_app
+
+        mapping_value = "http://{0}:{1}/{2}/".format(
+            self.lisener.getsockname()[0], self.lisener.getsockname()[1],
+            auction.auction_doc_id
+        )
+        create_mapping(auction.worker_defaults,
+                       auction.auction_doc_id,
+                       mapping_value)
+        logger.info("Server mapping: {} -> {}".format(
+            auction.auction_doc_id,
+            mapping_value,
+        ), extra={"JOURNAL_REQUEST_ID": auction.request_id})
+        return HostedAuctionServer(self, auction.auction_doc_id, [
+            spawn(push_timestamps_events, auction_app),
+            spawn(check_clients, auction_app),
+        ])
+
+    def run_auction(self, auction):
+        try:
+            auction.schedule_auction()
+            auction.wait_to_end()
+        except SystemExit:
+            self.logger.warning(
+                "Auction {} stopped".format(auction.auction_doc_id),
+                extra={"MESSAGE_ID": AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER}
+            )
+        finally:
+            auction.timeline.shutdown()
+            auction.stop_bids_consumer()
+            auction.close_wal()
+            server = getattr(auction, 'server', None)
+            if server:
+                server.stop()
+
+    def run(self, auctions_ids):
+        auctions = [
+            Auction(tender_id,
+                    worker_defaults=self.worker_defaults,
+                    lot_id=lot_id,
+                    host=self)
+            for tender_id, lot_id in auctions_ids
+        ]
+        self.coordinate(auctions)
+        self.start()
+        joinall([spawn(self.run_auction, auction) for auction in auctions])
+        self.stop()
+
+    def coordinate(self, auctions):
+        """Lot auctions of the same tender share one coordinator"""
+        coordinators = {}
+        for auction in auctions:
+            if auction.lot_id:
+                if auction.tender_id not in coordinators:
+                    coordinators[auction.tender_id] = TenderCoordinator(
+                        auction.tender_id,
+                        max_age=self.worker_defaults.get('tender_data_max_age',
+                                                         TENDER_DATA_MAX_AGE)
+                    )
+                coordinators[auction.tender_id].add_auction(auction)
+        return coordinators
@@ -0,0 +1,63 @@
+"""
+Cache of bidders identities verified by OAuth server.
+
+Identity is cached by access token until grant expires, so requests of
+logged in bidder don't go to OAuth server. Concurrent lookups of the same
+token wait for one request to OAuth server instead of making their own.
+"""
+from datetime import datetime
+
+import iso8601
+from dateutil.tz import tzlocal
+from gevent.event import AsyncResult
+
+from openprocurement.auction.utils import get_bidder_id
+
+
+class IdentityCache(object):
+
+    def __init__(self, lookup=get_bidder_id):
+        self.lookup = lookup
+        self.identities = {}
+        self.pending = {}
+
+    def expired(self, bidder_data):
+        expires = bidder_data.get('expires')
+        if not expires:
+            return True
+        return iso8601.parse_date(expires) <= datetime.now(tzlocal())
+
+    def get(self, app, session):
+        """Same as get_bidder_id(app, session)"""
+        token = session.get('remote_oauth')
+        if not token or 'client_id' not in session:
+            return self.lookup(app, session)
+        bidder_data = self.identities.get(token)
+        if bidder_data:
+            if not self.expired(bidder_data):
+                return bidder_data
+            del self.identities[token]
+        pending = self.pending.get(token)
+        if pending is not None:
+            return pending.get()
+
+        pending = self.pending[token] = AsyncResult()
+        try:
+            bidder_data = self.lookup(app, session)
+        except Exception, e:
+            del self.pending[token]
+            pending.set_exception(e)
+            raise
+        del self.pending[token]
+        if bidder_data and not self.expired(bidder_data):
+            self.identities[token] = bidder_data
+        pending.set(bidder_data)
+        return bidder_data
+
+    def invalidate(self, app, token):
+        """Forget identity of token, e.g. on logout"""
+        self.identities.pop(token, None)
+        app.logins_cache.pop(token, None)
+
+    def clear(self):
+        self.identities.clear()
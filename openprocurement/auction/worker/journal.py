@@ -7,10 +7,13 @@ AUCTION_WORKER_DB_SAVE_DOC = uuid.UUID('48b5f9fef4124cf39be6d2e4722a71c3')
 AUCTION_WORKER_DB_SAVE_DOC_ERROR = uuid.UUID('b219ee898b834628be23424d0c27a8b8')
 AUCTION_WORKER_DB_GET_DOC_UNHANDLED_ERROR = uuid.UUID('2188fca7e99a4d409817567f894421cd')
 AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR = uuid.UUID('4b650dea8eb84412a4d630265587dbcb')
+AUCTION_WORKER_DB_SAVE_DOC_CONFLICT = uuid.UUID('35e8499a4693487ba930b5396edd50f9')
+AUCTION_WORKER_DB_SAVE_DOC_DELTA = uuid.UUID('0fce785a727b463f88d7838dc8448faf')
 
 AUCTION_WORKER_SERVICE_PREPARE_SERVER = uuid.UUID('7ddc92a966f7492e8dbf59f7916831c4')
 AUCTION_WORKER_SERVICE_STOP_AUCTION_WORKER = uuid.UUID('e7c0a6eb8ec441e2a7cf32bad5ffa57a')
 AUCTION_WORKER_SERVICE_START_AUCTION = uuid.UUID('79385d0af3e94fd2bcada5857b38214a')
+AUCTION_WORKER_SERVICE_WARM_UP = uuid.UUID('9c2e7f4b1a6d48e3b5f0d8a7c3e1b296')
 AUCTION_WORKER_SERVICE_END_FIRST_PAUSE = uuid.UUID('2411cf51e6a24f62bcd9c501a862e48f')
 AUCTION_WORKER_SERVICE_END_BID_STAGE = uuid.UUID('27f118f3a8014152bd55223126c5d163')
 AUCTION_WORKER_SERVICE_START_STAGE = uuid.UUID('5daf4199824a4c3da4c773240a8558ce')
@@ -21,8 +24,13 @@ AUCTION_WORKER_SERVICE_AUCTION_CANCELED = uuid.UUID('77568c4543e24b70a7633d87153
 AUCTION_WORKER_SERVICE_AUCTION_STATUS_CANCELED = uuid.UUID('38b2145fa25d41198493526085168bd2')
 AUCTION_WORKER_SERVICE_AUCTION_RESCHEDULE = uuid.UUID('f11bba4b55d547f1aa2e8cb2e13e4485')
 AUCTION_WORKER_SERVICE_AUCTION_NOT_FOUND = uuid.UUID('ff4a1d5cf0134bf48a458b65805c9a6e')
+AUCTION_WORKER_SERVICE_RESTORED_FROM_WAL = uuid.UUID('fc7c9ebadf1648828595981cb223f812')
+AUCTION_WORKER_SERVICE_STALE_WAL_DISCARDED = uuid.UUID('7d2e94b1c05a4f3e8b6a1d9c3f52e078')
+AUCTION_WORKER_SERVICE_STAGE_SWITCH_LATENESS = uuid.UUID('3e5b0c4a9d2f47b18c6e1f7a2d90b534')
 
 AUCTION_WORKER_BIDS_LATEST_BID_CANCELLATION = uuid.UUID('c558309b45004ce2bd52ec4845e43b48')
+AUCTION_WORKER_BIDS_STALE_BID_DROPPED = uuid.UUID('8d6f0b2e5a3c4e71b9f4d2a6c1e07f35')
+AUCTION_WORKER_BIDS_ADD_BID_ERROR = uuid.UUID('4a1f7c93e2b84d6aa05c8e1d7b3f6920')
 
 AUCTION_WORKER_API_AUDIT_LOG_APPROVED = uuid.UUID('569dced149e5409d85f3078b8a3dbf9b')
 AUCTION_WORKER_API_AUDIT_LOG_NOT_APPROVED = uuid.UUID('16e7263c1bcb413a8e3ec3c42aa8bee4')
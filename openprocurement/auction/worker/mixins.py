@@ -1,24 +1,33 @@
 import logging
 import json
+import os
 import iso8601
-from datetime import datetime, timedelta
+from datetime import timedelta
 from copy import deepcopy
-from dateutil.tz import tzlocal
 from yaml import safe_dump as yaml_dump
-from couchdb.http import HTTPError, RETRYABLE_ERRORS
+from couchdb.http import HTTPError, RETRYABLE_ERRORS, ResourceNotFound,\
+    ResourceConflict
 from fractions import Fraction
 from barbecue import cooking
+from gevent import spawn, sleep
+from gevent.queue import Empty
+from random import uniform
 
 from openprocurement.auction.utils import\
     filter_amount, generate_request_id, make_request,\
-    get_latest_bid_for_bidder, sorting_by_amount,\
     sorting_start_bids_by_amount
 from openprocurement.auction.worker.auctions import\
     simple, multilot
 from openprocurement.auction.worker.utils import prepare_bids_stage,\
-    prepare_service_stage, prepare_initial_bid_stage, prepare_results_stage
+    prepare_service_stage, prepare_initial_bid_stage, prepare_results_stage,\
+    prepare_stage_snapshot, calculate_bid_ceiling, snapshot_public_document,\
+    diff_public_documents, merge_public_documents, Leaderboard
 from openprocurement.auction.worker.constants import ROUNDS, TIMEZONE, BIDS_SECONDS,\
-    FIRST_PAUSE_SECONDS, PAUSE_SECONDS, BIDS_KEYS_FOR_COPY
+    FIRST_PAUSE_SECONDS, PAUSE_SECONDS, BIDS_KEYS_FOR_COPY, WORKER_OWNED_FIELDS,\
+    SAVE_RETRIES, SAVE_CONFLICT_BACKOFF, SAVE_CONFLICT_BACKOFF_MAX
+from openprocurement.auction.worker.design import DELTA_UPDATE_HANDLER
+from openprocurement.auction.worker.wal import WriteAheadLog, read_journal,\
+    replay_journal, EVENT_BID, EVENT_STAGE, EVENT_RUN
 from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_DB_GET_DOC,
     AUCTION_WORKER_DB_GET_DOC_ERROR,
@@ -26,17 +35,26 @@ from openprocurement.auction.worker.journal import (
     AUCTION_WORKER_DB_SAVE_DOC,
     AUCTION_WORKER_DB_SAVE_DOC_ERROR,
     AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR,
+    AUCTION_WORKER_DB_SAVE_DOC_CONFLICT,
+    AUCTION_WORKER_DB_SAVE_DOC_DELTA,
     AUCTION_WORKER_API_AUDIT_LOG_APPROVED,
     AUCTION_WORKER_API_AUDIT_LOG_NOT_APPROVED,
     AUCTION_WORKER_BIDS_LATEST_BID_CANCELLATION,
+    AUCTION_WORKER_BIDS_STALE_BID_DROPPED,
+    AUCTION_WORKER_BIDS_ADD_BID_ERROR,
     AUCTION_WORKER_API_AUCTION_RESULT_NOT_APPROVED,
     AUCTION_WORKER_SERVICE_END_BID_STAGE,
     AUCTION_WORKER_SERVICE_START_STAGE,
     AUCTION_WORKER_SERVICE_START_NEXT_STAGE,
+    AUCTION_WORKER_SERVICE_RESTORED_FROM_WAL,
+    AUCTION_WORKER_SERVICE_STALE_WAL_DISCARDED,
+    AUCTION_WORKER_SERVICE_STAGE_SWITCH_LATENESS,
 )
 
 
 LOGGER = logging.getLogger("Auction Worker")
+PUBLIC_MASKED_SECTIONS = ('initial_bids', 'stages', 'results')
+JOURNALED_SECTIONS = ('initial_bids', 'stages', 'results', 'current_stage')
 
 
 class DBServiceMixin(object):
@@ -48,18 +66,73 @@ class DBServiceMixin(object):
         else:
             simple.get_auction_info(self, prepare)
 
+    def get_tender_resource(self, url, **kwargs):
+        """
+        Get resource from tenders API. If tender_data_memo is shared between
+        auctions, every resource is downloaded only once for all of them.
+        Lot auctions with coordinator share resources of tender. Data
+        downloaded before is revalidated by tender_cache and downloaded
+        again only if tender was changed.
+        """
+        memo = self.tender_data_memo
+        if memo is not None and url in memo:
+            return deepcopy(memo[url])
+        if self.coordinator is not None:
+            return self.coordinator.get_resource(self, url, **kwargs)
+        data = self.tender_cache.get(url, self.session, request_id=self.request_id, **kwargs)
+        if memo is not None and data:
+            memo[url] = deepcopy(data)
+        return data
+
+    def forget_tender_data(self):
+        """Remove resources of tender from tender_cache"""
+        self.tender_cache.remove(self.tender_url)
+        self.tender_cache.remove(self.tender_url + '/auction',
+                                 user=self.worker_defaults["resource_api_token"])
+
+    def fetch_auction_data(self, prepare=False):
+        if prepare:
+            auction_data = self.get_tender_resource(self.tender_url)
+        else:
+            auction_data = {'data': {}}
+        auction_info = self.get_tender_resource(
+            self.tender_url + '/auction',
+            user=self.worker_defaults["resource_api_token"]
+        )
+        if auction_info:
+            auction_data['data'].update(auction_info['data'])
+            return auction_data
+
     def prepare_public_document(self):
-        public_document = deepcopy(dict(self.auction_document))
+        """
+        Build document for couchdb sharing structure with auction_document.
+
+        Only top level dict is copied. When amounts have to be hidden,
+        masked copies of sections are cached and reused until the section
+        is replaced or invalidated with invalidate_public_document.
+        """
+        public_document = dict(self.auction_document)
         not_last_stage = self.auction_document["current_stage"] not in (len(self.auction_document["stages"]) - 1,
                                                                         len(self.auction_document["stages"]) - 2,)
         if self.features and not_last_stage:
-            for stage_name in ['initial_bids', 'stages', 'results']:
-                public_document[stage_name] = map(
-                    filter_amount,
-                    public_document[stage_name]
-                )
+            for section in PUBLIC_MASKED_SECTIONS:
+                public_document[section] = self.get_masked_section(section)
         return public_document
 
+    def get_masked_section(self, section):
+        items = self.auction_document[section]
+        cached = self._public_sections.get(section)
+        if cached and cached[0] is items and len(cached[1]) == len(items):
+            return cached[1]
+        masked = [filter_amount(dict(item)) for item in items]
+        self._public_sections[section] = (items, masked)
+        return masked
+
+    def invalidate_public_document(self, *sections):
+        """Drop cached masked sections, all of them if none given"""
+        for section in sections or PUBLIC_MASKED_SECTIONS:
+            self._public_sections.pop(section, None)
+
     def get_auction_document(self, force=False):
         retries = self.retries
         while retries:
@@ -94,8 +167,13 @@ class DBServiceMixin(object):
 
     def save_auction_document(self):
         public_document = self.prepare_public_document()
-        retries = 10
-        while retries:
+        if self.delta_saves and self._public_base is not None and \
+                self._public_base.get('_rev') == public_document.get('_rev'):
+            response = self.save_auction_document_delta(public_document)
+            if response:
+                return response
+        conflicts = 0
+        for attempt in range(SAVE_RETRIES):
             try:
                 response = self.db.save(public_document)
                 if len(response) == 2:
@@ -103,28 +181,137 @@ class DBServiceMixin(object):
                                 extra={"JOURNAL_REQUEST_ID": self.request_id,
                                        "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC})
                     self.auction_document['_rev'] = response[1]
+                    self._public_base = snapshot_public_document(public_document)
+                    self.save_stats['saves'] += 1
                     return response
+            except ResourceConflict, e:
+                conflicts += 1
+                self.save_stats['conflicts'] += 1
+                LOGGER.warning("Conflict while save document: {}".format(e),
+                               extra={"JOURNAL_REQUEST_ID": self.request_id,
+                                      "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC_CONFLICT})
+                sleep(self.get_conflict_backoff(conflicts))
+                public_document = self.merge_auction_document(public_document)
             except HTTPError, e:
                 LOGGER.error("Error while save document: {}".format(e),
                              extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
             except Exception, e:
-                ecode = e.args[0]
+                ecode = e.args[0] if e.args else None
                 if ecode in RETRYABLE_ERRORS:
                     LOGGER.error("Error while save document: {}".format(e),
                                  extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
                 else:
                     LOGGER.critical("Unhandled error: {}".format(e),
                                     extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR})
-            if "_rev" in public_document:
-                LOGGER.debug("Retry save document changes")
-            saved_auction_document = self.get_auction_document(force=True)
-            public_document["_rev"] = saved_auction_document["_rev"]
-            retries -= 1
-
-    def prepare_auction_document(self):
-        self.generate_request_id()
-        public_document = self.get_auction_document()
-
+        self.save_stats['failed'] += 1
+        LOGGER.error("Auction document {} not saved after {} attempts".format(
+            self.auction_doc_id, SAVE_RETRIES),
+            extra={"JOURNAL_REQUEST_ID": self.request_id,
+                   "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC_ERROR})
+
+    def get_conflict_backoff(self, conflicts):
+        """Bounded exponential backoff with jitter"""
+        delay = min(SAVE_CONFLICT_BACKOFF * 2 ** (conflicts - 1), SAVE_CONFLICT_BACKOFF_MAX)
+        return uniform(delay / 2, delay)
+
+    def merge_auction_document(self, public_document):
+        """
+        Merge public document with changes made by other writers since
+        last save. Fields which are taken from remote document are also
+        applied to auction_document, so they are not overwritten later.
+        """
+        remote = self.get_auction_document(force=True)
+        if not remote:
+            return public_document
+        merged = merge_public_documents(self._public_base, public_document,
+                                        remote, WORKER_OWNED_FIELDS)
+        for key, value in merged.items():
+            if key in PUBLIC_MASKED_SECTIONS and self.features:
+                continue
+            if key not in public_document or public_document[key] != value:
+                self.auction_document[key] = value
+        for key in set(public_document) - set(merged):
+            self.auction_document.pop(key, None)
+        self._public_base = snapshot_public_document(remote)
+        self.save_stats['merged'] += 1
+        return merged
+
+    def save_auction_document_delta(self, public_document):
+        """
+        Send only changed parts of public document to couchdb update handler.
+
+        Returns None if delta can't be applied, so caller falls back to
+        saving whole document.
+        """
+        changes, removed = diff_public_documents(self._public_base, public_document)
+        if not changes and not removed:
+            return (self.auction_doc_id, public_document['_rev'])
+        delta = {"_rev": public_document['_rev'], "set": changes, "unset": removed}
+        try:
+            headers, _ = self.db.update_doc(DELTA_UPDATE_HANDLER,
+                                            self.auction_doc_id, body=delta)
+        except ResourceNotFound, e:
+            LOGGER.warning("Delta update handler not available, "
+                           "fall back to full document saves: {}".format(e),
+                           extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
+            self.delta_saves = False
+            return
+        except HTTPError, e:
+            LOGGER.error("Error while save document changes: {}".format(e),
+                         extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
+            return
+        except Exception, e:
+            LOGGER.error("Error while save document changes: {}".format(e),
+                         extra={'MESSAGE_ID': AUCTION_WORKER_DB_SAVE_DOC_ERROR})
+            return
+        rev = headers.get('X-Couch-Update-NewRev')
+        if not rev:
+            return
+        LOGGER.info("Saved {0} changes of auction document {1} with rev {2}".format(
+            len(changes) + len(removed), self.auction_doc_id, rev),
+            extra={"JOURNAL_REQUEST_ID": self.request_id,
+                   "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC_DELTA})
+        self.auction_document['_rev'] = rev
+        public_document['_rev'] = rev
+        self._public_base = snapshot_public_document(public_document)
+        return (self.auction_doc_id, rev)
+
+    def persist_auction_document(self):
+        """
+        Queue in-memory auction document for write-behind save.
+
+        The worker is the only writer while auction is running, so
+        self.auction_document is the source of truth. Requests made while
+        a save is in progress are coalesced into one more save.
+        """
+        self.journal_stage()
+        self._persisted.clear()
+        self._persist_pending.set()
+        if self._persister is None or self._persister.dead:
+            self._persister = spawn(self._write_behind)
+
+    def _write_behind(self):
+        try:
+            while self._persist_pending.is_set():
+                self._persist_pending.clear()
+                try:
+                    self.save_auction_document()
+                except Exception, e:
+                    self.save_stats['failed'] += 1
+                    LOGGER.critical("Auction document {} not saved: {}".format(
+                        self.auction_doc_id, e),
+                        extra={"JOURNAL_REQUEST_ID": self.request_id,
+                               "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC_UNHANDLED_ERROR})
+        finally:
+            self._persisted.set()
+
+    def flush_auction_document(self):
+        """Wait until all queued changes are saved to couchdb"""
+        self._persisted.wait()
+
+    def init_auction_document(self, public_document=None):
+        self.invalidate_public_document()
+        self._public_base = None
         self.auction_document = {}
         if public_document:
             self.auction_document = {"_rev": public_document["_rev"]}
@@ -132,6 +319,25 @@ class DBServiceMixin(object):
             self.auction_document['mode'] = 'test'
             self.auction_document['test_auction_data'] = deepcopy(self._auction_data)
 
+    def build_auction_document(self):
+        if self.lot_id:
+            self.auction_document = multilot.prepare_auction_document(self)
+        else:
+            self.auction_document = simple.prepare_auction_document(self)
+        return self.auction_document
+
+    def is_quick_sandbox_mode(self):
+        if self.worker_defaults.get('sandbox_mode', False):
+            submissionMethodDetails = self._auction_data['data'].get('submissionMethodDetails', '')
+            return submissionMethodDetails in ('quick(mode:no-auction)',
+                                               'quick(mode:fast-forward)')
+        return False
+
+    def prepare_auction_document(self):
+        self.generate_request_id()
+        public_document = self.get_auction_document()
+        self.init_auction_document(public_document)
+
         self.get_auction_info(prepare=True)
         if self.worker_defaults.get('sandbox_mode', False):
             submissionMethodDetails = self._auction_data['data'].get('submissionMethodDetails', '')
@@ -142,10 +348,7 @@ class DBServiceMixin(object):
                     simple.post_results_data(self, with_auctions_results=False)
                 return 0
             elif submissionMethodDetails == 'quick(mode:fast-forward)':
-                if self.lot_id:
-                    self.auction_document = multilot.prepare_auction_document(self)
-                else:
-                    self.auction_document = simple.prepare_auction_document(self)
+                self.build_auction_document()
                 if not self.debug:
                     self.set_auction_and_participation_urls()
                 self.get_auction_info()
@@ -159,11 +362,7 @@ class DBServiceMixin(object):
                 self.save_auction_document()
                 return
 
-        if self.lot_id:
-            self.auction_document = multilot.prepare_auction_document(self)
-        else:
-            self.auction_document = simple.prepare_auction_document(self)
-
+        self.build_auction_document()
         self.save_auction_document()
         if not self.debug:
             self.set_auction_and_participation_urls()
@@ -194,13 +393,11 @@ class AuditServiceMixin(object):
             self.audit['timeline']['round_{}'.format(round_number)] = {}
 
     def approve_audit_info_on_bid_stage(self):
-        turn_in_round = self.current_stage - (
-            self.current_round * (self.bidders_count + 1) - self.bidders_count
-        ) + 1
+        turn_in_round = self.stage_layout.turn_of(self.current_stage)
         round_label = 'round_{}'.format(self.current_round)
         turn_label = 'turn_{}'.format(turn_in_round)
         self.audit['timeline'][round_label][turn_label] = {
-            'time': datetime.now(tzlocal()).isoformat(),
+            'time': self.now().isoformat(),
             'bidder': self.auction_document["stages"][self.current_stage].get('bidder_id', '')
         }
         if self.auction_document["stages"][self.current_stage].get('changed', False):
@@ -216,7 +413,7 @@ class AuditServiceMixin(object):
 
     def approve_audit_info_on_announcement(self, approved={}):
         self.audit['timeline']['results'] = {
-            "time": datetime.now(tzlocal()).isoformat(),
+            "time": self.now().isoformat(),
             "bids": []
         }
         for bid in self.auction_document['results']:
@@ -228,6 +425,27 @@ class AuditServiceMixin(object):
             if approved:
                 bid_result_audit["identification"] = approved[bid['bidder_id']]
             self.audit['timeline']['results']['bids'].append(bid_result_audit)
+        if self.bids_history:
+            self.audit['bids_history'] = list(self.bids_history)
+        if self.timeline.lateness.count:
+            self.audit['stage_switches_lateness'] = self.timeline.lateness.as_dict()
+
+    def record_stage_switch(self, entry, lateness):
+        if entry.action == self.warm_up:
+            return
+        self.audit.setdefault('stage_switches', []).append({
+            'name': entry.name,
+            'target': entry.run_date.isoformat(),
+            'actual': (entry.run_date + timedelta(seconds=lateness)).isoformat(),
+            'lateness': round(lateness, 6)
+        })
+        LOGGER.info(
+            "Stage switch '{}' lateness: {:.6f}s, wake-up compensation: {:.6f}s".format(
+                entry.name, lateness, self.timeline.compensation
+            ),
+            extra={"JOURNAL_REQUEST_ID": self.request_id,
+                   "MESSAGE_ID": AUCTION_WORKER_SERVICE_STAGE_SWITCH_LATENESS}
+        )
 
     def upload_audit_file_with_document_service(self, doc_id=None):
         files = {'file': ('audit_{}.yaml'.format(self.auction_doc_id),
@@ -300,14 +518,62 @@ class DateTimeServiceMixin(object):
     def convert_datetime(self, datetime_stamp):
         return iso8601.parse_date(datetime_stamp).astimezone(TIMEZONE)
 
+    def now(self):
+        return self.timeline.clock.now()
+
 
 class BiddersServiceMixin(object):
     """Mixin class to work with bids data"""
 
     def add_bid(self, round_id, bid):
         if round_id not in self._bids_data:
-            self._bids_data[round_id] = []
-        self._bids_data[round_id].append(bid)
+            self._bids_data[round_id] = {}
+        self._bids_data[round_id][bid['bidder_id']] = bid
+        if self.bids_history is not None:
+            self.bids_history.append(dict(bid, stage=round_id))
+        if self.wal:
+            self.wal.append(EVENT_BID, stage=round_id, bid=bid)
+
+    def enqueue_bid(self, round_id, bid):
+        """
+        Queue validated bid to be added by bids consumer. Raises
+        gevent.queue.Full if queue is full.
+        """
+        self.bids_queue.put_nowait((round_id, bid))
+        if self._bids_consumer is None or self._bids_consumer.dead:
+            self._bids_consumer = spawn(self._consume_bids)
+
+    def _consume_bids(self):
+        while True:
+            self.bids_queue.peek()
+            with self.bids_actions:
+                self.drain_bids_queue()
+
+    def stop_bids_consumer(self):
+        consumer, self._bids_consumer = self._bids_consumer, None
+        if consumer is not None:
+            consumer.kill()
+
+    def drain_bids_queue(self):
+        """Add all queued bids, caller must hold bids_actions"""
+        while True:
+            try:
+                round_id, bid = self.bids_queue.get_nowait()
+            except Empty:
+                return
+            if round_id != self.stage_snapshot['current_stage']:
+                LOGGER.warning("Drop bid of bidder {} for finished stage {}".format(
+                    bid['bidder_id'], round_id),
+                    extra={"JOURNAL_REQUEST_ID": self.request_id,
+                           "MESSAGE_ID": AUCTION_WORKER_BIDS_STALE_BID_DROPPED})
+                continue
+            try:
+                self.add_bid(round_id, bid)
+            except Exception, e:
+                LOGGER.error("Failed to add bid of bidder {} on stage {}: {}".format(
+                    bid['bidder_id'], round_id, e),
+                    extra={"JOURNAL_REQUEST_ID": self.request_id,
+                           "MESSAGE_ID": AUCTION_WORKER_BIDS_ADD_BID_ERROR})
 
     def filter_bids_keys(self, bids):
         filtered_bids_data = []
@@ -327,16 +593,19 @@ class BiddersServiceMixin(object):
             simple.prepare_auction_and_participation_urls(self)
 
     def approve_bids_information(self):
-        if self.current_stage in self._bids_data:
+        # Bids of stage are not needed after approval
+        stage_bids = self._bids_data.pop(self.current_stage, None)
+        if stage_bids:
             LOGGER.info(
-                "Current stage bids {}".format(self._bids_data[self.current_stage]),
+                "Current stage bids {}".format(stage_bids.values()),
                 extra={"JOURNAL_REQUEST_ID": self.request_id}
             )
 
-            bid_info = get_latest_bid_for_bidder(
-                self._bids_data[self.current_stage],
+            bid_info = stage_bids.get(
                 self.auction_document["stages"][self.current_stage]['bidder_id']
             )
+            if bid_info is None:
+                return False
             if bid_info['amount'] == -1.0:
                 LOGGER.info(
                     "Latest bid is bid cancellation: {}".format(bid_info),
@@ -353,6 +622,11 @@ class BiddersServiceMixin(object):
                 bid_info
             )
             self.auction_document["stages"][self.current_stage]["changed"] = True
+            self.invalidate_public_document('stages')
+            if self.leaderboard is not None:
+                self.leaderboard.update(self.filter_bids_keys(
+                    [self.auction_document["stages"][self.current_stage]]
+                )[0])
 
             return True
         else:
@@ -403,17 +677,119 @@ class PostAuctionServiceMixin(object):
         self.save_auction_document()
 
 
+class WALServiceMixin(object):
+    """Mixin class to journal bids and stages for crash recovery"""
+
+    def get_wal_path(self):
+        wal_dir = self.worker_defaults.get('wal_dir')
+        if wal_dir:
+            return os.path.join(wal_dir, '{}.wal'.format(self.auction_doc_id))
+
+    def get_wal_run(self):
+        """Identity of scheduled run of auction, stored as first journal record"""
+        return {
+            'start': self.auction_document['stages'][0]['start'],
+            'bidders': sorted(bid_info['id'] for bid_info in self.bidders_data),
+        }
+
+    def open_wal(self):
+        path = self.get_wal_path()
+        if path:
+            new = not os.path.exists(path) or not os.path.getsize(path)
+            self.wal = WriteAheadLog(
+                path, self.worker_defaults.get('wal_fsync_interval', 0.05)
+            )
+            if new:
+                self.wal.append(EVENT_RUN, run=self.get_wal_run())
+
+    def close_wal(self, remove=False):
+        if self.wal:
+            self.wal.close(remove=remove)
+            self.wal = None
+
+    def journal_stage(self):
+        if self.wal:
+            self.wal.append(EVENT_STAGE, audit=self.audit, document={
+                key: self.auction_document[key] for key in JOURNALED_SECTIONS
+                if key in self.auction_document
+            })
+
+    def recover_from_wal(self):
+        """
+        Restore bids, audit and stages of running auction from journal.
+        Returns True if auction was restored.
+        """
+        path = self.get_wal_path()
+        if not path or not os.path.exists(path):
+            return False
+        state = replay_journal(read_journal(path))
+        if not state or state['run'] != self.get_wal_run():
+            self.discard_wal(path, "not of scheduled run")
+            return False
+        current_stage = state['document']['current_stage']
+        if not 0 <= current_stage < len(state['document']['stages']) - 1:
+            self.discard_wal(path, "on stage {}".format(current_stage))
+            return False
+        self.auction_document.update(state['document'])
+        self.audit = state['audit']
+        self._bids_data = {
+            stage: bids for stage, bids in state['bids'].items()
+            if stage >= current_stage
+        }
+        self.leaderboard = None
+        self.invalidate_public_document()
+        self.refresh_bids_ceilings()
+        LOGGER.warning("Auction restored from journal on stage {}".format(current_stage),
+                       extra={"JOURNAL_REQUEST_ID": self.request_id,
+                              "MESSAGE_ID": AUCTION_WORKER_SERVICE_RESTORED_FROM_WAL})
+        return True
+
+    def discard_wal(self, path, reason):
+        """Move aside journal which can't be replayed"""
+        os.rename(path, path + '.stale')
+        LOGGER.warning("Journal {} {} discarded".format(path, reason),
+                       extra={"JOURNAL_REQUEST_ID": self.request_id,
+                              "MESSAGE_ID": AUCTION_WORKER_SERVICE_STALE_WAL_DISCARDED})
+
+
 class StagesServiceMixin(object):
 
+    def refresh_stage_snapshot(self):
+        """
+        Replace snapshot of current stage used for bids validation.
+
+        Snapshot is rebuilt as a new object, so readers always see either
+        the previous or the next stage, never a partially updated one.
+        """
+        self.stage_snapshot = prepare_stage_snapshot(
+            self.auction_document, self.stage_snapshot['version'] + 1,
+            max_bid=self.bids_ceilings.get(self.auction_document['current_stage'])
+        )
+
+    def calculate_bid_ceiling(self, stage):
+        minimal_step = self.auction_document.get('minimalStep', {}).get('amount')
+        if minimal_step is None:
+            return None
+        if self.features:
+            return calculate_bid_ceiling(
+                stage, minimal_step,
+                self.bidders_coeficient[stage['bidder_id']]
+            )
+        return calculate_bid_ceiling(stage, minimal_step)
+
+    def refresh_bids_ceilings(self):
+        self.bids_ceilings = {}
+        self.leaderboard = None
+        current_stage = self.auction_document["current_stage"]
+        for index, stage in enumerate(self.auction_document["stages"]):
+            if index >= current_stage and stage['type'] == 'bids':
+                self.bids_ceilings[index] = self.calculate_bid_ceiling(stage)
+
     def get_round_number(self, stage):
-        for index, end_stage in enumerate(self.rounds_stages):
-            if stage < end_stage:
-                return index
-        return ROUNDS
+        return self.stage_layout.round_of(stage)
 
     def get_round_stages(self, round_num):
-        return (round_num * (self.bidders_count + 1) - self.bidders_count,
-                round_num * (self.bidders_count + 1), )
+        return self.stage_layout.round_stages(round_num)
 
     def prepare_auction_stages_fast_forward(self):
         self.auction_document['auction_type'] = 'meat' if self.features else 'default'
@@ -444,7 +820,9 @@ class StagesServiceMixin(object):
                 initial_bid_stage
             )
         self.auction_document['stages'] = []
-        next_stage_timedelta = datetime.now(tzlocal())
+        self.bids_ceilings = {}
+        self.leaderboard = None
+        next_stage_timedelta = self.now()
         for round_id in xrange(ROUNDS):
             # Schedule PAUSE Stage
             pause_stage = prepare_service_stage(
@@ -476,49 +854,31 @@ class StagesServiceMixin(object):
                 type="announcement"
             )
         )
-        all_bids = deepcopy(self.auction_document["initial_bids"])
-        minimal_bids = []
-        for bid_info in self.bidders_data:
-            minimal_bids.append(get_latest_bid_for_bidder(
-                all_bids, str(bid_info['id'])
-            ))
-
-        minimal_bids = self.filter_bids_keys(sorting_by_amount(minimal_bids))
-        self.update_future_bidding_orders(minimal_bids)
+        self.leaderboard = self.build_leaderboard(self.auction_document["initial_bids"])
+        self.update_future_bidding_orders(self.leaderboard.ordered())
 
         self.auction_document['endDate'] = next_stage_timedelta.isoformat()
         self.auction_document["current_stage"] = len(self.auction_document["stages"]) - 2
 
     def end_bids_stage(self, switch_to_round=None):
         self.generate_request_id()
-        self.bids_actions.acquire()
-        self.get_auction_document()
+        self.flush_auction_document()
         LOGGER.info(
             '---------------- End Bids Stage ----------------',
             extra={"JOURNAL_REQUEST_ID": self.request_id,
                    "MESSAGE_ID": AUCTION_WORKER_SERVICE_END_BID_STAGE}
         )
+        self.bids_actions.acquire()
+        self.drain_bids_queue()
 
         self.current_round = self.get_round_number(
             self.auction_document["current_stage"]
         )
         self.current_stage = self.auction_document["current_stage"]
 
-        if self.approve_bids_information():
-            LOGGER.info("Approved bid on current stage")
-            start_stage, end_stage = self.get_round_stages(self.current_round)
-            all_bids = deepcopy(
-                self.auction_document["stages"][start_stage:end_stage]
-            )
-            minimal_bids = []
-            for bid_info in self.bidders_data:
-                minimal_bids.append(
-                    get_latest_bid_for_bidder(all_bids, bid_info['id'])
-                )
-            minimal_bids = self.filter_bids_keys(
-                sorting_by_amount(minimal_bids)
-            )
-            self.update_future_bidding_orders(minimal_bids)
+        approved = self.approve_bids_information()
+        if approved:
+            self.update_future_bidding_orders(self.get_leaderboard().ordered())
 
         self.approve_audit_info_on_bid_stage()
 
@@ -526,19 +886,45 @@ class StagesServiceMixin(object):
             self.auction_document["current_stage"] = switch_to_round
         else:
             self.auction_document["current_stage"] += 1
+        self.refresh_stage_snapshot()
+        self.bids_actions.release()
 
+        if approved:
+            LOGGER.info("Approved bid on current stage")
         LOGGER.info('---------------- Start stage {0} ----------------'.format(
             self.auction_document["current_stage"]),
             extra={"JOURNAL_REQUEST_ID": self.request_id,
                    "MESSAGE_ID": AUCTION_WORKER_SERVICE_START_STAGE}
         )
-        self.save_auction_document()
+        self.persist_auction_document()
         if self.auction_document["stages"][self.auction_document["current_stage"]]['type'] == 'pre_announcement':
             self.end_auction()
-        self.bids_actions.release()
         if self.auction_document["current_stage"] == (len(self.auction_document["stages"]) - 1):
             self._end_auction_event.set()
 
+    def build_leaderboard(self, bids):
+        """Leaderboard of latest bids from bids listed in bidding order"""
+        leaderboard = Leaderboard(bid_info['id'] for bid_info in self.bidders_data)
+        for bid in bids:
+            if bid['bidder_id'] in leaderboard.positions:
+                leaderboard.update(self.filter_bids_keys([bid])[0])
+        return leaderboard
+
+    def get_leaderboard(self):
+        """
+        Leaderboard maintained since auction start or restored from
+        stages of current round, e.g. after recovery from journal.
+        """
+        if self.leaderboard is None:
+            current_round = self.get_round_number(self.auction_document["current_stage"])
+            if current_round:
+                start_stage, end_stage = self.get_round_stages(current_round)
+                bids = self.auction_document["stages"][start_stage:end_stage]
+            else:
+                bids = self.auction_document["initial_bids"]
+            self.leaderboard = self.build_leaderboard(bids)
+        return self.leaderboard
+
     def update_future_bidding_orders(self, bids):
         current_round = self.get_round_number(
             self.auction_document["current_stage"]
@@ -551,10 +937,14 @@ class StagesServiceMixin(object):
                     self.auction_document["stages"][stage],
                     bids[index]
                 )
+                self.bids_ceilings[stage] = self.calculate_bid_ceiling(
+                    self.auction_document["stages"][stage]
+                )
 
         self.auction_document["results"] = []
         for item in bids:
             self.auction_document["results"].append(prepare_results_stage(**item))
+        self.invalidate_public_document('stages', 'results')
 
     def prepare_auction_stages(self):
         # Initital Bids
@@ -570,6 +960,8 @@ class StagesServiceMixin(object):
                 )
             )
         self.auction_document['stages'] = []
+        self.bids_ceilings = {}
+        self.leaderboard = None
         next_stage_timedelta = self.startDate
         for round_id in xrange(ROUNDS):
             # Schedule PAUSE Stage
@@ -613,15 +1005,17 @@ class StagesServiceMixin(object):
 
     def next_stage(self, switch_to_round=None):
         self.generate_request_id()
+        self.flush_auction_document()
         self.bids_actions.acquire()
-        self.get_auction_document()
+        self.drain_bids_queue()
 
         if isinstance(switch_to_round, int):
             self.auction_document["current_stage"] = switch_to_round
         else:
             self.auction_document["current_stage"] += 1
-        self.save_auction_document()
+        self.refresh_stage_snapshot()
         self.bids_actions.release()
+        self.persist_auction_document()
         LOGGER.info('---------------- Start stage {0} ----------------'.format(
             self.auction_document["current_stage"]),
             extra={"JOURNAL_REQUEST_ID": self.request_id,
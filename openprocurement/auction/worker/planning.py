@@ -0,0 +1,70 @@
+import logging
+
+from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.journal import (
+    AUCTION_WORKER_DB_SAVE_DOC,
+    AUCTION_WORKER_DB_SAVE_DOC_ERROR
+)
+
+
+LOGGER = logging.getLogger('Auction Worker')
+
+
+def plan_auctions(auctions_ids, worker_defaults):
+    """
+    Prepare auction documents for many auctions in one process.
+
+    All auctions share requests and couchdb sessions, every tender resource
+    is downloaded only once (e.g. for all lots of multilot tender) and all
+    documents are written with one _bulk_docs request.
+    """
+    auctions = []
+    tender_data_memo = {}
+    for tender_id, lot_id in auctions_ids:
+        auction = Auction(tender_id, worker_defaults=worker_defaults, lot_id=lot_id)
+        if auctions:
+            auction.session = auctions[0].session
+            auction.db = auctions[0].db
+        auction.tender_data_memo = tender_data_memo
+        auctions.append(auction)
+    if not auctions:
+        return []
+    db = auctions[0].db
+
+    revisions = {}
+    for row in db.view('_all_docs', keys=[a.auction_doc_id for a in auctions]):
+        if row.value and not row.value.get('deleted'):
+            revisions[row.key] = {'_rev': row.value['rev']}
+
+    planned = []
+    for auction in auctions:
+        auction.generate_request_id()
+        auction.init_auction_document(revisions.get(auction.auction_doc_id))
+        try:
+            auction.get_auction_info(prepare=True)
+        except SystemExit:
+            # Auction was cancelled or not exists, already logged
+            continue
+        if auction.is_quick_sandbox_mode():
+            auction.prepare_auction_document()
+            continue
+        auction.build_auction_document()
+        planned.append(auction)
+
+    if not planned:
+        return planned
+    results = db.update([auction.prepare_public_document() for auction in planned])
+    for auction, (success, doc_id, rev) in zip(planned, results):
+        if success:
+            auction.auction_document['_rev'] = rev
+            LOGGER.info("Saved auction document {0} with rev {1}".format(doc_id, rev),
+                        extra={"JOURNAL_REQUEST_ID": auction.request_id,
+                               "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC})
+        else:
+            LOGGER.error("Error while save document {0}: {1}".format(doc_id, rev),
+                         extra={"JOURNAL_REQUEST_ID": auction.request_id,
+                                "MESSAGE_ID": AUCTION_WORKER_DB_SAVE_DOC_ERROR})
+            auction.save_auction_document()
+        if not auction.debug:
+            auction.set_auction_and_participation_urls()
+    return planned
@@ -1,5 +1,6 @@
 from flask_oauthlib.client import OAuth
-from flask import Flask, request, jsonify, url_for, session, abort, redirect
+from flask import Flask, request, jsonify, url_for, session, abort, redirect,\
+    current_app
 import os
 from urlparse import urljoin
 import iso8601
@@ -12,7 +13,8 @@ from datetime import datetime, timedelta
 from openprocurement.auction.worker.forms import BidsForm, form_handler
 from openprocurement.auction.helpers.system import get_lisener
 from openprocurement.auction.utils import create_mapping,\
-    prepare_extra_journal_fields, get_bidder_id
+    prepare_extra_journal_fields
+from openprocurement.auction.worker.identity import IdentityCache
 from openprocurement.auction.event_source import (
     sse, send_event, send_event_to_client, remove_client,
     push_timestamps_events, check_clients
@@ -22,12 +24,6 @@ from pytz import timezone as tz
 from gevent import spawn
 
 
-app = Flask(__name__)
-app.auction_bidders = {}
-app.register_blueprint(sse)
-app.secret_key = os.urandom(24)
-app.logins_cache = {}
-
 INVALIDATE_GRANT = timedelta(0, 230)
 
 
@@ -69,76 +65,72 @@ class AuctionsWSGIHandler(WSGIHandler):
             log.write(self.format_request(), extra=extra)
 
 
-@app.route('/login')
 def login():
     if 'bidder_id' in request.args and 'hash' in request.args:
-        for bidder_info in app.config['auction'].bidders_data:
-            if bidder_info['id'] == request.args['bidder_id']:
-                next_url = request.args.get('next') or request.referrer or None
-                if 'X-Forwarded-Path' in request.headers:
-                    callback_url = urljoin(
-                        request.headers['X-Forwarded-Path'],
-                        'authorized'
-                    )
-                else:
-                    callback_url = url_for('authorized', next=next_url, _external=True)
-                response = app.remote_oauth.authorize(
-                    callback=callback_url,
-                    bidder_id=request.args['bidder_id'],
-                    hash=request.args['hash']
+        if request.args['bidder_id'] in current_app.config['auction'].bidders_registry:
+            next_url = request.args.get('next') or request.referrer or None
+            if 'X-Forwarded-Path' in request.headers:
+                callback_url = urljoin(
+                    request.headers['X-Forwarded-Path'],
+                    'authorized'
                 )
-                if 'return_url' in request.args:
-                    session['return_url'] = request.args['return_url']
-                session['login_bidder_id'] = request.args['bidder_id']
-                session['login_hash'] = request.args['hash']
-                session['login_callback'] = callback_url
-                app.logger.debug("Session: {}".format(repr(session)))
-                return response
+            else:
+                callback_url = url_for('authorized', next=next_url, _external=True)
+            response = current_app.remote_oauth.authorize(
+                callback=callback_url,
+                bidder_id=request.args['bidder_id'],
+                hash=request.args['hash']
+            )
+            if 'return_url' in request.args:
+                session['return_url'] = request.args['return_url']
+            session['login_bidder_id'] = request.args['bidder_id']
+            session['login_hash'] = request.args['hash']
+            session['login_callback'] = callback_url
+            current_app.logger.debug("Session: {}".format(repr(session)))
+            return response
     return abort(401)
 
 
-@app.route('/authorized')
 def authorized():
     if not('error' in request.args and request.args['error'] == 'access_denied'):
-        resp = app.remote_oauth.authorized_response()
+        resp = current_app.remote_oauth.authorized_response()
         if resp is None or hasattr(resp, 'data'):
-            app.logger.info("Error Response from Oauth: {}".format(resp))
+            current_app.logger.info("Error Response from Oauth: {}".format(resp))
             return abort(403, 'Access denied')
-        app.logger.info("Get response from Oauth: {}".format(repr(resp)))
+        current_app.logger.info("Get response from Oauth: {}".format(repr(resp)))
         session['remote_oauth'] = (resp['access_token'], '')
         session['client_id'] = os.urandom(16).encode('hex')
     else:
-        app.logger.info("Error on user authorization. Error: {}".format(
+        current_app.logger.info("Error on user authorization. Error: {}".format(
             request.args.get('error', ''))
             )
         return abort(403, 'Access denied')
-    bidder_data = get_bidder_id(app, session)
-    app.logger.info("Bidder {} with client_id {} authorized".format(
+    bidder_data = current_app.identity_cache.get(current_app, session)
+    current_app.logger.info("Bidder {} with client_id {} authorized".format(
                     bidder_data.get('bidder_id'), session.get('client_id'),
                     ), extra=prepare_extra_journal_fields(request.headers))
 
-    app.logger.debug("Session: {}".format(repr(session)))
+    current_app.logger.debug("Session: {}".format(repr(session)))
     response = redirect(
         urljoin(request.headers['X-Forwarded-Path'], '.').rstrip('/')
     )
     response.set_cookie('auctions_loggedin', '1',
-                        path=app.config['SESSION_COOKIE_PATH'],
+                        path=current_app.config['SESSION_COOKIE_PATH'],
                         secure=False, httponly=False, max_age=36000
                         )
     return response
 
 
-@app.route('/relogin')
 def relogin():
     if (all([key in session
              for key in ['login_callback', 'login_bidder_id', 'login_hash']])):
         if 'amount' in request.args:
             session['amount'] = request.args['amount']
-        app.logger.debug("Session: {}".format(repr(session)))
-        app.logger.info("Bidder {} with login_hash {} start re-login".format(
+        current_app.logger.debug("Session: {}".format(repr(session)))
+        current_app.logger.info("Bidder {} with login_hash {} start re-login".format(
                         session['login_bidder_id'], session['login_hash'],
                         ), extra=prepare_extra_journal_fields(request.headers))
-        return app.remote_oauth.authorize(
+        return current_app.remote_oauth.authorize(
             callback=session['login_callback'],
             bidder_id=session['login_bidder_id'],
             hash=session['login_hash'],
@@ -149,67 +141,63 @@ def relogin():
     )
 
 
-@app.route('/check_authorization', methods=['POST'])
 def check_authorization():
     if 'remote_oauth' in session and 'client_id' in session:
-        # resp = app.remote_oauth.get('me')
-        bidder_data = get_bidder_id(app, session)
+        # resp = current_app.remote_oauth.get('me')
+        bidder_data = current_app.identity_cache.get(current_app, session)
         if bidder_data:
             grant_timeout = iso8601.parse_date(bidder_data[u'expires']) - datetime.now(tzlocal())
             if grant_timeout > INVALIDATE_GRANT:
-                app.logger.info("Bidder {} with client_id {} pass check_authorization".format(
+                current_app.logger.info("Bidder {} with client_id {} pass check_authorization".format(
                                 bidder_data['bidder_id'], session['client_id'],
                                 ), extra=prepare_extra_journal_fields(request.headers))
                 return jsonify({'status': 'ok'})
             else:
-                app.logger.info(
+                current_app.logger.info(
                     "Grant will end in a short time. Activate re-login functionality",
                     extra=prepare_extra_journal_fields(request.headers)
                 )
         else:
-            app.logger.warning("Client_id {} didn't passed check_authorization".format(session['client_id']),
+            current_app.logger.warning("Client_id {} didn't passed check_authorization".format(session['client_id']),
                                extra=prepare_extra_journal_fields(request.headers))
     abort(401)
 
 
-@app.route('/logout')
 def logout():
     if 'remote_oauth' in session and 'client_id' in session:
-        bidder_data = get_bidder_id(app, session)
+        bidder_data = current_app.identity_cache.get(current_app, session)
         if bidder_data:
             remove_client(bidder_data['bidder_id'], session['client_id'])
             send_event(
                 bidder_data['bidder_id'],
-                app.auction_bidders[bidder_data['bidder_id']]["clients"],
+                current_app.auction_bidders[bidder_data['bidder_id']]["clients"],
                 "ClientsList"
             )
+        current_app.identity_cache.invalidate(current_app, session['remote_oauth'])
     session.clear()
     return redirect(
         urljoin(request.headers['X-Forwarded-Path'], '.').rstrip('/')
     )
 
 
-
-@app.route('/postbid', methods=['POST'])
 def post_bid():
     if 'remote_oauth' in session and 'client_id' in session:
-        bidder_data = get_bidder_id(app, session)
+        bidder_data = current_app.identity_cache.get(current_app, session)
         if bidder_data and bidder_data['bidder_id'] == request.json['bidder_id']:
-            return jsonify(app.form_handler())
+            return jsonify(current_app.form_handler())
         else:
-            app.logger.warning("Client with client id: {} and bidder_id {} wants post bid but response status from Oauth".format(
+            current_app.logger.warning("Client with client id: {} and bidder_id {} wants post bid but response status from Oauth".format(
                 session.get('client_id', 'None'), request.json.get('bidder_id', 'None')
             ))
     abort(401)
 
 
-@app.route('/kickclient', methods=['POST'])
 def kickclient():
     if 'remote_oauth' in session and 'client_id' in session:
-        auction = app.config['auction']
+        auction = current_app.config['auction']
         with auction.bids_actions:
             data = request.json
-            bidder_data = get_bidder_id(app, session)
+            bidder_data = current_app.identity_cache.get(current_app, session)
             if bidder_data:
                 data['bidder_id'] = bidder_data['bidder_id']
                 if 'client_id' in data:
@@ -222,33 +210,64 @@ def kickclient():
     abort(401)
 
 
-def run_server(auction, mapping_expire_time, logger,
-               timezone='Europe/Kiev', bids_form=BidsForm, form_handler=form_handler, cookie_path='tenders'):
-    app.config.update(auction.worker_defaults)
+def create_app():
+    """Create Flask application which serves one auction"""
+    auction_app = Flask(__name__)
+    auction_app.auction_bidders = {}
+    auction_app.register_blueprint(sse)
+    auction_app.secret_key = os.urandom(24)
+    auction_app.logins_cache = {}
+    auction_app.identity_cache = IdentityCache()
+    auction_app.add_url_rule('/login', 'login', login)
+    auction_app.add_url_rule('/authorized', 'authorized', authorized)
+    auction_app.add_url_rule('/relogin', 'relogin', relogin)
+    auction_app.add_url_rule('/check_authorization', 'check_authorization',
+                             check_authorization, methods=['POST'])
+    auction_app.add_url_rule('/logout', 'logout', logout)
+    auction_app.add_url_rule('/postbid', 'post_bid', post_bid, methods=['POST'])
+    auction_app.add_url_rule('/kickclient', 'kickclient', kickclient,
+                             methods=['POST'])
+    return auction_app
+
+
+app = create_app()
+
+
+def setup_app(auction_app, auction, logger, timezone='Europe/Kiev',
+              bids_form=BidsForm, form_handler=form_handler,
+              cookie_path='tenders'):
+    auction_app.config.update(auction.worker_defaults)
     # Replace Flask custom logger
-    app.logger_name = logger.name
-    app._logger = logger
-    app.config['auction'] = auction
-    app.config['timezone'] = tz(timezone)
-    app.config['SESSION_COOKIE_PATH'] = '/{}/{}'.format(cookie_path, auction.auction_doc_id)
-    app.config['SESSION_COOKIE_NAME'] = 'auction_session'
-    app.oauth = OAuth(app)
-    app.bids_form = bids_form
-    app.form_handler = form_handler
-    app.remote_oauth = app.oauth.remote_app(
+    auction_app.logger_name = logger.name
+    auction_app._logger = logger
+    auction_app.config['auction'] = auction
+    auction_app.config['timezone'] = tz(timezone)
+    auction_app.config['SESSION_COOKIE_PATH'] = '/{}/{}'.format(cookie_path, auction.auction_doc_id)
+    auction_app.config['SESSION_COOKIE_NAME'] = 'auction_session'
+    auction_app.oauth = OAuth(auction_app)
+    auction_app.bids_form = bids_form
+    auction_app.form_handler = form_handler
+    auction_app.remote_oauth = auction_app.oauth.remote_app(
         'remote',
-        consumer_key=app.config['OAUTH_CLIENT_ID'],
-        consumer_secret=app.config['OAUTH_CLIENT_SECRET'],
+        consumer_key=auction_app.config['OAUTH_CLIENT_ID'],
+        consumer_secret=auction_app.config['OAUTH_CLIENT_SECRET'],
         request_token_params={'scope': 'email'},
-        base_url=app.config['OAUTH_BASE_URL'],
-        access_token_url=app.config['OAUTH_ACCESS_TOKEN_URL'],
-        authorize_url=app.config['OAUTH_AUTHORIZE_URL']
+        base_url=auction_app.config['OAUTH_BASE_URL'],
+        access_token_url=auction_app.config['OAUTH_ACCESS_TOKEN_URL'],
+        authorize_url=auction_app.config['OAUTH_AUTHORIZE_URL']
     )
 
-    @app.remote_oauth.tokengetter
+    @auction_app.remote_oauth.tokengetter
     def get_oauth_token():
         return session.get('remote_oauth')
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = 'true'
+    return auction_app
+
+
+def run_server(auction, mapping_expire_time, logger,
+               timezone='Europe/Kiev', bids_form=BidsForm, form_handler=form_handler, cookie_path='tenders'):
+    setup_app(app, auction, logger, timezone=timezone, bids_form=bids_form,
+              form_handler=form_handler, cookie_path=cookie_path)
 
     # Start server on unused port
     lisener = get_lisener(auction.worker_defaults["STARTS_PORT"],
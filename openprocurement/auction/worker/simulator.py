@@ -0,0 +1,255 @@
+"""
+Deterministic auction simulator.
+
+Drives a full Auction from start_auction through every stage switch to
+end_auction on a virtual clock. Auction document is kept in memory, tender
+data is generated or passed in as in test mode, and bids of scripted
+bidders are validated with BidsForm as on /postbid. Nothing sleeps, so
+whole auction takes as long as the stage engine computations.
+"""
+import json
+from copy import deepcopy
+from math import floor
+from datetime import datetime, timedelta
+from random import Random
+from uuid import uuid4
+
+from couchdb.http import ResourceConflict
+from dateutil.tz import tzlocal
+
+from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.forms import BidsForm
+from openprocurement.auction.worker.utils import calculate_bid_ceiling
+
+
+SIMULATOR_DEFAULTS = {
+    "resource_api_server": "http://127.0.0.1/",
+    "resource_api_version": "2.3",
+    "resource_api_token": "",
+    "resource_name": "tenders",
+    "COUCH_DATABASE": "http://127.0.0.1:5984/auctions",
+    "AUCTIONS_URL": "http://127.0.0.1/auctions/{auction_id}",
+    "HASH_SECRET": "",
+}
+
+
+class VirtualClock(object):
+    """Clock which moves only when somebody waits or sleeps on it"""
+
+    def __init__(self, start=None):
+        self.start = start or datetime.now(tzlocal())
+        self.elapsed = 0.0
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return self.elapsed
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.elapsed += seconds
+
+    def wait(self, event, timeout):
+        if timeout is None:
+            return event.wait()
+        if not event.is_set():
+            self.advance(timeout)
+        return event.is_set()
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+class MemoryDatabase(object):
+    """Part of couchdb.Database interface used by auction worker"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def get(self, doc_id, default=None):
+        if doc_id not in self.docs:
+            return default
+        return json.loads(self.docs[doc_id])
+
+    def save(self, doc):
+        stored = self.get(doc['_id'])
+        if stored is not None and stored['_rev'] != doc.get('_rev'):
+            raise ResourceConflict(('conflict', 'Document update conflict.'))
+        revision = int(stored['_rev'].split('-')[0]) + 1 if stored else 1
+        doc['_rev'] = '{}-{}'.format(revision, uuid4().hex)
+        self.docs[doc['_id']] = json.dumps(doc, default=str)
+        return doc['_id'], doc['_rev']
+
+
+FEATURE = {
+    "code": "SIMULATED-YEARS",
+    "featureOf": "tenderer",
+    "title": "Years trading",
+    "enum": [{"value": 0.05, "title": "Less than 3 years"},
+             {"value": 0.1, "title": "From 3 to 5 years"},
+             {"value": 0.15, "title": "More than 5 years"}]
+}
+
+
+def generate_tender_data(bidders_count, start, tender_id='UA-SIMULATION',
+                         amount=500000.0, minimal_step=5000.0, seed=0,
+                         features=False):
+    """
+    Tender in test auction data format with bidders_count active bids,
+    MEAT tender with one tenderer feature if features is True.
+    """
+    random = Random(seed)
+    bids = []
+    for index in xrange(bidders_count):
+        bid = {
+            'id': uuid4().hex if seed is None else '{:032x}'.format(random.getrandbits(128)),
+            'date': (start - timedelta(days=1, seconds=index)).isoformat(),
+            'value': {'amount': amount - minimal_step * random.randint(0, 20),
+                      'currency': 'UAH',
+                      'valueAddedTaxIncluded': True}
+        }
+        if features:
+            bid['parameters'] = [{'code': FEATURE['code'],
+                                  'value': random.choice(FEATURE['enum'])['value']}]
+        bids.append(bid)
+    tender_data = {'data': {
+        'tenderID': tender_id,
+        'title': 'Simulated tender',
+        'description': 'Simulated tender',
+        'procurementMethodType': 'belowThreshold',
+        'auctionPeriod': {'startDate': start.isoformat(), 'endDate': None},
+        'value': {'amount': amount, 'currency': 'UAH', 'valueAddedTaxIncluded': True},
+        'minimalStep': {'amount': minimal_step, 'currency': 'UAH',
+                        'valueAddedTaxIncluded': True},
+        'procuringEntity': {},
+        'items': [],
+        'bids': bids,
+    }}
+    if features:
+        tender_data['data']['features'] = [deepcopy(FEATURE)]
+    return tender_data
+
+
+def bid_ceiling(auction, snapshot):
+    """
+    Highest amount current bidder can bid on current stage, rounded down
+    to cents as bidders enter it.
+    """
+    ceiling = snapshot.get('max_bid')
+    if ceiling is None:
+        coeficient = None
+        if auction.features:
+            coeficient = auction.bidders_coeficient[snapshot['stage']['bidder_id']]
+        ceiling = calculate_bid_ceiling(snapshot['stage'], snapshot['minimalStep']['amount'],
+                                        coeficient)
+    return floor(ceiling * 100) / 100.0
+
+
+def ceiling_strategy(auction, snapshot):
+    """Every bidder bids highest allowed amount on every turn"""
+    return bid_ceiling(auction, snapshot)
+
+
+def random_strategy(seed=0, probability=0.5, max_steps=3):
+    """Bidders randomly skip turn or go below ceiling by few minimal steps"""
+    random = Random(seed)
+
+    def strategy(auction, snapshot):
+        if random.random() >= probability:
+            return None
+        step = snapshot['minimalStep']['amount']
+        amount = bid_ceiling(auction, snapshot) - step * random.randint(0, max_steps - 1)
+        return amount if amount > 0 else None
+    return strategy
+
+
+def replay_strategy(bids):
+    """
+    Repeat bids from log, every bid is dict with stage, bidder_id and
+    amount keys.
+    """
+    script = {(bid['stage'], bid['bidder_id']): bid['amount'] for bid in bids}
+
+    def strategy(auction, snapshot):
+        return script.get((snapshot['current_stage'], snapshot['stage']['bidder_id']))
+    return strategy
+
+
+class AuctionSimulator(object):
+
+    def __init__(self, auction_data, strategy=ceiling_strategy, worker_defaults=None,
+                 lot_id=None, clock=None, bid_lead=1.0):
+        self.clock = clock or VirtualClock()
+        defaults = dict(SIMULATOR_DEFAULTS)
+        defaults.update(worker_defaults or {})
+        self.auction = Auction(auction_data['data']['tenderID'],
+                               worker_defaults=defaults,
+                               auction_data=auction_data,
+                               lot_id=lot_id,
+                               clock=self.clock)
+        self.auction.db = MemoryDatabase()
+        self.strategy = strategy
+        self.bid_lead = bid_lead
+        self.placed = []
+        self.rejected = []
+
+    def prepare(self):
+        auction = self.auction
+        auction.prepare_auction_document()
+        auction.get_auction_info()
+        auction.prepare_audit()
+        auction.prepare_auction_stages()
+        auction.refresh_stage_snapshot()
+        auction.save_auction_document()
+        auction.plan_timeline()
+
+    def place_bid(self, bidder_id, amount):
+        auction = self.auction
+        form = BidsForm.from_json({'bidder_id': bidder_id, 'bid': amount})
+        form.auction = auction
+        form.snapshot = auction.stage_snapshot
+        if form.validate():
+            bid = {'amount': form.data['bid'],
+                   'bidder_id': form.data['bidder_id'],
+                   'time': auction.now().isoformat()}
+            auction.add_bid(form.snapshot['current_stage'], bid)
+            self.placed.append(dict(bid, stage=form.snapshot['current_stage']))
+            return True
+        self.rejected.append({'stage': form.snapshot['current_stage'],
+                              'bidder_id': bidder_id, 'amount': amount,
+                              'errors': form.errors})
+        return False
+
+    def play_stage(self, deadline):
+        """Let bidder of current stage bid bid_lead seconds before its end"""
+        snapshot = self.auction.stage_snapshot
+        if snapshot['stage'].get('type') != 'bids':
+            return
+        self.clock.advance(deadline - self.bid_lead - self.clock.monotonic())
+        amount = self.strategy(self.auction, snapshot)
+        if amount is not None:
+            self.place_bid(snapshot['stage']['bidder_id'], amount)
+
+    def run(self):
+        """Run whole auction, returns its results"""
+        self.prepare()
+        timeline = self.auction.timeline
+        while timeline.entries:
+            entry = timeline.entries[0]
+            self.play_stage(entry.deadline)
+            self.clock.advance(entry.deadline - self.clock.monotonic())
+            timeline.run_entry(timeline.entries.pop(0))
+        self.auction.flush_auction_document()
+        return self.auction.auction_document['results']
+
+
+def simulate(bidders_count, strategy=ceiling_strategy, seed=0, features=False,
+             **kwargs):
+    """Simulate auction of generated tender with bidders_count bidders"""
+    clock = VirtualClock()
+    tender_data = generate_tender_data(bidders_count, clock.now() + timedelta(seconds=60),
+                                       seed=seed, features=features)
+    simulator = AuctionSimulator(tender_data, strategy=strategy, clock=clock, **kwargs)
+    simulator.run()
+    return simulator
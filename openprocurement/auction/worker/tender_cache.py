@@ -0,0 +1,122 @@
+"""
+Cache of tenders API resources revalidated with conditional requests.
+
+Every downloaded resource is kept with its ETag and Last-Modified headers,
+in memory and, if directory is given, in a local file, so worker started
+for auction run revalidates data downloaded on planning. Next GET of the
+resource sends If-None-Match/If-Modified-Since and full data is downloaded
+only when tender was changed.
+
+Files in tender_cache_dir hold /tenders/{id}/auction data, i.e. bids with
+their values before the auction, so they are created readable by owner
+only, and the directory must not be shared. Resources of tender are
+removed when its auction ends.
+"""
+import json
+import logging
+import os
+from copy import deepcopy
+from hashlib import sha1
+from uuid import uuid4
+
+from gevent import sleep
+from requests.exceptions import RequestException
+
+
+LOGGER = logging.getLogger('Auction Worker')
+
+
+class TenderDataCache(object):
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.entries = {}
+        self.stats = {'downloaded': 0, 'not_modified': 0}
+
+    def key(self, url, user=''):
+        return sha1('{}\n{}'.format(user, url)).hexdigest()
+
+    def path(self, key):
+        if self.directory:
+            return os.path.join(self.directory, '{}.json'.format(key))
+
+    def load(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry
+        path = self.path(key)
+        if path and os.path.exists(path):
+            try:
+                with open(path) as stream:
+                    entry = json.load(stream)
+            except (IOError, ValueError), e:
+                LOGGER.warning("Can't read cached tender data {}: {}".format(path, e))
+                return None
+            self.entries[key] = entry
+        return entry
+
+    def store(self, key, entry):
+        self.entries[key] = entry
+        path = self.path(key)
+        if path:
+            tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), uuid4().hex)
+            try:
+                fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+                with os.fdopen(fd, 'w') as stream:
+                    json.dump(entry, stream)
+                os.rename(tmp_path, path)
+            except (IOError, OSError), e:
+                LOGGER.warning("Can't write cached tender data {}: {}".format(path, e))
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+    def remove(self, url, user=''):
+        """Forget resource, e.g. when auction ends"""
+        key = self.key(url, user)
+        self.entries.pop(key, None)
+        path = self.path(key)
+        if path and os.path.exists(path):
+            try:
+                os.unlink(path)
+            except OSError, e:
+                LOGGER.warning("Can't remove cached tender data {}: {}".format(path, e))
+
+    def get(self, url, session, user='', password='', retry_count=10, request_id=None):
+        """Same as get_tender_data, but revalidates cached data"""
+        key = self.key(url, user)
+        entry = self.load(key)
+        headers = {'content-type': 'application/json', 'X-Client-Request-ID': request_id}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        auth = (user, password) if user or password else None
+
+        for iteration in xrange(retry_count):
+            try:
+                response = session.get(url, auth=auth, headers=headers, timeout=300)
+            except RequestException, e:
+                LOGGER.error("Request error {} error: {}".format(url, e),
+                             extra={"JOURNAL_REQUEST_ID": request_id})
+            else:
+                if response.status_code == 304 and entry:
+                    self.stats['not_modified'] += 1
+                    LOGGER.info("Tender data {} not modified".format(url),
+                                extra={"JOURNAL_REQUEST_ID": request_id})
+                    return deepcopy(entry['data'])
+                if response.status_code == 200:
+                    data = response.json()
+                    self.stats['downloaded'] += 1
+                    if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+                        self.store(key, {'etag': response.headers.get('ETag'),
+                                         'last_modified': response.headers.get('Last-Modified'),
+                                         'data': data})
+                    return deepcopy(data)
+                LOGGER.warning("Status code {} for {}".format(response.status_code, url),
+                               extra={"JOURNAL_REQUEST_ID": request_id})
+            sleep(pow(iteration, 2))
+        return None
+
+    def clear(self):
+        self.entries.clear()
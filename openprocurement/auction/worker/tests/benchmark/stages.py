@@ -0,0 +1,251 @@
+"""
+Benchmarks of auction stage engine and bids ingestion.
+
+Auctions are built by simulator with in-memory document store and
+generated tender data, so only worker code is measured. Run with
+
+    python -m openprocurement.auction.worker.tests.benchmark.stages \\
+        --output benchmark.json --baseline previous.json
+
+Exit code is 1 if any benchmark is slower than its threshold.
+"""
+import argparse
+import json
+import logging
+import sys
+from datetime import timedelta
+from timeit import default_timer
+
+from flask import session
+
+from openprocurement.auction.worker.forms import form_handler
+from openprocurement.auction.worker.server import create_app, setup_app
+from openprocurement.auction.worker.simulator import AuctionSimulator, VirtualClock,\
+    generate_tender_data, bid_ceiling, simulate
+
+
+BIDDERS = (2, 10, 50, 200)
+BENCHMARK_DEFAULTS = {
+    "OAUTH_CLIENT_ID": "",
+    "OAUTH_CLIENT_SECRET": "",
+    "OAUTH_BASE_URL": "",
+    "OAUTH_ACCESS_TOKEN_URL": "",
+    "OAUTH_AUTHORIZE_URL": "",
+}
+LOGGER = logging.getLogger('Auction Worker Benchmark')
+# Limits in seconds checked on every run, --thresholds file overrides them
+THRESHOLDS = {
+    'simulate_auction[50]': 1.0,
+}
+
+
+def make_auction(bidders, features):
+    clock = VirtualClock()
+    tender_data = generate_tender_data(bidders, clock.now() + timedelta(seconds=60),
+                                       features=features)
+    simulator = AuctionSimulator(tender_data, worker_defaults=BENCHMARK_DEFAULTS,
+                                 clock=clock)
+    auction = simulator.auction
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_audit()
+    return simulator
+
+
+def started_auction(bidders, features):
+    simulator = make_auction(bidders, features)
+    auction = simulator.auction
+    auction.prepare_auction_stages()
+    auction.refresh_stage_snapshot()
+    auction.start_auction()
+    auction.end_first_pause()
+    return simulator
+
+
+def place_bid(simulator):
+    auction = simulator.auction
+    snapshot = auction.stage_snapshot
+    auction.add_bid(snapshot['current_stage'], {
+        'amount': bid_ceiling(auction, snapshot),
+        'bidder_id': snapshot['stage']['bidder_id'],
+        'time': auction.now().isoformat()
+    })
+
+
+def last_stage_auction(bidders, features):
+    simulator = started_auction(bidders, features)
+    auction = simulator.auction
+    auction.auction_document['current_stage'] = len(auction.auction_document['stages']) - 2
+    return simulator
+
+
+def bench_prepare_auction_stages(bidders, features):
+    auction = make_auction(bidders, features).auction
+    return auction.prepare_auction_stages
+
+
+def bench_start_auction(bidders, features):
+    auction = make_auction(bidders, features).auction
+    auction.prepare_auction_stages()
+    auction.refresh_stage_snapshot()
+    return auction.start_auction
+
+
+def bench_start_auction_warm(bidders, features):
+    auction = make_auction(bidders, features).auction
+    auction.prepare_auction_stages()
+    auction.refresh_stage_snapshot()
+    auction.warm_up()
+    return auction.start_auction
+
+
+def bench_end_bids_stage(bidders, features):
+    simulator = started_auction(bidders, features)
+    place_bid(simulator)
+    return lambda: simulator.auction.end_bids_stage(switch_to_round=2)
+
+
+def bench_update_future_bidding_orders(bidders, features):
+    auction = started_auction(bidders, features).auction
+    bids = auction.get_leaderboard().ordered()
+    return lambda: auction.update_future_bidding_orders(bids)
+
+
+def bench_prepare_public_document(bidders, features):
+    auction = started_auction(bidders, features).auction
+    return auction.prepare_public_document
+
+
+def bench_form_handler(bidders, features):
+    simulator = started_auction(bidders, features)
+    auction = simulator.auction
+    app = setup_app(create_app(), auction, LOGGER)
+    snapshot = auction.stage_snapshot
+    data = json.dumps({'bidder_id': snapshot['stage']['bidder_id'],
+                       'bid': bid_ceiling(auction, snapshot)})
+
+    def post_bid():
+        with app.test_request_context('/postbid', method='POST', data=data,
+                                      content_type='application/json'):
+            session['client_id'] = 'benchmark'
+            result = form_handler()
+        assert result['status'] == 'ok', result
+    return post_bid
+
+
+def bench_end_auction(bidders, features):
+    auction = last_stage_auction(bidders, features).auction
+    return auction.end_auction
+
+
+def bench_simulate_auction(bidders, features):
+    return lambda: simulate(bidders, features=features)
+
+
+BENCHMARKS = (
+    ('prepare_auction_stages', bench_prepare_auction_stages),
+    ('start_auction', bench_start_auction),
+    ('start_auction_warm', bench_start_auction_warm),
+    ('end_bids_stage', bench_end_bids_stage),
+    ('update_future_bidding_orders', bench_update_future_bidding_orders),
+    ('prepare_public_document', bench_prepare_public_document),
+    ('form_handler', bench_form_handler),
+    ('end_auction', bench_end_auction),
+    ('simulate_auction', bench_simulate_auction),
+)
+
+
+def case_name(name, bidders, features):
+    return '{}[{}{}]'.format(name, bidders, '-features' if features else '')
+
+
+def measure(setup, bidders, features, repeat):
+    """Time repeat runs, every run gets freshly prepared auction"""
+    timings = []
+    for _ in xrange(repeat):
+        call = setup(bidders, features)
+        started = default_timer()
+        call()
+        timings.append(default_timer() - started)
+    timings.sort()
+    return {
+        'min': timings[0],
+        'median': timings[len(timings) // 2],
+        'max': timings[-1],
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(bidders=BIDDERS, repeat=5, names=None):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for count in bidders:
+            for features in (False, True):
+                results[case_name(name, count, features)] = measure(
+                    setup, count, features, repeat
+                )
+    return results
+
+
+def check_results(results, baseline=None, tolerance=0.25, thresholds=None):
+    """
+    Return list of failures. Median of every case is compared with median
+    in baseline results increased by tolerance and with absolute limit in
+    seconds from thresholds, which are looked up by case name and then by
+    benchmark name.
+    """
+    failures = []
+    for case, result in sorted(results.items()):
+        if baseline and case in baseline:
+            limit = baseline[case]['median'] * (1 + tolerance)
+            if result['median'] > limit:
+                failures.append('{}: {:.6f}s is slower than baseline {:.6f}s'.format(
+                    case, result['median'], baseline[case]['median']))
+        if thresholds:
+            limit = thresholds.get(case, thresholds.get(case.split('[')[0]))
+            if limit is not None and result['median'] > limit:
+                failures.append('{}: {:.6f}s exceeds threshold {:.6f}s'.format(
+                    case, result['median'], limit))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auction worker benchmarks')
+    parser.add_argument('--bidders', type=lambda value: [int(i) for i in value.split(',')],
+                        default=BIDDERS, help='comma separated bidders counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', action='append', help='run only named benchmark')
+    parser.add_argument('--output', help='write results as JSON to file')
+    parser.add_argument('--baseline', help='JSON results of previous run')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against baseline, 0.25 is 25%%')
+    parser.add_argument('--thresholds', help='JSON with limits in seconds')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.disable(logging.WARNING)
+    results = run_benchmarks(args.bidders, args.repeat, args.only)
+    for case, result in sorted(results.items()):
+        print '{:<50} {:>12.6f} {:>12.6f}'.format(case, result['median'], result['max'])
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2, sort_keys=True)
+
+    baseline = None
+    thresholds = dict(THRESHOLDS)
+    if args.baseline:
+        with open(args.baseline) as stream:
+            baseline = json.load(stream)
+    if args.thresholds:
+        with open(args.thresholds) as stream:
+            thresholds.update(json.load(stream))
+    failures = check_results(results, baseline, args.tolerance, thresholds)
+    for failure in failures:
+        print failure
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
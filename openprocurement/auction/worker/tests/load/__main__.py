@@ -0,0 +1,7 @@
+from gevent import monkey
+monkey.patch_all()
+
+from openprocurement.auction.worker.tests.load.bidders import main
+
+
+main()
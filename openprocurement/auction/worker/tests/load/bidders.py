@@ -0,0 +1,250 @@
+"""
+Load generator for in-process auction worker server.
+
+Starts worker Flask application of a running auction on a local port with
+OAuth provider replaced by a local one, then runs many bidder clients,
+each doing login -> /authorized -> /check_authorization -> /postbid ->
+event source subscription, and reports latency percentiles, throughput and
+error rates of every step. Run with
+
+    python -m openprocurement.auction.worker.tests.load \\
+        --bidders 50 --clients 2000 --concurrency 500
+
+Clients need patched sockets, which is done in __main__ of this package
+only, so importing this module doesn't patch the importing process.
+"""
+import argparse
+import json
+import logging
+from datetime import datetime, timedelta
+from math import ceil
+from timeit import default_timer
+from urlparse import urljoin
+
+import requests
+from dateutil.tz import tzlocal
+from flask import redirect, request, session
+from gevent import spawn, sleep
+from gevent.pool import Pool
+from gevent.pywsgi import WSGIServer
+
+from openprocurement.auction.event_source import push_timestamps_events,\
+    check_clients
+from openprocurement.auction.helpers.system import get_lisener
+from openprocurement.auction.worker.server import create_app, setup_app,\
+    AuctionsWSGIHandler, _LoggerStream
+from openprocurement.auction.worker.simulator import AuctionSimulator,\
+    generate_tender_data, bid_ceiling
+from openprocurement.auction.worker.timeline import Clock
+
+
+LOGGER = logging.getLogger('Auction Worker Load')
+LOAD_DEFAULTS = {
+    "OAUTH_CLIENT_ID": "",
+    "OAUTH_CLIENT_SECRET": "",
+    "OAUTH_BASE_URL": "",
+    "OAUTH_ACCESS_TOKEN_URL": "",
+    "OAUTH_AUTHORIZE_URL": "",
+}
+STEPS = ('login', 'authorized', 'check_authorization', 'postbid', 'event_source')
+
+
+class _Response(object):
+    status = 200
+
+    def __init__(self, data):
+        self.data = data
+
+
+class LocalOAuth(object):
+    """
+    Stand-in for remote OAuth application. Access token is issued for
+    bidder right away and registered in logins cache, so get_bidder_id
+    never leaves the process.
+    """
+
+    def __init__(self, auction_app, grant_seconds=3600):
+        self.app = auction_app
+        self.grant_seconds = grant_seconds
+
+    def grant(self, bidder_id):
+        return {
+            'bidder_id': bidder_id,
+            'expires': (datetime.now(tzlocal()) +
+                        timedelta(seconds=self.grant_seconds)).isoformat()
+        }
+
+    def authorize(self, callback, bidder_id, **kwargs):
+        return redirect('{}?code={}'.format(callback, bidder_id))
+
+    def authorized_response(self):
+        bidder_id = request.args.get('code')
+        if not bidder_id:
+            return None
+        token = 'token-{}'.format(bidder_id)
+        self.app.logins_cache[(token, '')] = self.grant(bidder_id)
+        return {'access_token': token, 'token_type': 'Bearer'}
+
+    def get(self, path):
+        token = session.get('remote_oauth', ('', ''))[0]
+        return _Response(self.grant(token[len('token-'):]))
+
+
+def start_server(auction, port, host='127.0.0.1'):
+    auction_app = setup_app(create_app(), auction, LOGGER)
+    auction_app.remote_oauth = LocalOAuth(auction_app)
+    lisener = get_lisener(port, host=host)
+    server = WSGIServer(lisener, auction_app, log=_LoggerStream(LOGGER),
+                        handler_class=AuctionsWSGIHandler)
+    server.start()
+    greenlets = [spawn(push_timestamps_events, auction_app),
+                 spawn(check_clients, auction_app)]
+    return server, greenlets, 'http://{}:{}/'.format(*lisener.getsockname())
+
+
+def live_auction(bidders):
+    """Auction with generated tender on first bids stage"""
+    clock = Clock()
+    tender_data = generate_tender_data(bidders, clock.now() + timedelta(seconds=60))
+    simulator = AuctionSimulator(tender_data, worker_defaults=LOAD_DEFAULTS, clock=clock)
+    simulator.prepare()
+    simulator.auction.timeline.clear()
+    simulator.auction.start_auction()
+    simulator.auction.end_first_pause()
+    return simulator.auction
+
+
+def switch_stages(auction, interval):
+    """Move auction to next stage every interval seconds"""
+    stages = auction.auction_document['stages']
+    while auction.auction_document['current_stage'] < len(stages) - 3:
+        sleep(interval)
+        if stages[auction.auction_document['current_stage']]['type'] == 'bids':
+            auction.end_bids_stage()
+        else:
+            auction.next_stage()
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.latencies = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.rejected_bids = 0
+
+    def timed(self, step, method, url, expected, **kwargs):
+        started = default_timer()
+        try:
+            response = method(url, timeout=30, **kwargs)
+            if step == 'event_source':
+                next(response.iter_content(1), None)
+                response.close()
+        except requests.RequestException:
+            response = None
+        self.latencies[step].append(default_timer() - started)
+        if response is None or response.status_code not in expected:
+            self.errors[step] += 1
+            return None
+        return response
+
+    def report(self, elapsed):
+        report = {'elapsed': elapsed, 'rejected_bids': self.rejected_bids, 'steps': {}}
+        total = 0
+        for step in STEPS:
+            latencies = sorted(self.latencies[step])
+            total += len(latencies)
+            report['steps'][step] = {
+                'requests': len(latencies),
+                'errors': self.errors[step],
+                'error_rate': float(self.errors[step]) / len(latencies) if latencies else 0.0,
+                'p50': percentile(latencies, 0.5),
+                'p99': percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else None,
+            }
+        report['requests'] = total
+        report['throughput'] = total / elapsed if elapsed else 0.0
+        return report
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[max(int(ceil(fraction * len(values))) - 1, 0)]
+
+
+def bidder_client(auction, base_url, bidder_id, stats, sse_path):
+    client = requests.Session()
+    headers = {'X-Forwarded-Path': base_url}
+    response = stats.timed('login', client.get, urljoin(base_url, 'login'), (302,),
+                           params={'bidder_id': bidder_id, 'hash': bidder_id},
+                           headers=headers, allow_redirects=False)
+    if response is None:
+        return
+    response = stats.timed('authorized', client.get, response.headers['Location'], (302,),
+                           headers=headers, allow_redirects=False)
+    if response is None:
+        return
+    response = stats.timed('check_authorization', client.post,
+                           urljoin(base_url, 'check_authorization'), (200,), headers=headers)
+    if response is None:
+        return
+    snapshot = auction.stage_snapshot
+    amount = bid_ceiling(auction, snapshot) if snapshot['stage'].get('type') == 'bids' \
+        and snapshot['stage'].get('bidder_id') == bidder_id else 1.0
+    response = stats.timed('postbid', client.post, urljoin(base_url, 'postbid'), (200,),
+                           data=json.dumps({'bidder_id': bidder_id, 'bid': amount}),
+                           headers=dict(headers, **{'Content-Type': 'application/json'}))
+    if response is not None and response.json().get('status') != 'ok':
+        stats.rejected_bids += 1
+    stats.timed('event_source', client.get, urljoin(base_url, sse_path.lstrip('/')),
+                (200,), headers=headers, stream=True)
+
+
+def run_load(bidders=50, clients=1000, concurrency=200, port=9020,
+             switch_interval=0, sse_path='/event_source'):
+    auction = live_auction(bidders)
+    server, greenlets, base_url = start_server(auction, port)
+    switcher = spawn(switch_stages, auction, switch_interval) if switch_interval else None
+    bidders_ids = [bid['id'] for bid in auction.bidders_data]
+    stats = Stats()
+    pool = Pool(concurrency)
+    started = default_timer()
+    for index in xrange(clients):
+        pool.spawn(bidder_client, auction, base_url, bidders_ids[index % len(bidders_ids)],
+                   stats, sse_path)
+    pool.join()
+    elapsed = default_timer() - started
+    if switcher:
+        switcher.kill()
+    server.stop()
+    for greenlet in greenlets:
+        greenlet.kill()
+    return stats.report(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auction worker load generator')
+    parser.add_argument('--bidders', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--port', type=int, default=9020)
+    parser.add_argument('--switch-interval', type=float, default=0,
+                        help='switch stages every N seconds during load')
+    parser.add_argument('--sse-path', default='/event_source')
+    parser.add_argument('--output', help='write report as JSON to file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.disable(logging.WARNING)
+    report = run_load(args.bidders, args.clients, args.concurrency, args.port,
+                      args.switch_interval, args.sse_path)
+    print 'requests: {requests}, elapsed: {elapsed:.3f}s, throughput: {throughput:.1f} req/s, ' \
+          'rejected bids: {rejected_bids}'.format(**report)
+    for step in STEPS:
+        result = report['steps'][step]
+        print '{:<20} requests: {:>6} errors: {:>5} ({:.2%}) p50: {} p99: {}'.format(
+            step, result['requests'], result['errors'], result['error_rate'],
+            result['p50'], result['p99'])
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(report, stream, indent=2, sort_keys=True)
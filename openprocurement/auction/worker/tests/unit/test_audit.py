@@ -124,6 +124,31 @@ def test_approve_audit_info_on_announcement(auction, db):
     assert results['bids'][1]['bidder'] == 'd3ba84c66c9e4f34bfb33cc3c686f137'
 
 
+def test_record_stage_switch(auction, db, logger):
+    auction.prepare_audit()
+    run_date = auction.convert_datetime('2017-06-26T17:37:06+03:00')
+    auction.timeline.plan([(run_date, None, 'End of Bids Stage: [1 -> 2]', {})])
+    entry = auction.timeline.entries[0]
+    auction.timeline.lateness.add(0.25)
+    auction.record_stage_switch(entry, 0.25)
+
+    assert auction.audit['stage_switches'] == [{
+        'name': 'End of Bids Stage: [1 -> 2]',
+        'target': '2017-06-26T17:37:06+03:00',
+        'actual': '2017-06-26T17:37:06.250000+03:00',
+        'lateness': 0.25
+    }]
+    log_strings = logger.log_capture_string.getvalue().split('\n')
+    assert "Stage switch 'End of Bids Stage: [1 -> 2]' lateness: 0.250000s" in log_strings[-2]
+
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_auction_stages_fast_forward()
+    auction.approve_audit_info_on_announcement()
+    assert auction.audit['stage_switches_lateness']['count'] == 1
+    assert auction.audit['stage_switches_lateness']['buckets']['<=0.5'] == 1
+
+
 def test_upload_audit_file_with_document_service(auction, db, logger, mocker):
     from requests import Session as RequestsSession
     auction.session_ds = RequestsSession()
@@ -0,0 +1,26 @@
+from openprocurement.auction.worker.tests.benchmark.stages import (
+    run_benchmarks, check_results, BENCHMARKS
+)
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(bidders=(2,), repeat=1)
+    assert len(results) == len(BENCHMARKS) * 2
+    assert 'end_bids_stage[2]' in results
+    assert 'end_bids_stage[2-features]' in results
+    assert check_results(results, baseline=results) == []
+
+
+def test_check_results():
+    results = {'start_auction[50]': {'median': 0.2},
+               'start_auction[200]': {'median': 0.5}}
+    baseline = {'start_auction[50]': {'median': 0.1},
+                'start_auction[200]': {'median': 0.45}}
+    assert check_results(results, baseline, tolerance=0.25) == [
+        'start_auction[50]: 0.200000s is slower than baseline 0.100000s'
+    ]
+    assert check_results(results, thresholds={'start_auction': 0.3,
+                                              'start_auction[200]': 1}) == []
+    assert check_results(results, thresholds={'start_auction': 0.3}) == [
+        'start_auction[200]: 0.500000s exceeds threshold 0.300000s'
+    ]
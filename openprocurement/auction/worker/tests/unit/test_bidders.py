@@ -1,8 +1,16 @@
+from collections import deque
+
+from gevent import sleep
+
+from openprocurement.auction.worker.auctions import multilot
 from openprocurement.auction.worker.tests.data.data import tender_data
+from openprocurement.auction.worker.utils import prepare_stage_snapshot
 
 
 def test_add_bid(auction, db):
-    test_bid = tender_data['data']['bids'][0]
+    test_bid = {'bidder_id': tender_data['data']['bids'][0]['id'],
+                'amount': tender_data['data']['bids'][0]['value']['amount'],
+                'time': tender_data['data']['bids'][0]['date']}
     auction.prepare_auction_document()
     auction.get_auction_info()
     assert auction._bids_data == {}
@@ -12,6 +20,49 @@ def test_add_bid(auction, db):
     round_num = 101
     auction.add_bid(round_num, test_bid)
     assert auction._bids_data.keys() == [1, 101]
+    assert auction.bids_history is None
+
+    other_bid = {'bidder_id': test_bid['bidder_id'], 'amount': 1}
+    auction.bids_history = deque(maxlen=2)
+    auction.add_bid(1, other_bid)
+    auction.add_bid(1, test_bid)
+    auction.add_bid(1, other_bid)
+    assert auction._bids_data[1] == {test_bid['bidder_id']: other_bid}
+    assert list(auction.bids_history) == [dict(test_bid, stage=1), dict(other_bid, stage=1)]
+
+
+def test_drain_bids_queue(auction, logger):
+    auction.stage_snapshot = prepare_stage_snapshot({'current_stage': 2})
+    stale_bid = {'bidder_id': 'a', 'amount': 470000.0, 'time': '2017-06-26T17:37:06+03:00'}
+    bid = {'bidder_id': 'b', 'amount': 465000.0, 'time': '2017-06-26T17:39:06+03:00'}
+    auction.enqueue_bid(1, stale_bid)
+    auction.enqueue_bid(2, bid)
+    with auction.bids_actions:
+        auction.drain_bids_queue()
+    assert auction._bids_data == {2: {'b': bid}}
+    assert auction.bids_queue.empty()
+    log_strings = logger.log_capture_string.getvalue().split('\n')
+    assert log_strings[0] == 'Drop bid of bidder a for finished stage 1'
+
+
+def test_consume_bids_failures(auction, logger, mocker):
+    auction.stage_snapshot = prepare_stage_snapshot({'current_stage': 2})
+    add_bid = mocker.patch.object(auction, 'add_bid', side_effect=[IOError('disk full'), None])
+    failed = {'bidder_id': 'a', 'amount': 470000.0, 'time': '2017-06-26T17:37:06+03:00'}
+    bid = {'bidder_id': 'b', 'amount': 465000.0, 'time': '2017-06-26T17:39:06+03:00'}
+    auction.enqueue_bid(2, failed)
+    auction.enqueue_bid(2, bid)
+    sleep(0)
+    assert add_bid.call_count == 2
+    assert auction.bids_queue.empty()
+    assert not auction._bids_consumer.dead
+    log_strings = logger.log_capture_string.getvalue().split('\n')
+    assert log_strings[0] == 'Failed to add bid of bidder a on stage 2: disk full'
+
+    consumer = auction._bids_consumer
+    auction.stop_bids_consumer()
+    assert consumer.dead
+    assert auction._bids_consumer is None
 
 
 def test_filter_bids_keys(auction, db):
@@ -136,6 +187,39 @@ def test_set_auction_and_participation_urls_multilot(multilot_auction, mocker, l
     assert 'auctionUrl' in log_strings[1]
 
 
+def test_prepare_lot_patch_data(multilot_auction):
+    lot_id = multilot_auction.lot_id
+    multilot_auction._auction_data = {'data': {
+        'lots': [{'id': 'other', 'title': 'Other lot'}, {'id': lot_id, 'title': 'Lot'}],
+        'bids': [
+            {'id': 'a', 'lotValues': [{'relatedLot': 'other', 'value': {'amount': 1}},
+                                      {'relatedLot': lot_id, 'value': {'amount': 2}}]},
+            {'id': 'b', 'lotValues': [{'relatedLot': 'other', 'value': {'amount': 3}}]},
+            {'id': 'c', 'status': 'invalid',
+             'lotValues': [{'relatedLot': lot_id, 'value': {'amount': 4}}]},
+        ]
+    }}
+    patch_data, count = multilot.prepare_lot_patch_data(
+        multilot_auction, lambda bid, lot_bid: {'participationUrl': bid['id']},
+        {'auctionUrl': 'url'}
+    )
+    assert count == 1
+    assert patch_data == {'data': {
+        'lots': [{'id': 'other'}, {'id': lot_id, 'auctionUrl': 'url'}],
+        'bids': [
+            {'id': 'a', 'lotValues': [{'relatedLot': 'other'},
+                                      {'relatedLot': lot_id, 'participationUrl': 'a'}]},
+            {'id': 'b', 'lotValues': [{'relatedLot': 'other'}]},
+            {'id': 'c', 'lotValues': [{}]},
+        ]
+    }}
+    for lot in patch_data['data']['lots']:
+        assert 'id' in lot
+    for bid in patch_data['data']['bids'][:2]:
+        for lot_value in bid['lotValues']:
+            assert 'relatedLot' in lot_value
+
+
 def test_approve_bids_information(auction, db, logger):
 
     test_bids = [
@@ -165,6 +249,7 @@ def test_approve_bids_information(auction, db, logger):
     res = auction.approve_bids_information()
     assert res is True
     assert auction.auction_document["stages"][5].get('changed', '') is True
+    assert 5 not in auction._bids_data
     log_strings = log_strings = logger.log_capture_string.getvalue().split('\n')
     assert "Current stage bids [{'bidder_name': '1', 'amount': 475000.0, 'bidder_id': u'd3ba84c66c9e4f34bfb33cc3c686f137', 'time': '2014-11-19T08:22:21.726234+00:00'}]" in log_strings
 
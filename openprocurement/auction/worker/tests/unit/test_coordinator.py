@@ -0,0 +1,92 @@
+from gevent import spawn, sleep, joinall
+from mock import MagicMock
+
+from openprocurement.auction.worker.coordinator import (
+    TenderCoordinator, index_lots_values
+)
+
+
+URL = 'http://127.0.0.1:6543/api/2.3/tenders/UA-11111'
+LOTS = ['1' * 32, '2' * 32]
+
+
+def tender():
+    return {'data': {
+        'lots': [{'id': lot_id} for lot_id in LOTS],
+        'bids': [
+            {'id': 'a', 'lotValues': [{'relatedLot': LOTS[0], 'value': {'amount': 1}},
+                                      {'relatedLot': LOTS[1], 'value': {'amount': 2}}]},
+            {'id': 'b', 'status': 'invalid',
+             'lotValues': [{'relatedLot': LOTS[0], 'value': {'amount': 3}}]},
+            {'id': 'c', 'lotValues': [{'relatedLot': LOTS[1], 'value': {'amount': 4}}]},
+        ]
+    }}
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.elapsed = 0.0
+
+    def monotonic(self):
+        return self.elapsed
+
+
+def lot_auction(lot_id, tender_cache):
+    auction = MagicMock()
+    auction.lot_id = lot_id
+    auction.tender_cache = tender_cache
+    return auction
+
+
+def test_index_lots_values():
+    assert index_lots_values(tender()['data']['bids']) == {
+        LOTS[0]: [(0, 0)],
+        LOTS[1]: [(0, 1), (2, 0)],
+    }
+
+
+def test_coordinator_shares_resource():
+    tender_cache = MagicMock()
+
+    def get(*args, **kwargs):
+        sleep(0)
+        return tender()
+    tender_cache.get.side_effect = get
+    clock = FakeClock()
+    coordinator = TenderCoordinator('UA-11111', max_age=10, clock=clock)
+    auctions = [lot_auction(lot_id, tender_cache) for lot_id in LOTS]
+    for auction in auctions:
+        coordinator.add_auction(auction)
+    assert auctions[1].tender_cache is auctions[0].tender_cache
+    assert auctions[1].coordinator is coordinator
+
+    greenlets = [spawn(coordinator.get_resource, auction, URL) for auction in auctions]
+    joinall(greenlets)
+    first, second = [greenlet.value for greenlet in greenlets]
+    assert tender_cache.get.call_count == 1
+    assert coordinator.stats == {'downloaded': 1, 'shared': 1}
+
+    first['data']['bids'][0]['lotValues'][0]['participationUrl'] = 'url'
+    first['data']['lots'][0]['auctionUrl'] = 'url'
+    assert 'participationUrl' not in second['data']['bids'][0]['lotValues'][0]
+    assert 'auctionUrl' not in second['data']['lots'][0]
+    assert 'participationUrl' not in coordinator.resources[URL][1]['data']['bids'][0]['lotValues'][0]
+    assert second['data']['bids'][1] is coordinator.resources[URL][1]['data']['bids'][1]
+
+    coordinator.get_resource(auctions[0], URL)
+    assert tender_cache.get.call_count == 1
+    clock.elapsed = 11
+    coordinator.get_resource(auctions[0], URL)
+    assert tender_cache.get.call_count == 2
+
+
+def test_coordinator_failed_download():
+    tender_cache = MagicMock()
+    tender_cache.get.return_value = None
+    coordinator = TenderCoordinator('UA-11111', clock=FakeClock())
+    auction = lot_auction(LOTS[0], tender_cache)
+    coordinator.add_auction(auction)
+    assert coordinator.get_resource(auction, URL) is None
+    assert coordinator.resources == {}
+    assert coordinator.pending == {}
@@ -7,6 +7,7 @@ from couchdb import Database
 from couchdb.http import HTTPError
 
 from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.design import sync_design
 
 from openprocurement.auction.worker.tests.data.data import (
     tender_data, test_organization, lot_tender_data
@@ -47,6 +48,15 @@ def test_get_auction_info_universal(universal_auction, logger):
     assert universal_auction.bidders_data[1]['value']['amount'] == 480000.0
     assert universal_auction.bidders_data[1]['id'] == '5675acc9232942e8940a034994ad883e'
 
+    registry = universal_auction.bidders_registry
+    assert len(registry) == 2
+    assert '5675acc9232942e8940a034994ad883e' in registry
+    assert 'unknown' not in registry
+    assert registry['5675acc9232942e8940a034994ad883e']['number'] == '2'
+    assert [bidder['id'] for bidder in registry] == [
+        'd3ba84c66c9e4f34bfb33cc3c686f137', '5675acc9232942e8940a034994ad883e'
+    ]
+
     log_strings = logger.log_capture_string.getvalue().split('\n')
     assert log_strings[0] == 'Bidders count: 2'
 
@@ -196,13 +206,33 @@ def test_prepare_public_document(auction, db):
 def test_prepare_public_document_features(features_auction, db, mocker):
     features_auction.prepare_auction_document()
     features_auction.auction_document['current_stage'] = 4
-    mocked_map = mocker.patch("__builtin__.map", autospec=True)
+    mocked_filter_amount = mocker.patch(
+        'openprocurement.auction.worker.mixins.filter_amount',
+        side_effect=filter_amount
+    )
     res = features_auction.prepare_public_document()
-    assert mocked_map.called is True
-    assert mocked_map.call_count == 3
-    assert filter_amount, 'initial_bids' in mocked_map.call_args_list[1][0]
-    assert filter_amount, 'stages' in mocked_map.call_args_list[2][0]
-    assert filter_amount, 'results' in mocked_map.call_args_list[3][0]
+    document = features_auction.auction_document
+    assert mocked_filter_amount.call_count == sum(
+        len(document[section]) for section in ('initial_bids', 'stages', 'results')
+    )
+    for section in ('initial_bids', 'stages', 'results'):
+        assert res[section] is not document[section]
+    assert res['minimalStep'] is document['minimalStep']
+
+    # masked sections are reused until invalidated
+    mocked_filter_amount.reset_mock()
+    res = features_auction.prepare_public_document()
+    assert mocked_filter_amount.called is False
+
+    features_auction.invalidate_public_document('stages')
+    res = features_auction.prepare_public_document()
+    assert mocked_filter_amount.call_count == len(document['stages'])
+
+    # replaced section is masked again
+    mocked_filter_amount.reset_mock()
+    document['results'] = list(document['results'])
+    features_auction.prepare_public_document()
+    assert mocked_filter_amount.call_count == len(document['results'])
 
 
 def test_get_auction_document(auction, db, mocker, logger):
@@ -256,8 +286,136 @@ def test_save_auction_document(auction, db, mocker, logger):
 
     assert 'Saved auction document UA-11111 with rev' in log_strings[1]
     assert log_strings[3] == 'Error while save document: status code is >= 400'
-    assert log_strings[5] == 'Unhandled error: unhandled error message'
-    assert log_strings[7] == "Error while save document: (32, 'retryable error message')"
-    assert log_strings[9] == 'Saved auction document UA-222222 with rev test-revision'
+    assert log_strings[4] == 'Unhandled error: unhandled error message'
+    assert log_strings[5] == "Error while save document: (32, 'retryable error message')"
+    assert log_strings[6] == 'Saved auction document UA-222222 with rev test-revision'
 
     assert mock_db_save.call_count == 4
+
+
+def test_save_auction_document_conflict(auction, db, mocker):
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_auction_stages()
+    auction.save_auction_document()
+    mock_sleep = mocker.patch('openprocurement.auction.worker.mixins.sleep')
+
+    # external writer changes document
+    remote = auction.db.get(auction.auction_doc_id)
+    remote['endDate'] = '2017-06-26T17:51:07+03:00'
+    remote['current_stage'] = 5
+    auction.db.save(remote)
+
+    auction.auction_document['current_stage'] = 1
+    auction.auction_document['stages'][1]['amount'] = 1.0
+    auction.save_auction_document()
+
+    assert mock_sleep.call_count == 1
+    assert 0.05 <= mock_sleep.call_args[0][0] <= 0.1
+    assert auction.save_stats == {'saves': 3, 'conflicts': 1, 'merged': 1, 'failed': 0}
+    saved = auction.db.get(auction.auction_doc_id)
+    assert saved['_rev'] == auction.auction_document['_rev']
+    assert saved['endDate'] == auction.auction_document['endDate'] == remote['endDate']
+    assert saved['current_stage'] == 1
+    assert saved['stages'][1]['amount'] == 1.0
+
+
+def test_save_auction_document_conflict_without_base(auction, db, mocker):
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_auction_stages()
+    auction.save_auction_document()
+    mocker.patch('openprocurement.auction.worker.mixins.sleep')
+
+    # first save of process, e.g. after re-planning
+    auction._public_base = None
+    remote = auction.db.get(auction.auction_doc_id)
+    remote['endDate'] = '2017-06-26T17:51:07+03:00'
+    auction.db.save(remote)
+
+    auction.auction_document['endDate'] = '2017-06-27T17:51:07+03:00'
+    auction.save_auction_document()
+
+    saved = auction.db.get(auction.auction_doc_id)
+    assert saved['_rev'] == auction.auction_document['_rev']
+    assert saved['endDate'] == auction.auction_document['endDate'] == '2017-06-27T17:51:07+03:00'
+
+
+def test_get_conflict_backoff(auction):
+    assert 0.05 <= auction.get_conflict_backoff(1) <= 0.1
+    assert 0.4 <= auction.get_conflict_backoff(4) <= 0.8
+    assert 2.5 <= auction.get_conflict_backoff(20) <= 5
+
+
+def test_save_auction_document_delta(auction, db, mocker, logger):
+    auction.delta_saves = True
+    sync_design(auction.db)
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_auction_stages()
+    auction.save_auction_document()
+    spy_db_save = mocker.spy(Database, 'save')
+    spy_update_doc = mocker.spy(Database, 'update_doc')
+
+    auction.auction_document['current_stage'] = 1
+    auction.auction_document['stages'][1]['amount'] = 1.0
+    response = auction.save_auction_document()
+    assert response == (auction.auction_doc_id, auction.auction_document['_rev'])
+    assert spy_db_save.call_count == 0
+    assert spy_update_doc.call_count == 1
+    delta = spy_update_doc.call_args[1]['body']
+    assert sorted(path for path, _ in delta['set']) == [['current_stage'], ['stages', 1]]
+    assert 'Saved 2 changes of auction document UA-11111' in logger.log_capture_string.getvalue()
+
+    auction_document = auction.db.get(auction.auction_doc_id)
+    assert auction_document['_rev'] == auction.auction_document['_rev']
+    assert auction_document['current_stage'] == 1
+    assert auction_document['stages'][1]['amount'] == 1.0
+
+    # nothing changed, nothing to send
+    auction.save_auction_document()
+    assert spy_update_doc.call_count == 1
+
+
+def test_save_auction_document_delta_without_handler(auction, db, mocker):
+    auction.delta_saves = True
+    auction.prepare_auction_document()
+    spy_db_save = mocker.spy(Database, 'save')
+
+    auction.auction_document['current_stage'] = 1
+    auction.save_auction_document()
+    assert auction.delta_saves is False
+    assert spy_db_save.call_count == 1
+    assert auction.db.get(auction.auction_doc_id)['current_stage'] == 1
+
+
+def test_persist_auction_document(auction, db, mocker):
+    auction.prepare_auction_document()
+    mock_save = mocker.patch.object(Auction, 'save_auction_document', autospec=True)
+
+    auction.persist_auction_document()
+    auction.persist_auction_document()
+    assert mock_save.call_count == 0
+
+    auction.flush_auction_document()
+    assert mock_save.call_count == 1
+
+    auction.flush_auction_document()
+    assert mock_save.call_count == 1
+
+
+def test_persist_auction_document_failed(auction, db, mocker, logger):
+    auction.prepare_auction_document()
+    mock_save = mocker.patch.object(Auction, 'save_auction_document', autospec=True,
+                                    side_effect=ValueError())
+
+    auction.persist_auction_document()
+    auction.flush_auction_document()
+    assert mock_save.call_count == 1
+    assert auction.save_stats['failed'] == 1
+    assert 'Auction document UA-11111 not saved' in logger.log_capture_string.getvalue()
+
+    mock_save.side_effect = None
+    auction.persist_auction_document()
+    auction.flush_auction_document()
+    assert mock_save.call_count == 2
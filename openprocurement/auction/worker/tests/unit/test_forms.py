@@ -1,6 +1,7 @@
 import pytest
 import json
 from mock import MagicMock, patch
+from gevent.queue import Queue
 from wtforms.validators import ValidationError
 from openprocurement.auction.worker.tests.data.data import (
     test_auction_document
@@ -8,6 +9,7 @@ from openprocurement.auction.worker.tests.data.data import (
 from openprocurement.auction.worker.forms import (
     validate_bid_value, BidsForm, form_handler
 )
+from openprocurement.auction.worker.utils import prepare_stage_snapshot
 
 
 def test_validate_bid_value():
@@ -45,33 +47,33 @@ def test_bids_form(auction, features_auction):
     assert form.errors == form_errors
 
     form = BidsForm().from_json({'bidder_id': 'bidder_id'})
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     assert form.validate() is False
     assert form.errors == {'bid': [u'Bid amount is required'],
                            'bidder_id': [u'Not valid bidder']}
 
     form = BidsForm().from_json({'bidder_id': 123})
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     assert form.validate() is False
     assert form.errors == {'bid': [u'Bid amount is required'],
                            'bidder_id': [u'Not valid bidder']}
 
     form_data['bidder_id'] = u'f7c8cd1d56624477af8dc3aa9c4b3ea3'
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     assert form.validate() is False
     assert form.errors == {'bid': [u'Bid amount is required']}
 
     form_data['bid'] = 26000000
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is False
     assert form.errors == {'bid': [u'Too high value']}
 
     form_data['bid'] = -1
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is True
     assert form.errors == {}
@@ -79,7 +81,7 @@ def test_bids_form(auction, features_auction):
 
     form_data['bid'] = -1.0
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is True
     assert form.errors == {}
@@ -87,7 +89,7 @@ def test_bids_form(auction, features_auction):
 
     form_data['bid'] = '-1'
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is True
     assert form.errors == {}
@@ -95,7 +97,7 @@ def test_bids_form(auction, features_auction):
 
     form_data['bid'] = '-1.0'
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is True
     assert form.errors == {}
@@ -103,14 +105,14 @@ def test_bids_form(auction, features_auction):
 
     form_data['bid'] = '26000000'
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is False
     assert form.errors == {'bid': [u'Too high value']}
 
     form_data['bid'] = 'one'
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is False
     assert form.errors == {'bid': [u'Not a valid float value',
@@ -118,7 +120,7 @@ def test_bids_form(auction, features_auction):
 
     form_data['bid'] = 120
     form = BidsForm().from_json(form_data)
-    form.document = test_auction_document
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction = auction
     assert form.validate() is True
     assert form.errors == {}
@@ -128,9 +130,9 @@ def test_bids_form(auction, features_auction):
     form_data['bid'] = 12
     form = BidsForm().from_json(form_data)
     form.auction = features_auction
-    form.document = test_auction_document
-    form.document['stages'][2]['amount_features'] = \
-        form.document['stages'][2]['amount']
+    test_auction_document['stages'][2]['amount_features'] = \
+        test_auction_document['stages'][2]['amount']
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction.features = features_auction._auction_data['data']['features']
     form.auction.bidders_coeficient = {'f7c8cd1d56624477af8dc3aa9c4b3ea3': 0.1}
     assert form.validate() is True
@@ -140,9 +142,9 @@ def test_bids_form(auction, features_auction):
     form_data['bid'] = '12'
     form = BidsForm().from_json(form_data)
     form.auction = features_auction
-    form.document = test_auction_document
-    form.document['stages'][2]['amount_features'] = \
-        form.document['stages'][2]['amount']
+    test_auction_document['stages'][2]['amount_features'] = \
+        test_auction_document['stages'][2]['amount']
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction.features = features_auction._auction_data['data']['features']
     form.auction.bidders_coeficient = {'f7c8cd1d56624477af8dc3aa9c4b3ea3': 0.1}
     assert form.validate() is True
@@ -152,9 +154,9 @@ def test_bids_form(auction, features_auction):
     form_data['bid'] = -1
     form = BidsForm().from_json(form_data)
     form.auction = features_auction
-    form.document = test_auction_document
-    form.document['stages'][2]['amount_features'] = \
-        form.document['stages'][2]['amount']
+    test_auction_document['stages'][2]['amount_features'] = \
+        test_auction_document['stages'][2]['amount']
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction.features = features_auction._auction_data['data']['features']
     form.auction.bidders_coeficient = {'f7c8cd1d56624477af8dc3aa9c4b3ea3': 0.1}
     assert form.validate() is True
@@ -164,9 +166,9 @@ def test_bids_form(auction, features_auction):
     form_data['bid'] = 123456
     form = BidsForm().from_json(form_data)
     form.auction = features_auction
-    form.document = test_auction_document
-    form.document['stages'][2]['amount_features'] = \
-        form.document['stages'][2]['amount']
+    test_auction_document['stages'][2]['amount_features'] = \
+        test_auction_document['stages'][2]['amount']
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction.features = features_auction._auction_data['data']['features']
     form.auction.bidders_coeficient = {'f7c8cd1d56624477af8dc3aa9c4b3ea3': 0.1}
     assert form.validate() is False
@@ -175,16 +177,16 @@ def test_bids_form(auction, features_auction):
     form_data['bid'] = 123456
     form = BidsForm().from_json(form_data)
     form.auction = features_auction
-    form.document = test_auction_document
-    form.document['stages'][test_auction_document['current_stage']]['type'] =\
+    test_auction_document['stages'][test_auction_document['current_stage']]['type'] =\
         'not_bids'
-    form.document['stages'][2]['amount_features'] = \
-        form.document['stages'][2]['amount']
+    test_auction_document['stages'][2]['amount_features'] = \
+        test_auction_document['stages'][2]['amount']
+    form.snapshot = prepare_stage_snapshot(test_auction_document)
     form.auction.features = features_auction._auction_data['data']['features']
     form.auction.bidders_coeficient = {'f7c8cd1d56624477af8dc3aa9c4b3ea3': 0.1}
     assert form.validate() is False
     assert form.errors == {'bid': [u'Stage not for bidding']}
-    form.document['stages'][test_auction_document['current_stage']]['type'] =\
+    test_auction_document['stages'][test_auction_document['current_stage']]['type'] =\
         'bids'
 
 
@@ -227,3 +229,43 @@ def test_form_handler(app):
             u'bid': [u'Too high value']
         }
     }
+
+
+def test_form_handler_back_pressure(app):
+    app.application.form_handler = form_handler
+    auction = app.application.config['auction']
+    auction.bids_queue = Queue(1)
+    auction.bids_queue.put((2, {}))
+    headers = {'Content-Type': 'application/json'}
+    s = {
+        'remote_oauth': (u'aMALGpjnB1iyBwXJM6betfgT4usHqw', ''),
+        'client_id': 'b3a000cdd006b4176cc9fafb46be0273'
+    }
+    data = {'bidder_id': 'f7c8cd1d56624477af8dc3aa9c4b3ea3', 'bid': 123}
+    with patch('openprocurement.auction.worker.server.session', s), \
+            patch('openprocurement.auction.worker.forms.session', s):
+        res = app.post('/postbid', data=json.dumps(data), headers=headers)
+        assert res.status_code == 429
+        assert res.headers['Retry-After'] == '1'
+        assert json.loads(res.data)['status'] == 'failed'
+
+        with auction.bids_actions:
+            res = app.post('/postbid', data=json.dumps(data), headers=headers)
+        assert res.status_code == 503
+
+
+def test_prepare_stage_snapshot():
+    snapshot = prepare_stage_snapshot(test_auction_document, version=3)
+    assert snapshot['version'] == 3
+    assert snapshot['current_stage'] == 2
+    assert snapshot['stage'] == test_auction_document['stages'][2]
+    assert snapshot['stage'] is not test_auction_document['stages'][2]
+    assert snapshot['minimalStep']['amount'] == 7500
+
+    snapshot = prepare_stage_snapshot({'current_stage': -1, 'stages': []})
+    assert snapshot['stage'] == {}
+    form = BidsForm().from_json({'bidder_id': u'f7c8cd1d56624477af8dc3aa9c4b3ea3',
+                                 'bid': 120})
+    form.snapshot = snapshot
+    assert form.validate() is False
+    assert form.errors == {'bid': [u'Stage not for bidding']}
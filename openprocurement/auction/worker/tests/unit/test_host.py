@@ -0,0 +1,60 @@
+from mock import MagicMock
+
+from openprocurement.auction.worker.host import (
+    AuctionsHost, parse_auctions_list
+)
+
+
+def test_parse_auctions_list():
+    assert parse_auctions_list('UA-11111') == [('UA-11111', None)]
+    assert parse_auctions_list('UA-11111, UA-22222:2222222222222222,') == [
+        ('UA-11111', None), ('UA-22222', '2222222222222222')
+    ]
+
+
+def test_host_routing(auction, mocker):
+    mocker.patch('openprocurement.auction.worker.host.get_lisener')
+    host = AuctionsHost(auction.worker_defaults)
+    auction_app = MagicMock(return_value=['ok'])
+    host.apps[auction.auction_doc_id] = auction_app
+    start_response = MagicMock()
+
+    environ = {'PATH_INFO': '/UA-11111/postbid', 'SCRIPT_NAME': ''}
+    assert host(environ, start_response) == ['ok']
+    assert environ['PATH_INFO'] == '/postbid'
+    assert environ['SCRIPT_NAME'] == '/UA-11111'
+    auction_app.assert_called_once_with(environ, start_response)
+
+    res = host({'PATH_INFO': '/UA-22222/postbid'}, start_response)
+    assert res == ['Auction not found']
+    start_response.assert_called_with('404 Not Found', [('Content-Type', 'text/plain')])
+
+
+def test_host_add_auction(auction, mocker):
+    mocker.patch('openprocurement.auction.worker.host.get_lisener')
+    mock_create_mapping = mocker.patch('openprocurement.auction.worker.host.create_mapping')
+    mocker.patch('openprocurement.auction.worker.host.spawn')
+    host = AuctionsHost(auction.worker_defaults)
+    host.lisener.getsockname.return_value = ('127.0.0.1', 9010)
+
+    server = host.add_auction(auction, None, MagicMock())
+    assert auction.auction_doc_id in host.apps
+    assert host.apps[auction.auction_doc_id].config['auction'] is auction
+    mock_create_mapping.assert_called_once_with(
+        auction.worker_defaults, auction.auction_doc_id,
+        'http://127.0.0.1:9010/UA-11111/'
+    )
+
+    server.stop()
+    assert host.apps == {}
+
+
+def test_host_coordinate(auction, mocker):
+    mocker.patch('openprocurement.auction.worker.host.get_lisener')
+    host = AuctionsHost(auction.worker_defaults)
+    lots = [MagicMock(tender_id='UA-22222', lot_id=lot_id) for lot_id in ('1' * 32, '2' * 32)]
+    coordinators = host.coordinate([auction] + lots)
+    assert coordinators.keys() == ['UA-22222']
+    assert coordinators['UA-22222'].auctions == lots
+    assert lots[0].coordinator is lots[1].coordinator
+    assert auction.coordinator is None
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+import pytest
+from dateutil.tz import tzlocal
+from gevent import spawn, sleep, joinall
+from mock import MagicMock
+
+from openprocurement.auction.worker.identity import IdentityCache
+
+
+TOKEN = (u'aMALGpjnB1iyBwXJM6betfgT4usHqw', '')
+
+
+def grant(seconds):
+    return {'bidder_id': u'f7c8cd1d56624477af8dc3aa9c4b3ea3',
+            'expires': (datetime.now(tzlocal()) + timedelta(seconds=seconds)).isoformat()}
+
+
+def test_identity_cache():
+    app = MagicMock()
+    app.logins_cache = {TOKEN: grant(600)}
+    lookup = MagicMock(side_effect=lambda app, session: app.logins_cache.get(session['remote_oauth']))
+    cache = IdentityCache(lookup)
+    session = {'remote_oauth': TOKEN, 'client_id': 'b3a000cdd006b4176cc9fafb46be0273'}
+
+    assert cache.get(app, session) == app.logins_cache[TOKEN]
+    assert cache.get(app, session) == app.logins_cache[TOKEN]
+    assert lookup.call_count == 1
+
+    cache.identities[TOKEN] = grant(-1)
+    cache.get(app, session)
+    assert lookup.call_count == 2
+
+    cache.invalidate(app, TOKEN)
+    assert TOKEN not in app.logins_cache
+    assert cache.get(app, session) is None
+    assert lookup.call_count == 3
+    assert TOKEN not in cache.identities
+
+    assert cache.get(app, {'client_id': 'b3a000cdd006b4176cc9fafb46be0273'}) is None
+    assert lookup.call_count == 4
+
+
+def test_identity_cache_singleflight():
+    calls = []
+
+    def lookup(app, session):
+        calls.append(session['client_id'])
+        sleep(0.01)
+        return grant(600)
+
+    cache = IdentityCache(lookup)
+    app = MagicMock()
+    greenlets = [
+        spawn(cache.get, app, {'remote_oauth': TOKEN, 'client_id': str(index)})
+        for index in range(10)
+    ]
+    joinall(greenlets)
+    assert len(calls) == 1
+    assert all(greenlet.value == greenlets[0].value for greenlet in greenlets)
+    assert not cache.pending
+
+
+def test_identity_cache_lookup_error():
+    def lookup(app, session):
+        sleep(0.01)
+        raise ValueError('OAuth server is not available')
+
+    cache = IdentityCache(lookup)
+    session = {'remote_oauth': TOKEN, 'client_id': '1'}
+    greenlets = [spawn(cache.get, MagicMock(), session) for _ in range(2)]
+    joinall(greenlets)
+    assert all(isinstance(greenlet.exception, ValueError) for greenlet in greenlets)
+    assert not cache.pending
+    with pytest.raises(ValueError):
+        cache.get(MagicMock(), session)
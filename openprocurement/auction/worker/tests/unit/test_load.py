@@ -0,0 +1,42 @@
+import json
+import subprocess
+import sys
+
+from openprocurement.auction.worker.tests.load.bidders import Stats, percentile,\
+    STEPS
+
+
+def test_percentile():
+    assert percentile([], 0.5) is None
+    values = range(1, 101)
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([7], 0.99) == 7
+
+
+def test_stats_report():
+    stats = Stats()
+    stats.latencies['postbid'] = [0.1, 0.2, 0.3, 0.4]
+    stats.errors['postbid'] = 1
+    report = stats.report(2.0)
+    assert report['requests'] == 4
+    assert report['throughput'] == 2.0
+    assert report['steps']['postbid']['error_rate'] == 0.25
+    assert report['steps']['postbid']['p50'] == 0.2
+    assert report['steps']['login']['p99'] is None
+
+
+def test_run_load(tmpdir):
+    # load generator patches gevent, so it is run in its own process
+    output = str(tmpdir.join('report.json'))
+    subprocess.check_call([
+        sys.executable, '-m', 'openprocurement.auction.worker.tests.load',
+        '--bidders', '2', '--clients', '4', '--concurrency', '2', '--port', '0',
+        '--output', output
+    ])
+    with open(output) as stream:
+        report = json.load(stream)
+    assert report['requests'] == 4 * len(STEPS)
+    for step in STEPS:
+        assert report['steps'][step]['requests'] == 4
+        assert report['steps'][step]['errors'] == 0
@@ -0,0 +1,97 @@
+import os
+from copy import deepcopy
+
+import yaml
+from mock import MagicMock
+
+from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.planning import plan_auctions
+from openprocurement.auction.worker.tests.data.data import tender_data, lot_tender_data
+
+
+WORKER_DEFAULTS = os.path.join(os.path.dirname(__file__), '..', 'data',
+                               'auction_worker_defaults.yaml')
+LOT_ID = lot_tender_data['data']['lots'][0]['id']
+
+
+def worker_defaults():
+    with open(WORKER_DEFAULTS) as stream:
+        return yaml.load(stream)
+
+
+def tender_response(url, **kwargs):
+    response = MagicMock()
+    response.headers = {}
+    if 'UA-33333' in url:
+        response.status_code = 404
+    else:
+        response.status_code = 200
+        data = lot_tender_data if 'UA-22222' in url else tender_data
+        response.json.return_value = deepcopy(data)
+    return response
+
+
+def mock_services(mocker):
+    """Couchdb and tenders API are mocked, auctions are real"""
+    db = mocker.patch('openprocurement.auction.worker.auction.Database').return_value
+    session = mocker.patch('openprocurement.auction.worker.auction.RequestsSession').return_value
+    session.get.side_effect = tender_response
+    session.request.return_value.ok = True
+    session.request.return_value.status_code = 200
+    mocker.patch('openprocurement.auction.worker.tender_cache.sleep')
+    return db, session
+
+
+def test_plan_auctions(mocker):
+    db, session = mock_services(mocker)
+    row = MagicMock(key='UA-11111', value={'rev': '1-a'})
+    db.view.return_value = [row, MagicMock(key='UA-22222_' + LOT_ID, value=None)]
+    db.update.return_value = [(True, 'UA-11111', '2-b'),
+                              (True, 'UA-22222_' + LOT_ID, '1-c')]
+
+    planned = plan_auctions([('UA-11111', None), ('UA-22222', LOT_ID)], worker_defaults())
+
+    assert [auction.auction_doc_id for auction in planned] == ['UA-11111', 'UA-22222_' + LOT_ID]
+    assert all(isinstance(auction, Auction) for auction in planned)
+    assert planned[1].session is planned[0].session is session
+    assert planned[1].db is planned[0].db is db
+    assert planned[0].tender_data_memo is planned[1].tender_data_memo
+    db.view.assert_called_once_with('_all_docs', keys=['UA-11111', 'UA-22222_' + LOT_ID])
+
+    # every resource is downloaded once: tender and auction data of both tenders
+    assert session.get.call_count == 4
+
+    documents = db.update.call_args[0][0]
+    assert [document['_id'] for document in documents] == ['UA-11111', 'UA-22222_' + LOT_ID]
+    assert documents[0]['_rev'] == '1-a'
+    assert '_rev' not in documents[1]
+    for auction, document in zip(planned, documents):
+        assert document['current_stage'] == -1
+        assert document['tenderID'] == 'UA-11111'
+        assert document['stages'] == auction.auction_document['stages']
+        assert document['stages'][0]['start'] == auction.startDate.isoformat()
+    assert documents[1]['lot']['title'] == lot_tender_data['data']['lots'][0].get('title', '')
+    assert planned[0].auction_document['_rev'] == '2-b'
+    assert planned[1].auction_document['_rev'] == '1-c'
+
+    requests = [args + tuple(kwargs.values()) for args, kwargs in session.request.call_args_list]
+    assert len(requests) == 2
+    assert planned[0].tender_url + '/auction' in requests[0]
+    assert planned[1].tender_url + '/auction/' + LOT_ID in requests[1]
+    assert not db.save.called
+
+
+def test_plan_auctions_save_error(mocker):
+    db, session = mock_services(mocker)
+    db.view.return_value = []
+    db.get.return_value = None
+    db.update.return_value = [(False, 'UA-11111', Exception('conflict'))]
+    db.save.return_value = ('UA-11111', '2-b')
+
+    planned = plan_auctions([('UA-11111', None), ('UA-33333', None)], worker_defaults())
+
+    assert [auction.auction_doc_id for auction in planned] == ['UA-11111']
+    assert len(db.update.call_args[0][0]) == 1
+    assert db.save.call_count == 1
+    assert db.save.call_args[0][0]['_id'] == 'UA-11111'
+    assert planned[0].auction_document['_rev'] == '2-b'
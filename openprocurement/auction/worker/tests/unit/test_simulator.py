@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import pytest
+
+from openprocurement.auction.worker.simulator import (
+    simulate, random_strategy, replay_strategy, generate_tender_data,
+    AuctionSimulator, VirtualClock, MemoryDatabase
+)
+
+
+def test_memory_database():
+    db = MemoryDatabase()
+    doc_id, rev = db.save({'_id': 'UA-11111', 'current_stage': 0})
+    assert rev.startswith('1-')
+    doc = db.get('UA-11111')
+    doc['current_stage'] = 1
+    assert db.save(doc)[1].startswith('2-')
+    doc['_rev'] = rev
+    try:
+        db.save(doc)
+    except Exception, e:
+        assert e.__class__.__name__ == 'ResourceConflict'
+    else:
+        assert False
+
+
+def test_simulate_auction():
+    simulator = simulate(50)
+
+    auction = simulator.auction
+    stages = auction.auction_document['stages']
+    assert auction.auction_document['current_stage'] == len(stages) - 1
+    assert auction._end_auction_event.is_set()
+    assert len(simulator.placed) == 150
+    assert simulator.rejected == []
+    results = auction.auction_document['results']
+    assert len(results) == 50
+    assert [bid['amount'] for bid in results] == sorted((bid['amount'] for bid in results), reverse=True)
+    assert auction.timeline.lateness.max == 0
+    assert simulator.clock.elapsed == pytest.approx((
+        auction.convert_datetime(stages[-2]['start']) - simulator.clock.start
+    ).total_seconds() + 10)
+
+
+def test_replay_simulation():
+    original = simulate(5, strategy=random_strategy(seed=1))
+    results = original.auction.auction_document['results']
+
+    clock = VirtualClock(start=original.clock.start)
+    tender_data = generate_tender_data(5, clock.now() + timedelta(seconds=60))
+    replay = AuctionSimulator(tender_data, strategy=replay_strategy(original.placed),
+                              clock=clock)
+    assert replay.run() == results
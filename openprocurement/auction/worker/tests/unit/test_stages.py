@@ -1,3 +1,6 @@
+from copy import deepcopy
+from datetime import timedelta
+
 import pytest
 
 from openprocurement.auction.worker.auction import Auction
@@ -108,6 +111,34 @@ def test_end_bids_stage(auction, db, mocker, logger):
     assert mock_approve.call_count == 1
 
 
+def test_end_bids_stage_leaderboard(auction, db):
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_auction_stages_fast_forward()
+    auction.prepare_audit()
+    assert [bid['amount'] for bid in auction.leaderboard.ordered()] == [480000.0, 475000.0]
+
+    auction.auction_document['current_stage'] = 4
+    bidder_id = auction.auction_document['stages'][4]['bidder_id']
+    assert bidder_id == '5675acc9232942e8940a034994ad883e'
+    auction.add_bid(4, {'amount': 460000.0, 'bidder_id': bidder_id,
+                        'time': '2017-06-26T17:43:06.913207+03:00'})
+    auction.end_bids_stage(5)
+
+    assert [(bid['bidder_id'], bid['amount']) for bid in auction.leaderboard.ordered()] == [
+        ('d3ba84c66c9e4f34bfb33cc3c686f137', 475000.0),
+        ('5675acc9232942e8940a034994ad883e', 460000.0),
+    ]
+    stages = auction.auction_document['stages']
+    assert (stages[7]['bidder_id'], stages[7]['amount']) == ('d3ba84c66c9e4f34bfb33cc3c686f137', 475000.0)
+    assert (stages[8]['bidder_id'], stages[8]['amount']) == ('5675acc9232942e8940a034994ad883e', 460000.0)
+
+    # leaderboard restored from stages of current round is the same
+    ordered = auction.leaderboard.ordered()
+    auction.leaderboard = None
+    assert auction.get_leaderboard().ordered() == ordered
+
+
 def test_update_future_bidding_orders(auction, db):
 
     test_bids = [
@@ -138,6 +169,14 @@ def test_update_future_bidding_orders(auction, db):
 
     assert set(['ru', 'uk', 'en']) == set(results[0]['label'].keys())
 
+    assert auction.bids_ceilings == {
+        4: 445000.0, 5: 440000.0, 7: 445000.0, 8: 440000.0
+    }
+    auction.auction_document['current_stage'] = 4
+    auction.refresh_stage_snapshot()
+    assert auction.stage_snapshot['version'] == 1
+    assert auction.stage_snapshot['max_bid'] == 445000.0
+
 
 def test_prepare_auction_stages(auction, db):
     auction.prepare_auction_document()
@@ -184,3 +223,56 @@ def test_next_stage(auction, db):
     assert auction.auction_document['current_stage'] == 0
     auction.next_stage(switch_to_round=3)
     assert auction.auction_document['current_stage'] == 3
+
+
+def test_start_auction_warm_up(auction, db, mocker):
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_audit()
+    auction.prepare_auction_stages()
+    auction.plan_timeline()
+    assert [entry.name for entry in auction.timeline.entries][:2] == [
+        'Warm up', 'Start of Auction'
+    ]
+
+    auction.warm_up()
+    assert auction.warm_start is not None
+    get_auction_info = mocker.patch.object(auction, 'get_auction_info')
+    auction.start_auction()
+    assert get_auction_info.call_count == 0
+    assert auction.warm_start is None
+    assert auction.auction_document['current_stage'] == 0
+    assert [bid['bidder_id'] for bid in auction.auction_document['initial_bids']] == [
+        'd3ba84c66c9e4f34bfb33cc3c686f137', '5675acc9232942e8940a034994ad883e'
+    ]
+    assert len(auction.audit['timeline']['auction_start']['initial_bids']) == 2
+
+    auction.worker_defaults['warm_up_seconds'] = 0
+    auction.plan_timeline()
+    assert auction.timeline.entries[0].name == 'Start of Auction'
+
+
+def test_warm_up_rescheduled(auction, db):
+    auction._auction_data = deepcopy(auction._auction_data)
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_audit()
+    auction.prepare_auction_stages()
+    auction.plan_timeline()
+    start = auction.auction_document['stages'][0]['start']
+
+    start_date = auction.convert_datetime(start) + timedelta(hours=1)
+    auction._auction_data['data']['auctionPeriod']['startDate'] = start_date.isoformat()
+    auction.warm_up()
+    assert auction.warm_start is None
+    assert auction.convert_datetime(auction.auction_document['stages'][0]['start']) == start_date
+    assert len(auction.auction_document['initial_bids']) == 2
+    assert [entry.name for entry in auction.timeline.entries][:2] == [
+        'Warm up', 'Start of Auction'
+    ]
+    assert auction.timeline.entries[1].run_date == start_date
+    saved = auction.db.get(auction.auction_doc_id)
+    assert saved['stages'][0]['start'] == auction.auction_document['stages'][0]['start']
+
+    auction.warm_up()
+    assert auction.warm_start is not None
@@ -0,0 +1,71 @@
+from mock import MagicMock
+
+from openprocurement.auction.worker.tender_cache import TenderDataCache
+
+
+URL = 'http://127.0.0.1:6543/api/2.3/tenders/UA-11111/auction'
+DATA = {'data': {'id': 'UA-11111', 'bids': []}}
+
+
+def response(status_code, data=None, headers=None):
+    result = MagicMock()
+    result.status_code = status_code
+    result.json.return_value = data
+    result.headers = headers or {}
+    return result
+
+
+def test_tender_cache_revalidation(tmpdir):
+    session = MagicMock()
+    session.get.side_effect = [
+        response(200, DATA, {'ETag': '"rev-1"', 'Last-Modified': 'Mon, 26 Jun 2017 14:00:00 GMT'}),
+        response(304),
+    ]
+    cache = TenderDataCache(str(tmpdir))
+    assert cache.get(URL, session, user='token') == DATA
+    assert 'If-None-Match' not in session.get.call_args[1]['headers']
+
+    data = cache.get(URL, session, user='token')
+    assert data == DATA
+    headers = session.get.call_args[1]['headers']
+    assert headers['If-None-Match'] == '"rev-1"'
+    assert headers['If-Modified-Since'] == 'Mon, 26 Jun 2017 14:00:00 GMT'
+    assert session.get.call_args[1]['auth'] == ('token', '')
+    assert cache.stats == {'downloaded': 1, 'not_modified': 1}
+
+    data['data']['bids'].append({})
+    assert cache.entries.values()[0]['data'] == DATA
+
+
+def test_tender_cache_on_disk(tmpdir):
+    session = MagicMock()
+    session.get.return_value = response(200, DATA, {'ETag': '"rev-1"'})
+    TenderDataCache(str(tmpdir)).get(URL, session)
+    assert len(tmpdir.listdir()) == 1
+
+    changed = {'data': {'id': 'UA-11111', 'bids': [{'id': 'a'}]}}
+    session.get.return_value = response(200, changed, {'ETag': '"rev-2"'})
+    cache = TenderDataCache(str(tmpdir))
+    assert cache.get(URL, session) == changed
+    assert session.get.call_args[1]['headers']['If-None-Match'] == '"rev-1"'
+
+    session.get.return_value = response(304)
+    assert TenderDataCache(str(tmpdir)).get(URL, session) == changed
+    assert [path.stat().mode & 0o777 for path in tmpdir.listdir()] == [0o600]
+
+    cache.remove(URL)
+    assert tmpdir.listdir() == []
+    assert cache.entries == {}
+
+
+def test_tender_cache_without_validators(mocker):
+    mocker.patch('openprocurement.auction.worker.tender_cache.sleep')
+    session = MagicMock()
+    session.get.return_value = response(200, DATA)
+    cache = TenderDataCache()
+    assert cache.get(URL, session) == DATA
+    assert cache.entries == {}
+
+    session.get.return_value = response(404)
+    assert cache.get(URL, session, retry_count=2) is None
+    assert session.get.call_count == 3
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+import pytest
+from dateutil.tz import tzutc
+
+from openprocurement.auction.worker.timeline import Timeline, LatenessHistogram
+
+
+class Stop(Exception):
+    pass
+
+
+class FakeClock(object):
+
+    def __init__(self, oversleep=0.0):
+        self.start = datetime(2017, 6, 26, 14, 30, tzinfo=tzutc())
+        self.elapsed = 0.0
+        self.oversleep = oversleep
+
+    def now(self):
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self):
+        return 1000.0 + self.elapsed
+
+    def wait(self, event, timeout):
+        if timeout is None:
+            raise Stop()
+        self.elapsed += timeout + self.oversleep
+        return event.is_set()
+
+
+def test_timeline_runs_entries_in_order():
+    clock = FakeClock()
+    timeline = Timeline(clock)
+    calls = []
+
+    def action(switch_to_round):
+        calls.append((switch_to_round, clock.elapsed))
+
+    timeline.plan([
+        (clock.now() + timedelta(seconds=120), action, 'second', {'switch_to_round': 2}),
+        (clock.now() + timedelta(seconds=60), action, 'first', {'switch_to_round': 1}),
+        (clock.now() + timedelta(seconds=60), action, 'same time', {'switch_to_round': 3}),
+    ])
+    assert [entry.name for entry in timeline.entries] == ['first', 'same time', 'second']
+
+    with pytest.raises(Stop):
+        timeline.run()
+    assert calls == [(1, 60.0), (3, 60.0), (2, 120.0)]
+
+
+def test_timeline_late_entry_and_failures():
+    clock = FakeClock()
+    timeline = Timeline(clock)
+    calls = []
+
+    def fail():
+        raise ValueError()
+
+    timeline.plan([
+        (clock.now() - timedelta(seconds=5), fail, 'failed', {}),
+        (clock.now() - timedelta(seconds=1), lambda: calls.append(clock.elapsed), 'late', {}),
+    ])
+    with pytest.raises(Stop):
+        timeline.run()
+    assert calls == [0.0]
+
+
+def test_timeline_replan():
+    clock = FakeClock()
+    timeline = Timeline(clock)
+    timeline.plan([(clock.now(), None, 'old', {})])
+    timeline.plan([(clock.now(), None, 'new', {})])
+    assert [entry.name for entry in timeline.entries] == ['new']
+    timeline.clear()
+    assert timeline.entries == []
+    assert not timeline.running
+
+
+def test_timeline_drift_compensation():
+    clock = FakeClock(oversleep=0.1)
+    timeline = Timeline(clock)
+    lateness = []
+    timeline.on_run = lambda entry, value: lateness.append(value)
+    timeline.plan([
+        (clock.now() + timedelta(seconds=60 * index), lambda: None, str(index), {})
+        for index in range(1, 11)
+    ])
+    with pytest.raises(Stop):
+        timeline.run()
+    assert lateness[0] == pytest.approx(0.1)
+    assert lateness[-1] < 0.02
+    assert timeline.lateness.count == 10
+
+    clock = FakeClock(oversleep=0.2)
+    timeline = Timeline(clock, drift_compensation=False)
+    timeline.plan([
+        (clock.now() + timedelta(seconds=60 * index), lambda: None, str(index), {})
+        for index in range(1, 11)
+    ])
+    with pytest.raises(Stop):
+        timeline.run()
+    assert timeline.lateness.max == pytest.approx(0.2)
+    assert timeline.lateness.as_dict()['buckets']['<=0.5'] == 10
+
+
+def test_timeline_never_runs_early():
+    clock = FakeClock()
+    timeline = Timeline(clock)
+    timeline.wakeup_latency = 0.3
+    lateness = []
+    timeline.on_run = lambda entry, value: lateness.append(value)
+    timeline.plan([(clock.now() + timedelta(seconds=60), lambda: None, 'switch', {})])
+    with pytest.raises(Stop):
+        timeline.run()
+    assert lateness[0] >= 0
+    assert lateness[0] == pytest.approx(0)
+    assert timeline.lateness.early == 0
+
+
+def test_lateness_histogram():
+    histogram = LatenessHistogram()
+    assert histogram.as_dict()['count'] == 0
+    for value in (-0.01, 0.0005, 0.003, 0.2, 2):
+        histogram.add(value)
+    result = histogram.as_dict()
+    assert result['count'] == 5
+    assert result['max'] == 2
+    assert result['buckets'] == {
+        'early': 1, '<=0.001': 1, '<=0.005': 1, '<=0.01': 0, '<=0.05': 0,
+        '<=0.1': 0, '<=0.5': 1, '<=1.0': 0, '>1.0': 1
+    }
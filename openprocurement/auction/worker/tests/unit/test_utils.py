@@ -1,5 +1,12 @@
 import datetime
 import pytest
+from fractions import Fraction
+from barbecue import calculate_coeficient
+
+from openprocurement.auction.worker.utils import (
+    snapshot_public_document, diff_public_documents, merge_public_documents,
+    get_stage_layout, calculate_bid_ceiling, Leaderboard, BiddersRegistry
+)
 
 
 def test_generate_request_id(auction):
@@ -20,3 +27,103 @@ def test_convert_date(auction, test_input, expected):
     converted = auction.convert_datetime(test_input)
     assert isinstance(converted, datetime.datetime)
     assert (converted.year, converted.month, converted.day) == expected
+
+
+def test_calculate_bid_ceiling():
+    assert calculate_bid_ceiling({'amount': 480000.0}, 35000) == 445000.0
+    stage = {'amount': 480000.0, 'amount_features': '400000'}
+    assert calculate_bid_ceiling(stage, 35000, Fraction(1, 2)) == 165000
+
+
+def test_diff_public_documents():
+    document = {
+        '_id': 'UA-11111', '_rev': '1-a', 'current_stage': 0,
+        'stages': [{'type': 'pause'}, {'type': 'bids', 'amount': 10}],
+        'results': [{'amount': 10}], 'endDate': '2017'
+    }
+    base = snapshot_public_document(document)
+    assert diff_public_documents(base, document) == ([], [])
+
+    document['stages'][1]['amount'] = 5  # stages are updated in place
+    document['current_stage'] = 1
+    document['results'] = [{'amount': 5}, {'amount': 10}]
+    document['_rev'] = '2-b'
+    del document['endDate']
+    changes, removed = diff_public_documents(base, document)
+    assert sorted(changes) == sorted([
+        [['current_stage'], 1],
+        [['stages', 1], {'type': 'bids', 'amount': 5}],
+        [['results'], [{'amount': 5}, {'amount': 10}]],
+    ])
+    assert removed == ['endDate']
+
+
+def test_merge_public_documents():
+    base = {'_id': 'a', '_rev': '1', 'current_stage': 0, 'stages': [1],
+            'endDate': '', 'results': [], 'mode': 'test'}
+    local = dict(base, current_stage=1, stages=[2], results=[1])
+    remote = dict(base, _rev='2', current_stage=5, endDate='2017', results=[3])
+    del remote['mode']
+    merged = merge_public_documents(base, local, remote, ('stages', 'current_stage'))
+    assert merged == {'_id': 'a', '_rev': '2', 'current_stage': 1, 'stages': [2],
+                      'endDate': '2017', 'results': [3]}
+
+    merged = merge_public_documents(None, local, remote, ('stages', 'current_stage'))
+    assert merged == dict(local, _rev='2')
+
+
+def test_stage_layout():
+    layout = get_stage_layout(2)
+    assert layout is get_stage_layout(2)
+    assert layout.rounds_stages == (1, 4, 7)
+    assert [layout.round_of(stage) for stage in range(-1, 12)] == \
+        [0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 3, 3]
+    assert [layout.turn_of(stage) for stage in (1, 2, 4, 5, 7, 8)] == [1, 2, 1, 2, 1, 2]
+    assert [layout.round_stages(round_number) for round_number in range(4)] == \
+        [(-2, 0), (1, 3), (4, 6), (7, 9)]
+
+    layout = get_stage_layout(0)
+    assert layout.rounds_stages == (0, 1, 2, 3)
+    assert layout.round_stages(2) == (2, 2)
+
+
+def test_leaderboard():
+    leaderboard = Leaderboard(['a', 'b', 'c'])
+    leaderboard.update({'bidder_id': 'b', 'amount': 100})
+    leaderboard.update({'bidder_id': 'a', 'amount': 100})
+    leaderboard.update({'bidder_id': 'c', 'amount': 110})
+    assert len(leaderboard) == 3
+    assert [bid['bidder_id'] for bid in leaderboard.ordered()] == ['c', 'a', 'b']
+
+    leaderboard.update({'bidder_id': 'c', 'amount': 90})
+    assert len(leaderboard) == 3
+    assert [bid['bidder_id'] for bid in leaderboard.ordered()] == ['a', 'b', 'c']
+
+    leaderboard = Leaderboard(['a', 'b'])
+    leaderboard.update({'bidder_id': 'a', 'amount': 475000.0,
+                        'amount_features': '1454662679640670217500/3422735716801577'})
+    leaderboard.update({'bidder_id': 'b', 'amount': 480000.0,
+                        'amount_features': '57420895248973824375/140737488355328'})
+    assert [bid['bidder_id'] for bid in leaderboard.ordered()] == ['a', 'b']
+
+
+def test_bidders_registry():
+    features = [{'code': 'years', 'featureOf': 'tenderer',
+                 'enum': [{'value': 0.05}, {'value': 0.1}]}]
+    registry = BiddersRegistry(features)
+    registry.add({'id': 'a', 'date': '', 'value': {}}, [{'code': 'years', 'value': 0.05}])
+    registry.add({'id': 'b', 'date': '', 'value': {}}, [{'code': 'years', 'value': 0.1}])
+    assert 'a' in registry
+    assert registry.get('c') is None
+    assert registry.mapping() == {'a': '1', 'b': '2'}
+    assert registry.bidders_features() == {'a': [{'code': 'years', 'value': 0.05}],
+                                           'b': [{'code': 'years', 'value': 0.1}]}
+    assert registry['b']['coeficient'] == calculate_coeficient(
+        features, [{'code': 'years', 'value': 0.1}]
+    )
+    assert [bid['id'] for bid in registry.bidders_data] == ['a', 'b']
+
+    registry = BiddersRegistry()
+    registry.add({'id': 'a', 'date': '', 'value': {}})
+    assert registry.bidders_features() is None
+    assert registry.bidders_coeficient() == {}
@@ -0,0 +1,94 @@
+from copy import deepcopy
+
+from openprocurement.auction.worker.auction import Auction
+from openprocurement.auction.worker.wal import (
+    WriteAheadLog, read_journal, replay_journal, EVENT_BID, EVENT_STAGE, EVENT_RUN
+)
+
+
+def test_write_ahead_log(tmpdir):
+    path = str(tmpdir.join('UA-11111.wal'))
+    assert read_journal(path) == []
+
+    wal = WriteAheadLog(path)
+    wal.append(EVENT_BID, stage=2, bid={'amount': 470000.0, 'bidder_id': 'a'})
+    wal.append(EVENT_STAGE, audit={'id': 'UA-11111'}, document={'current_stage': 2})
+    assert read_journal(path) == [
+        {'event': 'bid', 'stage': 2, 'bid': {'amount': 470000.0, 'bidder_id': 'a'}},
+        {'event': 'stage', 'audit': {'id': 'UA-11111'}, 'document': {'current_stage': 2}},
+    ]
+
+    # record torn by crash is skipped
+    with open(path, 'ab') as stream:
+        stream.write('{"event": "bid", "sta')
+    assert len(read_journal(path)) == 2
+
+    wal.close(remove=True)
+    assert read_journal(path) == []
+
+
+def test_replay_journal():
+    assert replay_journal([]) is None
+    assert replay_journal([{'event': 'bid', 'stage': 2, 'bid': {'bidder_id': 'a'}}]) is None
+
+    state = replay_journal([
+        {'event': 'run', 'run': {'start': '2017-06-26T17:35:00+03:00', 'bidders': ['a']}},
+        {'event': 'stage', 'audit': {'timeline': {}}, 'document': {'current_stage': 1}},
+        {'event': 'bid', 'stage': 2, 'bid': {'bidder_id': 'a', 'amount': 2}},
+        {'event': 'stage', 'audit': {'timeline': {'round_1': {}}}, 'document': {'current_stage': 2}},
+        {'event': 'bid', 'stage': 2, 'bid': {'bidder_id': 'a', 'amount': 1}},
+    ])
+    assert state == {
+        'run': {'start': '2017-06-26T17:35:00+03:00', 'bidders': ['a']},
+        'bids': {2: {'a': {'bidder_id': 'a', 'amount': 1}}},
+        'audit': {'timeline': {'round_1': {}}},
+        'document': {'current_stage': 2},
+    }
+
+
+def test_recover_from_wal(auction, db, tmpdir):
+    auction.worker_defaults['wal_dir'] = str(tmpdir)
+    auction.prepare_auction_document()
+    auction.get_auction_info()
+    auction.prepare_audit()
+    auction.prepare_auction_stages()
+    auction.open_wal()
+    auction.start_auction()
+    auction.end_first_pause()
+    bid = {'amount': 470000.0, 'bidder_id': auction.auction_document['stages'][1]['bidder_id'],
+           'time': '2017-06-26T17:37:06.910031+03:00'}
+    auction.add_bid(1, bid)
+    auction.flush_auction_document()
+    auction.close_wal()
+    stages = auction.auction_document['stages']
+
+    restored = Auction(auction.tender_id, worker_defaults=auction.worker_defaults,
+                       auction_data=auction._auction_data)
+    restored.prepare_auction_document()
+    restored.get_auction_info()
+    restored.prepare_audit()
+    restored.prepare_auction_stages()
+    assert restored.recover_from_wal() is True
+    assert restored.auction_document['current_stage'] == 1
+    assert restored.auction_document['stages'] == stages
+    assert restored.audit == auction.audit
+    assert restored._bids_data == {1: {bid['bidder_id']: bid}}
+    assert restored.bids_ceilings == auction.bids_ceilings
+
+    rescheduled = Auction(auction.tender_id, worker_defaults=auction.worker_defaults,
+                          auction_data=auction._auction_data)
+    rescheduled.prepare_auction_document()
+    rescheduled.get_auction_info()
+    rescheduled.prepare_audit()
+    rescheduled.prepare_auction_stages()
+    rescheduled.auction_document['stages'][0]['start'] = '2017-06-27T17:35:00+03:00'
+    prepared = deepcopy(rescheduled.auction_document['stages'])
+    assert rescheduled.recover_from_wal() is False
+    assert rescheduled.auction_document['stages'] == prepared
+    assert tmpdir.listdir() == [tmpdir.join(auction.auction_doc_id + '.wal.stale')]
+
+    rescheduled.open_wal()
+    rescheduled.close_wal()
+    assert read_journal(rescheduled.get_wal_path()) == [
+        {'event': EVENT_RUN, 'run': rescheduled.get_wal_run()}
+    ]
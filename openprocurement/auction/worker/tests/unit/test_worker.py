@@ -2,14 +2,12 @@ import pytest
 
 
 @pytest.mark.worker
-def test_worker(auction, db, scheduler, logger):
+def test_worker(auction, db, logger):
 
     auction.prepare_auction_document()
 
-    scheduler.start()
     auction.schedule_auction()
     auction.wait_to_end()
-    scheduler.shutdown()
 
     log_strings = logger.log_capture_string.getvalue().split('\n')
 
@@ -0,0 +1,49 @@
+import json
+import os
+import socket
+from gevent import spawn, sleep
+from mock import MagicMock
+
+from openprocurement.auction.worker.zygote import Zygote
+
+
+def test_zygote_handle(tmpdir, mocker):
+    zygote = Zygote(str(tmpdir.join('zygote.sock')), MagicMock())
+    mock_fork = mocker.patch.object(zygote, 'fork_and_watch', return_value=4242)
+
+    for argv, expected in [
+        (['cleanup', 'UA-11111', 'config.yaml'],
+         {u'status': u'error',
+          u'error': u"Command not allowed: [u'cleanup', u'UA-11111', u'config.yaml']"}),
+        (['run', 'UA-11111', 'config.yaml'], {u'status': u'ok', u'pid': 4242}),
+    ]:
+        client, conn = socket.socketpair()
+        client.sendall(json.dumps({'argv': argv}) + '\n')
+        zygote.handle(conn, None)
+        assert json.loads(client.makefile().readline()) == expected
+        client.close()
+    assert mock_fork.call_count == 1
+    zygote.forker.kill()
+    zygote.server.close()
+    os.unlink(zygote.socket_path)
+
+
+def test_zygote_run_child(tmpdir, mocker):
+    worker_main = MagicMock()
+    zygote = Zygote(str(tmpdir.join('zygote.sock')), worker_main)
+    mock_exit = mocker.patch('openprocurement.auction.worker.zygote.os._exit')
+
+    # handler of other client, copied into child by fork
+    other_conn = MagicMock()
+    handler = spawn(sleep, 10)
+    zygote.clients[handler] = other_conn
+
+    zygote.run_child(['run', 'UA-11111', 'config.yaml'])
+    sleep(0)
+    assert other_conn.close.call_count == 1
+    assert handler.dead
+    assert zygote.clients == {}
+    worker_main.assert_called_once_with(['run', 'UA-11111', 'config.yaml'])
+    mock_exit.assert_called_once_with(0)
+    zygote.forker.kill()
+    os.unlink(zygote.socket_path)
@@ -0,0 +1,232 @@
+"""
+Timeline of auction stage switches.
+
+All switches of one auction are compiled into a list of entries sorted by
+deadline on monotonic clock and run by one greenlet, which sleeps until the
+nearest deadline. Planning again replaces the entries and wakes the
+greenlet up.
+
+Wake-ups of a loaded event loop come late, so the greenlet measures how
+late it wakes up (exponentially weighted moving average) and goes to sleep
+that much earlier. Entries never run before their deadline: after an early
+wake-up the rest is waited without compensation. Lateness of every run
+against its deadline is collected into a histogram.
+"""
+import logging
+from bisect import insort, bisect_left
+from datetime import datetime
+
+from dateutil.tz import tzlocal
+from gevent import spawn, sleep, get_hub, getcurrent
+from gevent.event import Event
+
+
+LOGGER = logging.getLogger('Auction Worker')
+
+LATENESS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+try:
+    from time import monotonic
+except ImportError:
+    import ctypes
+    import ctypes.util
+    import os
+
+    CLOCK_MONOTONIC = 1  # linux/time.h
+
+    class _Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    def _load_clock_gettime():
+        for name in (ctypes.util.find_library('rt'), ctypes.util.find_library('c')):
+            if not name:
+                continue
+            try:
+                clock_gettime = ctypes.CDLL(name, use_errno=True).clock_gettime
+            except (OSError, AttributeError):
+                continue
+            clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+            return clock_gettime
+
+    _clock_gettime = _load_clock_gettime()
+
+    if _clock_gettime is not None:
+        def monotonic():
+            """CLOCK_MONOTONIC seconds, python 2 has no time.monotonic"""
+            timespec = _Timespec()
+            if _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(timespec)):
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return timespec.tv_sec + timespec.tv_nsec * 1e-9
+    else:
+        def monotonic():
+            """
+            Time of gevent event loop. It follows wall clock, so stage
+            deadlines move if system time is changed. Used only where
+            clock_gettime is not available (not Linux).
+            """
+            loop = get_hub().loop
+            update = getattr(loop, 'update_now', None) or loop.update
+            update()
+            return loop.now()
+        LOGGER.warning("clock_gettime is not available, stage deadlines follow wall clock")
+
+
+class Clock(object):
+    """Real clock. Tests and simulations inject their own clocks"""
+
+    def now(self):
+        return datetime.now(tzlocal())
+
+    def monotonic(self):
+        return monotonic()
+
+    def wait(self, event, timeout):
+        """Wait until event is set or timeout (in seconds) expires"""
+        return event.wait(timeout)
+
+    def sleep(self, seconds):
+        sleep(seconds)
+
+
+class LatenessHistogram(object):
+    """Histogram of lateness in seconds, negative values are early runs"""
+
+    def __init__(self, buckets=LATENESS_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.early = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+        if value < 0:
+            self.early += 1
+        else:
+            self.counts[bisect_left(self.buckets, value)] += 1
+
+    def as_dict(self):
+        buckets = {'early': self.early}
+        for bound, count in zip(self.buckets, self.counts):
+            buckets['<={}'.format(bound)] = count
+        buckets['>{}'.format(self.buckets[-1])] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max or 0.0,
+            'buckets': buckets,
+        }
+
+
+class TimelineEntry(object):
+    __slots__ = ('deadline', 'index', 'run_date', 'name', 'action', 'kwargs')
+
+    def __init__(self, deadline, index, run_date, name, action, kwargs):
+        self.deadline = deadline
+        self.index = index
+        self.run_date = run_date
+        self.name = name
+        self.action = action
+        self.kwargs = kwargs
+
+    def __lt__(self, other):
+        return (self.deadline, self.index) < (other.deadline, other.index)
+
+
+class Timeline(object):
+
+    def __init__(self, clock=None, logger=LOGGER, drift_compensation=True,
+                 smoothing=0.2, max_compensation=0.5, on_run=None):
+        self.clock = clock or Clock()
+        self.logger = logger
+        self.drift_compensation = drift_compensation
+        self.smoothing = smoothing
+        self.max_compensation = max_compensation
+        self.on_run = on_run
+        self.wakeup_latency = 0.0
+        self.lateness = LatenessHistogram()
+        self.entries = []
+        self._counter = 0
+        self._replanned = Event()
+        self._greenlet = None
+
+    def deadline_for(self, run_date):
+        """Convert wall clock datetime into monotonic deadline"""
+        return self.clock.monotonic() + (run_date - self.clock.now()).total_seconds()
+
+    def add(self, run_date, action, name, kwargs=None):
+        self._counter += 1
+        insort(self.entries, TimelineEntry(self.deadline_for(run_date), self._counter,
+                                           run_date, name, action, kwargs or {}))
+        self._replanned.set()
+
+    def plan(self, entries):
+        """Replace timeline with entries of (run_date, action, name, kwargs)"""
+        self.entries = []
+        for run_date, action, name, kwargs in entries:
+            self.add(run_date, action, name, kwargs)
+        self._replanned.set()
+
+    def clear(self):
+        self.entries = []
+        self._replanned.set()
+
+    @property
+    def running(self):
+        return self._greenlet is not None and not self._greenlet.dead
+
+    def start(self):
+        if not self.running:
+            self._greenlet = spawn(self.run)
+
+    def shutdown(self):
+        self.entries = []
+        greenlet, self._greenlet = self._greenlet, None
+        if greenlet is not None and greenlet is not getcurrent():
+            greenlet.kill()
+
+    def run(self):
+        while True:
+            self._replanned.clear()
+            if not self.entries:
+                self.clock.wait(self._replanned, None)
+                continue
+            deadline = self.entries[0].deadline
+            wake_at = deadline - self.compensation
+            now = self.clock.monotonic()
+            if now < wake_at:
+                if not self.clock.wait(self._replanned, wake_at - now):
+                    self.measure_wakeup(self.clock.monotonic() - wake_at)
+                continue
+            if now < deadline:
+                # Woke up early by compensation, wait the rest as is
+                self.clock.wait(self._replanned, deadline - now)
+                continue
+            self.run_entry(self.entries.pop(0))
+
+    @property
+    def compensation(self):
+        if not self.drift_compensation:
+            return 0.0
+        return min(self.wakeup_latency, self.max_compensation)
+
+    def measure_wakeup(self, latency):
+        self.wakeup_latency += self.smoothing * (max(latency, 0.0) - self.wakeup_latency)
+
+    def run_entry(self, entry):
+        lateness = self.clock.monotonic() - entry.deadline
+        self.lateness.add(lateness)
+        self.logger.debug("Run {} (lateness {:.6f}s)".format(entry.name, lateness))
+        if self.on_run is not None:
+            try:
+                self.on_run(entry, lateness)
+            except Exception:
+                self.logger.exception("Failed to record run of {}".format(entry.name))
+        try:
+            entry.action(**entry.kwargs)
+        except Exception:
+            self.logger.exception("{} failed".format(entry.name))
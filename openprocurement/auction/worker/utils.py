@@ -1,4 +1,10 @@
 # -*- coding: utf-8 -*-
+from bisect import bisect_left, insort
+from fractions import Fraction
+
+from barbecue import calculate_coeficient
+
+from openprocurement.auction.worker.constants import ROUNDS
 
 
 def prepare_initial_bid_stage(bidder_name="", bidder_id="", time="",
@@ -53,3 +59,268 @@ def prepare_service_stage(**kwargs):
     }
     pause.update(kwargs)
     return pause
+
+
+class BiddersRegistry(object):
+    """
+    Active bidders of auction indexed by bidder id. Mapping number,
+    features parameters and coeficient of every bidder are computed once,
+    when bidder is added.
+    """
+
+    def __init__(self, features=None):
+        self.features = features or None
+        self.bidders_data = []
+        self._bidders = {}
+
+    def add(self, bid_data, parameters=None):
+        bidder_id = bid_data['id']
+        self.bidders_data.append(bid_data)
+        bidder = {
+            'id': bidder_id,
+            'number': str(len(self.bidders_data)),
+            'features': None,
+            'coeficient': None,
+        }
+        if self.features:
+            bidder['features'] = parameters
+            bidder['coeficient'] = calculate_coeficient(self.features, parameters)
+        self._bidders[bidder_id] = bidder
+        return bidder
+
+    def get(self, bidder_id, default=None):
+        return self._bidders.get(bidder_id, default)
+
+    def __getitem__(self, bidder_id):
+        return self._bidders[bidder_id]
+
+    def __contains__(self, bidder_id):
+        return bidder_id in self._bidders
+
+    def __len__(self):
+        return len(self.bidders_data)
+
+    def __iter__(self):
+        return (self._bidders[bid_data['id']] for bid_data in self.bidders_data)
+
+    def mapping(self):
+        return {bidder['id']: bidder['number'] for bidder in self._bidders.values()}
+
+    def bidders_features(self):
+        if not self.features:
+            return None
+        return {bidder['id']: bidder['features'] for bidder in self._bidders.values()}
+
+    def bidders_coeficient(self):
+        if not self.features:
+            return {}
+        return {bidder['id']: bidder['coeficient'] for bidder in self._bidders.values()}
+
+
+class StageLayout(object):
+    """
+    Immutable layout of auction stages for given number of bidders:
+    round and turn of every stage and stages range of every round.
+    """
+    __slots__ = ('bidders_count', 'rounds', 'rounds_stages',
+                 '_round_of', '_turn_of', '_round_stages')
+
+    def __init__(self, bidders_count, rounds=ROUNDS):
+        step = bidders_count + 1
+        self.bidders_count = bidders_count
+        self.rounds = rounds
+        self.rounds_stages = tuple(
+            stage for stage in range(step * rounds + 1)
+            if (stage + bidders_count) % step == 0
+        )
+        round_of = []
+        current_round = 0
+        for stage in range(step * rounds + 1):
+            while current_round < len(self.rounds_stages) and \
+                    self.rounds_stages[current_round] <= stage:
+                current_round += 1
+            if current_round < len(self.rounds_stages):
+                round_of.append(current_round)
+            else:
+                round_of.append(rounds)
+        self._round_of = tuple(round_of)
+        self._turn_of = tuple(
+            stage - (round_of[stage] * step - bidders_count) + 1
+            for stage in range(len(round_of))
+        )
+        self._round_stages = tuple(
+            (round_number * step - bidders_count, round_number * step)
+            for round_number in range(rounds + 1)
+        )
+
+    def round_of(self, stage):
+        if stage < 0:
+            return 0
+        if stage < len(self._round_of):
+            return self._round_of[stage]
+        return self.rounds
+
+    def turn_of(self, stage):
+        if 0 <= stage < len(self._turn_of):
+            return self._turn_of[stage]
+        step = self.bidders_count + 1
+        return stage - (self.round_of(stage) * step - self.bidders_count) + 1
+
+    def round_stages(self, round_number):
+        if 0 <= round_number <= self.rounds:
+            return self._round_stages[round_number]
+        step = self.bidders_count + 1
+        return (round_number * step - self.bidders_count, round_number * step)
+
+
+class Leaderboard(object):
+    """
+    Latest bids of bidders kept in bidding order.
+
+    Order is the same as sorting_by_amount gives for list of bids in
+    bidders order: by amount (amount with features for MEAT auctions)
+    descending, ties keep order of bidders.
+    """
+
+    def __init__(self, bidders_ids):
+        self.bidders_ids = list(bidders_ids)
+        self.positions = {bidder_id: index for index, bidder_id in enumerate(self.bidders_ids)}
+        self.bids = {}
+        self._keys = {}
+        self._order = []
+
+    @staticmethod
+    def bid_amount(bid):
+        if bid.get('amount_features'):
+            return Fraction(bid['amount_features'])
+        return bid['amount']
+
+    def update(self, bid):
+        bidder_id = bid['bidder_id']
+        if bidder_id in self._keys:
+            del self._order[bisect_left(self._order, self._keys[bidder_id])]
+        key = (-self.bid_amount(bid), self.positions[bidder_id])
+        insort(self._order, key)
+        self._keys[bidder_id] = key
+        self.bids[bidder_id] = bid
+
+    def ordered(self):
+        return [self.bids[self.bidders_ids[position]] for _, position in self._order]
+
+    def __len__(self):
+        return len(self._order)
+
+
+_STAGE_LAYOUTS = {}
+
+
+def get_stage_layout(bidders_count):
+    """StageLayout for bidders count, layouts are built once and shared"""
+    layout = _STAGE_LAYOUTS.get(bidders_count)
+    if layout is None:
+        layout = _STAGE_LAYOUTS[bidders_count] = StageLayout(bidders_count)
+    return layout
+
+
+def calculate_bid_ceiling(stage, minimal_step, coeficient=None):
+    """
+    Maximum acceptable bid on bids stage: previous amount minus minimalStep.
+    For MEAT auctions amount is taken with features and multiplied by
+    coeficient of bidder.
+    """
+    if coeficient is not None:
+        ceiling = Fraction(stage['amount_features']) * coeficient
+        return ceiling - Fraction(minimal_step)
+    return stage['amount'] - minimal_step
+
+
+def prepare_stage_snapshot(document, version=0, max_bid=None):
+    stage_id = document.get('current_stage', -1)
+    stages = document.get('stages', [])
+    if 0 <= stage_id < len(stages):
+        stage = dict(stages[stage_id])
+    else:
+        stage = {}
+    return {
+        "version": version,
+        "current_stage": stage_id,
+        "stage": stage,
+        "minimalStep": dict(document.get('minimalStep', {})),
+        "max_bid": max_bid
+    }
+
+
+DOCUMENT_LIST_SECTIONS = ('initial_bids', 'stages', 'results')
+
+
+def snapshot_public_document(document):
+    """
+    Cheap copy of public document used as base for delta saves. Stages and
+    other sections are copied one level deep, as stage dicts are updated in
+    place (see prepare_bids_stage).
+    """
+    snapshot = {}
+    for key, value in document.items():
+        if key in DOCUMENT_LIST_SECTIONS and isinstance(value, list):
+            snapshot[key] = [dict(item) for item in value]
+        elif isinstance(value, dict):
+            snapshot[key] = dict(value)
+        else:
+            snapshot[key] = value
+    return snapshot
+
+
+def diff_public_documents(base, document):
+    """
+    Changes between two versions of public document.
+
+    Returns list of [path, value] pairs to set and list of removed top level
+    keys. Sections of equal length are compared item by item, otherwise
+    whole value is replaced.
+    """
+    changes = []
+    for key, value in document.items():
+        if key in ('_id', '_rev'):
+            continue
+        if key not in base:
+            changes.append([[key], value])
+        elif key in DOCUMENT_LIST_SECTIONS and isinstance(value, list) \
+                and isinstance(base[key], list) and len(value) == len(base[key]):
+            for index, item in enumerate(value):
+                if item != base[key][index]:
+                    changes.append([[key, index], item])
+        elif value != base[key]:
+            changes.append([[key], value])
+    removed = [key for key in base if key not in document and key not in ('_id', '_rev')]
+    return changes, removed
+
+
+def merge_public_documents(base, local, remote, owned_fields=()):
+    """
+    Three-way merge of public document after save conflict.
+
+    Fields from owned_fields are always taken from local document. For other
+    fields change made by one side wins; if both sides changed field remote
+    value is kept, as external writers own it. Without base changes can't
+    be told apart, so local document is saved over remote revision.
+    """
+    if base is None:
+        return dict(local, _rev=remote['_rev'])
+    merged = {}
+    for key in set(local) | set(remote):
+        if key == '_rev':
+            continue
+        if key in owned_fields:
+            if key in local:
+                merged[key] = local[key]
+            continue
+        local_changed = local.get(key, _MISSING) != base.get(key, _MISSING)
+        remote_changed = remote.get(key, _MISSING) != base.get(key, _MISSING)
+        source = local if local_changed and not remote_changed else remote
+        if key in source:
+            merged[key] = source[key]
+    merged['_rev'] = remote['_rev']
+    return merged
+
+
+_MISSING = object()
@@ -0,0 +1,112 @@
+"""
+Append-only write-ahead journal of auction worker.
+
+Every accepted bid and every stage transition is appended to a local file
+as one JSON line and written to OS at once, so it survives kill of worker
+process. Only fsync is done in batches by a background greenlet, so bids
+handling never waits for the disk. After a crash the journal is read with
+mmap and replayed to restore bids, audit and auction stages. First record
+of journal identifies run of auction by start of auction and its bidders,
+so journal left by crash of previously scheduled run is never replayed
+into rescheduled one.
+"""
+import json
+import logging
+import mmap
+import os
+
+from gevent import spawn, sleep
+
+
+LOGGER = logging.getLogger('Auction Worker')
+
+EVENT_BID = 'bid'
+EVENT_STAGE = 'stage'
+EVENT_RUN = 'run'
+
+
+class WriteAheadLog(object):
+
+    def __init__(self, path, fsync_interval=0.05):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._file = open(path, 'ab')
+        self._syncer = None
+
+    def append(self, event, **data):
+        data['event'] = event
+        self._file.write(json.dumps(data) + '\n')
+        self._file.flush()
+        if self._syncer is None or self._syncer.dead:
+            self._syncer = spawn(self._sync_later)
+
+    def _sync_later(self):
+        sleep(self.fsync_interval)
+        self.sync()
+
+    def sync(self):
+        if not self._file.closed:
+            os.fsync(self._file.fileno())
+
+    def close(self, remove=False):
+        if self._syncer is not None:
+            self._syncer.kill(block=False)
+        self.sync()
+        self._file.close()
+        if remove:
+            os.unlink(self.path)
+
+
+def read_journal(path):
+    """Read all complete records, torn tail after crash is skipped"""
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'rb') as stream:
+        if not os.fstat(stream.fileno()).st_size:
+            return records
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = 0
+            while True:
+                end = data.find('\n', start)
+                if end == -1:
+                    break
+                try:
+                    records.append(json.loads(data[start:end]))
+                except ValueError:
+                    LOGGER.warning("Broken record in journal {} at {}".format(path, start))
+                    break
+                start = end + 1
+        finally:
+            data.close()
+    return records
+
+
+def replay_journal(records):
+    """
+    Restore auction state from journal records.
+
+    Returns dict with run of auction, latest bids of bidders on every
+    stage, last audit and last saved sections of auction document or None
+    if journal has no stage records.
+    """
+    run = None
+    state = None
+    bids = {}
+    for record in records:
+        if record['event'] == EVENT_RUN:
+            run = run or record['run']
+        elif record['event'] == EVENT_BID:
+            bid = record['bid']
+            bids.setdefault(record['stage'], {})[bid['bidder_id']] = bid
+        elif record['event'] == EVENT_STAGE:
+            state = record
+    if state is None:
+        return None
+    return {
+        "run": run,
+        "bids": bids,
+        "audit": state['audit'],
+        "document": state['document'],
+    }
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-fork daemon for auction_worker.
+
+`serve` imports worker modules and patches gevent only once, then forks an
+already warm child for every `run` or `planning` command received over
+local UNIX socket. Children are forked by one dedicated greenlet from queue
+of commands, so no handler is forked in the middle of its work, and child
+closes connections of other clients and kills their handlers before it runs
+the worker. `submit` is a thin client, it does not import worker
+modules, so it is cheap to start from chronograph.
+
+    auction_worker_zygote serve /run/auction_worker.sock
+    auction_worker_zygote submit /run/auction_worker.sock run <id> <config>
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+
+ALLOWED_COMMANDS = ('run', 'planning')
+
+
+class Zygote(object):
+
+    def __init__(self, socket_path, worker_main):
+        from gevent import spawn, getcurrent, killall
+        from gevent.event import AsyncResult
+        from gevent.queue import Queue
+        from gevent.server import StreamServer
+        from gevent.os import fork_and_watch
+        import logging
+
+        self.worker_main = worker_main
+        self.fork_and_watch = fork_and_watch
+        self.getcurrent = getcurrent
+        self.killall = killall
+        self.AsyncResult = AsyncResult
+        self.commands = Queue()
+        self.clients = {}
+        self.logger = logging.getLogger('Auction Worker Zygote')
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen(128)
+        self.server = StreamServer(listener, self.handle)
+        self.forker = spawn(self.fork_children)
+
+    def handle(self, conn, address):
+        self.clients[self.getcurrent()] = conn
+        stream = conn.makefile()
+        try:
+            argv = json.loads(stream.readline())['argv']
+            if not argv or argv[0] not in ALLOWED_COMMANDS:
+                raise ValueError("Command not allowed: {}".format(argv))
+            result = self.AsyncResult()
+            self.commands.put((argv, result))
+            response = {"status": "ok", "pid": result.get()}
+        except Exception as e:
+            response = {"status": "error", "error": str(e)}
+        finally:
+            self.clients.pop(self.getcurrent(), None)
+        stream.write(json.dumps(response) + '\n')
+        stream.flush()
+        stream.close()
+        conn.close()
+
+    def fork_children(self):
+        for argv, result in self.commands:
+            try:
+                pid = self.fork_and_watch(callback=self.child_exited)
+            except Exception as e:
+                result.set_exception(e)
+                continue
+            if pid == 0:
+                self.run_child(argv)
+            result.set(pid)
+
+    def run_child(self, argv):
+        self.server.close()
+        for conn in self.clients.values():
+            conn.close()
+        self.killall(list(self.clients), block=False)
+        self.clients.clear()
+        code = 0
+        try:
+            self.worker_main(argv)
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            self.logger.exception("Auction worker {} failed".format(argv))
+            code = 1
+        os._exit(code)
+
+    def child_exited(self, watcher):
+        self.logger.info("Auction worker {} exited with status {}".format(
+            watcher.rpid, watcher.rstatus
+        ))
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.forker.kill()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+def submit(socket_path, argv):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path)
+    stream = client.makefile('rw')
+    stream.write(json.dumps({"argv": argv}) + '\n')
+    stream.flush()
+    response = json.loads(stream.readline())
+    client.close()
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description='---- Auction Worker Zygote ----')
+    parser.add_argument('cmd', choices=['serve', 'submit'])
+    parser.add_argument('socket_path', type=str, help='Path to UNIX socket')
+    parser.add_argument('argv', nargs=argparse.REMAINDER,
+                        help='auction_worker arguments for submit command')
+    args = parser.parse_args()
+
+    if args.cmd == 'serve':
+        # Warm up: import everything the children need before forking
+        from openprocurement.auction.worker import cli
+        Zygote(args.socket_path, cli.main).serve_forever()
+    else:
+        response = submit(args.socket_path, args.argv)
+        if response['status'] != 'ok':
+            print response['error']
+            sys.exit(1)
+        print response['pid']
+
+
+if __name__ == "__main__":
+    main()
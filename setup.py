@@ -19,6 +19,7 @@ EXTRAS_REQUIRE = {
 ENTRY_POINTS = {
     'console_scripts': [
         'auction_worker = openprocurement.auction.worker.cli:main',
+        'auction_worker_zygote = openprocurement.auction.worker.zygote:main',
     ],
     'openprocurement.auction.auctions': [
         'belowThreshold = openprocurement.auction.worker.includeme:belowThreshold',